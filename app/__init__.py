@@ -9,14 +9,24 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_admin import Admin
 from flask_login import LoginManager
 from config import config
+from .registry import PlanRegistry
+from .cache import Cache
+from .instrumentation import Instrumentation
+from .outbox import Outbox
+from .slow_queries import SlowQueryLog
 
 bootstrap = Bootstrap()
 mail = Mail()
+outbox = Outbox(mail)
 moment = Moment()
 db = SQLAlchemy()
 admin = Admin(template_mode='bootstrap3')
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
+plan_registry = PlanRegistry()
+cache = Cache()
+instrumentation = Instrumentation()
+slow_queries = SlowQueryLog()
 
 
 def create_app(config_name):
@@ -30,10 +40,15 @@ def create_app(config_name):
     # initialize extensions
     bootstrap.init_app(app)
     mail.init_app(app)
+    outbox.init_app(app)
     moment.init_app(app)
     db.init_app(app)
     admin.init_app(app)
     login_manager.init_app(app)
+    plan_registry.init_app(app)
+    cache.init_app(app)
+    instrumentation.init_app(app)
+    slow_queries.init_app(app)
 
     # register blueprints
     from .main import main as main_blueprint
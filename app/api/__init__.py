@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api = Blueprint('api', __name__)
 
-from app.api import errors, tokens, users, events
+from app.api import errors, tokens, users, events, plans, workouts
@@ -0,0 +1,50 @@
+'''
+Helpers shared by the batch endpoints.
+
+A batch is a JSON array of items that is validated as a whole and written in
+a single transaction: either every item is created (201) or nothing is and
+the response reports which items failed (400).  Each result carries the
+item's index and an HTTP-like status, 201 for created, 400 for an invalid
+item and 424 for a valid item held back by the others.
+'''
+from flask import jsonify, request
+from app.exceptions import ValidationError
+
+MAX_BATCH_SIZE = 1000
+
+
+def get_batch(max_size=MAX_BATCH_SIZE):
+    '''
+    Return the list of items posted to a batch endpoint.
+    '''
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        raise ValidationError('expected a non-empty JSON array')
+    if len(items) > max_size:
+        raise ValidationError(f'batches are limited to {max_size} items')
+    return items
+
+
+def batch_error_response(errors, size):
+    '''
+    Report the invalid items of a batch, given as {index: message}.
+    '''
+    results = [{'index': i, 'status': 400, 'message': errors[i]}
+               if i in errors else {'index': i, 'status': 424}
+               for i in range(size)]
+    response = jsonify({'created': 0, 'errors': len(errors),
+                        'items': results})
+    response.status_code = 400
+    return response
+
+
+def batch_response(items):
+    '''
+    Report a batch of created items, given as their to_dict() results.
+    '''
+    response = jsonify({
+        'created': len(items), 'errors': 0,
+        'items': [{'index': i, 'status': 201, 'data': item}
+                  for i, item in enumerate(items)]})
+    response.status_code = 201
+    return response
@@ -1,5 +1,7 @@
 from flask import jsonify
 from werkzeug import HTTP_STATUS_CODES
+from app.api import api
+from app.exceptions import ValidationError
 
 
 def error_response(status_code, message=None):
@@ -13,3 +15,8 @@ def error_response(status_code, message=None):
 
 def bad_request(message):
     return error_response(400, message)
+
+
+@api.errorhandler(ValidationError)
+def validation_error(e):
+    return bad_request(e.args[0])
@@ -1,6 +1,11 @@
+from datetime import datetime
 from flask import jsonify, request, url_for
-from app import db
+from sqlalchemy.exc import IntegrityError
+from app import db, cache
 from app.api import api
+from app.api.batch import get_batch, batch_error_response, batch_response
+from app.exceptions import ValidationError
+from app.importer import normalise_event
 from app.models import Event
 
 
@@ -11,13 +16,38 @@ def get_event(id):
 
 @api.route('/events', methods=['GET'])
 def get_events():
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1),
+                   100)
+    filters = {field: request.args[field]
+               for field in ['start', 'end', 'distance', 'name']
+               if request.args.get(field)}
+    query = Event.query.between(
+        parse_date(filters.get('start')), parse_date(filters.get('end')))
+    if 'distance' in filters:
+        query = query.distance(filters['distance'])
+    if 'name' in filters:
+        query = query.named(filters['name'])
+    if 'after' in request.args:
+        data = Event.to_cursor_collection_dict(
+            query, Event.id, request.args['after'], per_page,
+            'api.get_events', count=request.args.get('count', 0, type=int),
+            **filters)
+        return jsonify(data)
     page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 100)
     data = Event.to_collection_dict(
-        Event.query, page, per_page, 'api.get_events')
+        query, page, per_page, 'api.get_events', **filters)
     return jsonify(data)
 
 
+def parse_date(value):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError(f'invalid date {value}, expected YYYY-MM-DD')
+
+
 @api.route('/events', methods=['POST'])
 def create_event():
     event = Event()
@@ -31,6 +61,40 @@ def create_event():
     return response
 
 
+@api.route('/events:batch', methods=['POST'])
+def create_events():
+    items = get_batch()
+    rows, errors = {}, {}
+    for i, item in enumerate(items):
+        try:
+            rows[i] = normalise_event(item)
+        except ValidationError as e:
+            errors[i] = e.args[0]
+    names = {row['name'] for row in rows.values()}
+    existing = set(db.session.query(Event.name, Event.date).filter(
+        Event.name.in_(names))) if names else set()
+    for i, row in rows.items():
+        key = (row['name'], row['date'])
+        if key in existing:
+            errors[i] = f'{row["name"]} on {row["date"]} already exists'
+        existing.add(key)
+    if errors:
+        return batch_error_response(errors, len(items))
+
+    try:
+        db.session.execute(Event.__table__.insert(), list(rows.values()))
+        events = {(event.name, event.date): event for event in
+                  Event.query.filter(Event.name.in_(names))}
+        data = [events[row['name'], row['date']].to_dict()
+                for row in rows.values()]
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise ValidationError('batch conflicts with existing events')
+    cache.delete_prefix('events/')
+    return batch_response(data)
+
+
 @api.route('/events/<int:id>', methods=['PUT'])
 def update_event(id):
     event = Event.query.get_or_404(id)
@@ -0,0 +1,61 @@
+'''
+Helpers shared by the read endpoints for sparse fieldsets and expansions.
+
+?fields=a,b limits each item to the listed attributes, plus its id, _links
+and any expanded collections.  ?expand=x,y embeds related collections that
+are otherwise left out, each loaded by a fixed number of queries whatever
+the size of the page.
+'''
+from flask import request
+from app.exceptions import ValidationError
+
+ALWAYS_INCLUDED = ('id', '_links')
+
+
+def _get_list(name, allowed):
+    values = {value for value in request.args.get(name, '').split(',')
+              if value}
+    unknown = values - set(allowed)
+    if unknown:
+        raise ValidationError(
+            f'unknown {name} {", ".join(sorted(unknown))}, expected some of '
+            f'{", ".join(allowed)}')
+    return values
+
+
+def get_fields(allowed):
+    '''
+    Return the requested fields, or None when every field is wanted.
+    '''
+    if 'fields' not in request.args:
+        return None
+    return _get_list('fields', allowed) | set(ALWAYS_INCLUDED)
+
+
+def get_expand(allowed, implies=None):
+    '''
+    Return the requested expansions, with those they depend on as given by
+    implies, {expansion: [expansions]}.
+    '''
+    expand = _get_list('expand', allowed)
+    for name in list(expand):
+        expand.update((implies or {}).get(name, ()))
+    return expand
+
+
+def sparse(data, fields, expand=()):
+    '''
+    Limit an item's to_dict() to the requested fields and expansions.
+    '''
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items()
+            if key in fields or key in expand}
+
+
+def link_args():
+    '''
+    The fieldset arguments of the request, to carry over to page links.
+    '''
+    return {name: request.args[name] for name in ('fields', 'expand')
+            if request.args.get(name)}
@@ -0,0 +1,48 @@
+from heapq import nsmallest
+from operator import attrgetter
+from flask import jsonify, request
+from app.api import api
+from app.api.fieldsets import get_fields, link_args, sparse
+from app.api.workouts import WORKOUT_FIELDS, eager_workouts, \
+    get_workout_expand
+from app.models import Plan, Workout, decode_cursor
+from app.snapshot import PlanSnapshot
+
+PLAN_FIELDS = ['level', 'start_date', 'days', 'duration', 'revision',
+               'updated']
+
+
+@api.route('/plans/<int:id>', methods=['GET'])
+def get_plan(id):
+    fields = get_fields(PLAN_FIELDS)
+    return jsonify(sparse(Plan.query.get_or_404(id).to_dict(), fields))
+
+
+@api.route('/plans/<int:id>/workouts', methods=['GET'])
+def get_plan_workouts(id):
+    '''
+    The plan's workouts in id order, from its snapshot when it has one.
+
+    Every page decodes the whole snapshot, a few hundred workouts at most,
+    and picks the page's workouts from it without sorting the rest.
+    '''
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1),
+                   100)
+    after = request.args.get('after', '')
+    count = request.args.get('count', 0, type=int)
+    fields, expand = get_fields(WORKOUT_FIELDS), get_workout_expand()
+    kwargs = dict(link_args(), id=id, item_dict=lambda workout: sparse(
+        workout.to_dict(expand), fields, expand))
+    plan = Plan.query.get_or_404(id)
+    snapshot = PlanSnapshot.decode(plan)
+    if snapshot is None:
+        return jsonify(Workout.to_cursor_collection_dict(
+            eager_workouts(plan.workouts, expand), Workout.id, after,
+            per_page, 'api.get_plan_workouts', count, **kwargs))
+    last_id = decode_cursor(after) if after else 0
+    workouts = nsmallest(per_page + 1, (workout for workout in snapshot
+                                        if workout.id > last_id),
+                         key=attrgetter('id'))
+    return jsonify(Workout.to_cursor_page_dict(
+        workouts, 'id', after, per_page,
+        'api.get_plan_workouts', len(snapshot) if count else None, **kwargs))
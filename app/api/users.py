@@ -1,9 +1,20 @@
 from flask import jsonify, request, url_for
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.api import api
+from app.api.batch import get_batch, batch_error_response, batch_response
 from app.api.errors import bad_request
+from app.exceptions import ValidationError
 from app.models import User
 
+USER_FIELDS = ['first_name', 'last_name', 'email', 'password']
+# the unique columns, with how their clashes are reported
+UNIQUE_FIELDS = [('email', 'email address'), ('first_name', 'first name'),
+                 ('last_name', 'last name')]
+# every password is hashed with pbkdf2 during the request, at roughly 80ms
+# apiece, so user batches are kept well below MAX_BATCH_SIZE
+MAX_USER_BATCH_SIZE = 50
+
 
 @api.route('/users/<int:id>', methods=['GET'])
 def get_user(id):
@@ -12,8 +23,14 @@ def get_user(id):
 
 @api.route('/users', methods=['GET'])
 def get_users():
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1),
+                   100)
+    if 'after' in request.args:
+        data = User.to_cursor_collection_dict(
+            User.query, User.id, request.args['after'], per_page,
+            'api.get_users', count=request.args.get('count', 0, type=int))
+        return jsonify(data)
     page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 100)
     data = User.to_collection_dict(User.query, page, per_page, 'api.get_users')
     return jsonify(data)
 
@@ -35,6 +52,57 @@ def create_user():
     return response
 
 
+@api.route('/users:batch', methods=['POST'])
+def create_users():
+    items = get_batch(MAX_USER_BATCH_SIZE)
+    errors = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not all(
+                isinstance(item.get(field), str) and item[field]
+                for field in USER_FIELDS):
+            errors[i] = 'must include first_name, last_name, email and ' \
+                'password fields'
+    valid = [item for i, item in enumerate(items) if i not in errors]
+    emails = {item['email'] for item in valid}
+    taken = {field: set() for field, _ in UNIQUE_FIELDS}
+    if valid:
+        columns = [getattr(User, field) for field, _ in UNIQUE_FIELDS]
+        for row in db.session.query(*columns).filter(db.or_(*[
+                column.in_({item[field] for item in valid})
+                for column, (field, _) in zip(columns, UNIQUE_FIELDS)])):
+            for (field, _), value in zip(UNIQUE_FIELDS, row):
+                taken[field].add(value)
+    for i, item in enumerate(items):
+        if i in errors:
+            continue
+        for field, name in UNIQUE_FIELDS:
+            if item[field] in taken[field]:
+                errors[i] = f'please use a different {name}'
+                break
+        for field, _ in UNIQUE_FIELDS:
+            taken[field].add(item[field])
+    if errors:
+        return batch_error_response(errors, len(items))
+
+    rows = []
+    for item in items:
+        user = User()
+        user.from_dict(item, new_user=True)
+        rows.append({'first_name': user.first_name,
+                     'last_name': user.last_name, 'email': user.email,
+                     'password_hash': user.password_hash})
+    try:
+        db.session.execute(User.__table__.insert(), rows)
+        users = {user.email: user for user in
+                 User.query.filter(User.email.in_(emails))}
+        data = [users[item['email']].to_dict() for item in items]
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise ValidationError('batch conflicts with existing users')
+    return batch_response(data)
+
+
 @api.route('/users/<int:id>', methods=['PUT'])
 def update_user(id):
     user = User.query.get_or_404(id)
@@ -0,0 +1,35 @@
+from flask import jsonify
+from app import db
+from app.api import api
+from app.api.fieldsets import get_expand, get_fields, sparse
+from app.models import Workout, WorkoutSet
+from app.snapshot import load_workout
+
+WORKOUT_FIELDS = ['date', 'category', 'rest', 'duration']
+WORKOUT_EXPANSIONS = ['workoutsets', 'exercises']
+
+
+def get_workout_expand():
+    # exercises are only reached through their sets
+    return get_expand(WORKOUT_EXPANSIONS, {'exercises': ['workoutsets']})
+
+
+def eager_workouts(query, expand):
+    '''
+    Load the expanded collections of the workouts in a query, with one
+    further query per collection.
+    '''
+    if 'workoutsets' in expand:
+        loader = db.subqueryload(Workout.workoutsets)
+        if 'exercises' in expand:
+            loader = loader.subqueryload(WorkoutSet.exercises)
+        query = query.options(loader)
+    return query
+
+
+@api.route('/workouts/<int:id>', methods=['GET'])
+def get_workout(id):
+    fields, expand = get_fields(WORKOUT_FIELDS), get_workout_expand()
+    workout = load_workout(id) or \
+        eager_workouts(Workout.query, expand).get_or_404(id)
+    return jsonify(sparse(workout.to_dict(expand), fields, expand))
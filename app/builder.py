@@ -1,4 +1,4 @@
-from datetime import datetime, date, timedelta
+from datetime import date
 
 
 def rest_week(week, plan_length):
@@ -34,18 +34,38 @@ def reps_or_duration(plan_length, plan_week, workout_week, start, step, maximum,
     return min(result, maximum - rest * step)
 
 
+def monday_ordinal(ordinal):
+    '''
+    Return the ordinal of the Monday on or before the date with an ordinal.
+    '''
+    # date.fromordinal(1) is a Monday
+    return ordinal - (ordinal - 1) % 7
+
+
+def progression_start_ordinal(plan_start_ordinal, day):
+    '''
+    Return the ordinal of the first date of a workout progression.
+    '''
+    return monday_ordinal(plan_start_ordinal) + 7 + day
+
+
 def progression_start_date(plan_start_date, day):
     '''
     Return date of workout progression.
     '''
-    return plan_start_date + timedelta(weeks=1) - \
-        timedelta(days=plan_start_date.weekday()) + timedelta(days=day)
+    return date.fromordinal(
+        progression_start_ordinal(plan_start_date.toordinal(), day))
+
+
+def weeks_between_ordinals(start_ordinal, end_ordinal):
+    '''
+    Return the number of weeks between the Mondays of two date ordinals
+    '''
+    return (monday_ordinal(end_ordinal) - monday_ordinal(start_ordinal)) // 7
 
 
 def weeks_between_dates(start_date, end_date):
     '''
     Return the number of weeks between two dates
     '''
-    monday1 = (start_date - timedelta(days=start_date.weekday()))
-    monday2 = (end_date - timedelta(days=end_date.weekday()))
-    return int((monday2 - monday1).days / 7)
+    return weeks_between_ordinals(start_date.toordinal(), end_date.toordinal())
@@ -0,0 +1,252 @@
+'''
+A small key/value cache for rendered fragments with pluggable backends.
+
+The backend is chosen with RUN_CACHE_TYPE:
+
+* ``simple`` - an in-process LRU, private to each worker
+* ``filesystem`` - files under RUN_CACHE_DIR, shared by every worker on a box
+* ``null`` - caches nothing
+
+Keys are strings; related entries share a prefix (e.g. ``plan/12/``) so they
+can be invalidated together with delete_prefix.
+'''
+import os
+import pickle
+import shutil
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from urllib.parse import quote, unquote
+from uuid import uuid4
+
+
+class NullCache(object):
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SimpleCache(NullCache):
+    '''
+    Least recently used in-process cache holding at most maxsize entries.
+    '''
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, expires = self._entries[key]
+            except KeyError:
+                return None
+            if expires is not None and expires < time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries
+                        if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemCache(NullCache):
+    '''
+    Cache storing one pickle per key in a directory shared between processes.
+
+    Each /-separated part of a key is a level of subdirectories, so
+    delete_prefix removes the directory holding a prefix's entries rather
+    than looking through every file.  Entries are named with an .e suffix
+    and directories with .d, so the two never clash.
+
+    Writes are atomic renames, so concurrent workers never read partial
+    entries.  Every maxsize / 16 writes the entries are counted, and once
+    more than maxsize exist the oldest are pruned.
+    '''
+
+    def __init__(self, directory, maxsize=1024):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.prune_every = max(maxsize // 16, 1)
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _name(part):
+        # no quoted name contains a dot, which leaves the suffixes free
+        return quote(part, safe='').replace('.', '%2E')
+
+    def _dir(self, parts):
+        return os.path.join(self.directory,
+                            *(self._name(part) + '.d' for part in parts))
+
+    def _path(self, key):
+        *parts, name = key.split('/')
+        return os.path.join(self._dir(parts), self._name(name) + '.e')
+
+    def _entries(self):
+        return [os.path.join(root, name)
+                for root, _, names in os.walk(self.directory)
+                for name in names if name.endswith('.e')]
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                value, expires = pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError):
+            return None
+        if expires is not None and expires < time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, timeout=None):
+        expires = time() + timeout if timeout else None
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((value, expires), f, pickle.HIGHEST_PROTOCOL)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        except OSError:
+            # the directory was deleted under us, and the entry with it
+            self._remove(tmp)
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self._prune()
+
+    def _prune(self):
+        paths = self._entries()
+        if len(paths) <= self.maxsize:
+            return
+        paths.sort(key=lambda path: os.stat(path).st_mtime
+                   if os.path.exists(path) else 0)
+        for path in paths[:len(paths) - self.maxsize]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _remove_dir(self, path):
+        # move it aside first, so that nothing in it can be read once this
+        # returns however long the removal takes
+        aside = os.path.join(self.directory, '.' + uuid4().hex)
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return
+        shutil.rmtree(aside, ignore_errors=True)
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def delete_prefix(self, prefix):
+        *parts, start = prefix.split('/')
+        if not start:
+            if parts:
+                self._remove_dir(self._dir(parts))
+            else:
+                self.clear()
+            return
+        directory = self._dir(parts)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            stem, suffix = name[:-2], name[-2:]
+            if not unquote(stem).startswith(start):
+                continue
+            if suffix == '.e':
+                self._remove(os.path.join(directory, name))
+            elif suffix == '.d':
+                self._remove_dir(os.path.join(directory, name))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') and not name.endswith('.e'):
+                # files being written and directories being removed
+                continue
+            elif os.path.isdir(path):
+                self._remove_dir(path)
+            else:
+                self._remove(path)
+
+
+class Cache(object):
+    '''
+    Flask extension delegating to the backend selected by RUN_CACHE_TYPE.
+    '''
+
+    def __init__(self, app=None):
+        self.backend = SimpleCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('RUN_CACHE_TYPE', 'simple')
+        maxsize = app.config.get('RUN_CACHE_SIZE', 1024)
+        if cache_type == 'simple':
+            self.backend = SimpleCache(maxsize)
+        elif cache_type == 'filesystem':
+            self.backend = FileSystemCache(app.config['RUN_CACHE_DIR'],
+                                           maxsize)
+        elif cache_type == 'null':
+            self.backend = NullCache()
+        else:
+            raise ValueError(f'unknown RUN_CACHE_TYPE {cache_type!r}')
+        app.extensions['cache'] = self
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.backend.set(key, value, timeout)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def delete_prefix(self, prefix):
+        self.backend.delete_prefix(prefix)
+
+    def clear(self):
+        self.backend.clear()
@@ -0,0 +1,165 @@
+'''
+Compile training plan schedules without touching the database.
+
+A schedule is a tuple of immutable WorkoutRows, each holding its
+WorkoutSetRows and their ExerciseRows.  The same schedule can be previewed,
+serialised or written to the database with insert_schedules.
+
+Progressions come from the plan registry (plans.json).  Schedules only
+depend on the user's dates through a fixed shift, so the week-by-week
+template for a set of progressions, plan length and days is compiled once and
+memoized.
+'''
+import json
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+from . import plan_registry
+from .builder import weeks_between_dates, progression_start_date, \
+    reps_or_duration, rest_week
+
+
+ExerciseRow = namedtuple('ExerciseRow', ['description', 'duration'])
+WorkoutSetRow = namedtuple('WorkoutSetRow', ['reps', 'exercises'])
+WorkoutRow = namedtuple('WorkoutRow', ['date', 'category', 'rest',
+                                       'workoutsets'])
+# a WorkoutRow whose date is an offset from the first progression Monday
+TemplateRow = namedtuple('TemplateRow', ['offset', 'category', 'rest',
+                                         'workoutsets'])
+
+TEMPLATE_CACHE_SIZE = 512
+# bumped whenever the layout written by encode_snapshot changes
+SNAPSHOT_VERSION = 1
+
+# any Monday will do: templates are compiled against it and then shifted
+_REFERENCE_DATE = date(2018, 1, 1)
+
+
+def _progress(progression, plan_length, plan_week, workout_week):
+    return reps_or_duration(plan_length=plan_length,
+                            plan_week=plan_week,
+                            workout_week=workout_week,
+                            start=progression.start,
+                            step=progression.step,
+                            maximum=progression.maximum,
+                            interval=progression.interval)
+
+
+def compile_progression(workouts, start_date, plan_length):
+    '''
+    Return one WorkoutRow per week, alternating between the given
+    WorkoutDefinitions and progressing each by the number of times it has
+    been done before.
+    '''
+    rows = []
+    for week in range(plan_length):
+        workout = workouts[week % len(workouts)]
+        workout_week = week // len(workouts)
+        workoutsets = []
+        if workout.warmup:
+            workoutsets.append(WorkoutSetRow(
+                1, (ExerciseRow('easy', workout.warmup),)))
+        for workoutset in workout.workoutsets:
+            workoutsets.append(WorkoutSetRow(
+                _progress(workoutset.reps, plan_length, week, workout_week),
+                tuple(ExerciseRow(exercise.description,
+                                  _progress(exercise.duration, plan_length,
+                                            week, workout_week))
+                      for exercise in workoutset.exercises)))
+        if workout.warmdown:
+            workoutsets.append(WorkoutSetRow(
+                1, (ExerciseRow('easy', workout.warmdown),)))
+        rows.append(WorkoutRow(start_date + timedelta(weeks=week),
+                               workout.category,
+                               rest_week(week, plan_length),
+                               tuple(workoutsets)))
+    return rows
+
+
+def encode_snapshot(workout_ids, schedule):
+    '''
+    Serialise the workouts of a plan, and their ids, as compact JSON:
+
+        {"v": SNAPSHOT_VERSION,
+         "w": [[id, date, category, rest,
+                [[reps, [[description, duration], ...]], ...]], ...]}
+
+    The workouts may be WorkoutRows or Workout models.
+    '''
+    return json.dumps({'v': SNAPSHOT_VERSION, 'w': [
+        [workout_id, workout.date.isoformat(), workout.category, workout.rest,
+         [[workoutset.reps, [[exercise.description, _number(exercise.duration)]
+                             for exercise in workoutset.exercises]]
+          for workoutset in workout.workoutsets]]
+        for workout_id, workout in zip(workout_ids, schedule)]},
+        separators=(',', ':'))
+
+
+def _number(value):
+    # durations read back from the database are Decimals
+    return value if value is None or isinstance(value, (int, float)) \
+        else float(value)
+
+
+def workout_duration(workout):
+    '''
+    Return the total duration in minutes of a WorkoutRow.
+    '''
+    return sum(workoutset.reps * sum(exercise.duration
+                                     for exercise in workoutset.exercises)
+               for workoutset in workout.workoutsets)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(progressions, plan_length, days):
+    '''
+    Return the schedule for a plan relative to its first progression Monday.
+
+    Memoized on the progressions from the plan registry, so reloading
+    plans.json naturally stops hitting stale templates; days must be a tuple.
+    '''
+    first_monday = progression_start_date(_REFERENCE_DATE, 0)
+    schedule = []
+    for day, workouts in zip(days, progressions):
+        schedule.extend(compile_progression(
+            workouts, progression_start_date(_REFERENCE_DATE, day),
+            plan_length))
+    return tuple(TemplateRow(workout.date - first_monday, workout.category,
+                             workout.rest, workout.workoutsets)
+                 for workout in schedule)
+
+
+def template_cache_info():
+    '''
+    Return hits, misses, maxsize and currsize of the template cache.
+    '''
+    return compile_template.cache_info()
+
+
+def clear_template_cache():
+    compile_template.cache_clear()
+
+
+def compile_schedule(distance, level, start_date, event_date, days,
+                     registry=None):
+    '''
+    Return the schedule for a plan as a tuple of WorkoutRows.
+
+    Each selected training day is paired with the next progression for the
+    distance and level; surplus days or progressions are ignored.
+    '''
+    progressions = (registry or plan_registry).get(distance, level)
+    return compile_plan(progressions, start_date, event_date, days)
+
+
+def compile_plan(progressions, start_date, event_date, days):
+    '''
+    Return the schedule for the given progressions as a tuple of WorkoutRows.
+    '''
+    template = compile_template(progressions,
+                                weeks_between_dates(start_date, event_date),
+                                tuple(days))
+    first_monday = progression_start_date(start_date, 0)
+    return tuple(WorkoutRow(first_monday + row.offset, row.category, row.rest,
+                            row.workoutsets)
+                 for row in template)
@@ -0,0 +1,213 @@
+'''
+Daily emails listing the workouts each user has that day.
+
+todays_workouts reads every workout on a day across all plans, with its
+sets, exercises and owner, in one query driven by the index on
+workouts.date.  The rows are streamed in chunks and grouped per user rather
+than loaded at once.  send_digests renders a message for each user from
+templates looked up once and queues the messages on the outbox a chunk at a
+time, so the outbox's backpressure paces the query.
+
+With a checkpoint, each chunk is flushed through the outbox before the last
+user id in it is recorded.  A run that fails part way then resumes after
+the users already mailed, and a day that has been sent is not sent again.
+
+Delivery, not the query or the rendering, sets the pace: the outbox sends
+over RUN_MAIL_WORKERS connections, two by default, which should be sized for
+the mail relay and the number of users.
+'''
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+from time import sleep
+from timeit import default_timer as timer
+from flask import current_app
+from flask_mail import Message
+from . import db, outbox
+from .models import Exercise, Plan, User, Workout, WorkoutSet
+from .snapshot import SnapshotExercise, SnapshotWorkout, SnapshotWorkoutSet
+
+Digest = namedtuple('Digest', ['user_id', 'email', 'first_name', 'workouts'])
+
+
+def digest_query(day, after=0):
+    workouts, workoutsets, exercises, plans, users = (
+        Workout.__table__, WorkoutSet.__table__, Exercise.__table__,
+        Plan.__table__, User.__table__)
+    return db.select([
+        users.c.id, users.c.email, users.c.first_name, workouts.c.id,
+        workouts.c.plan_id, workouts.c.category, workouts.c.rest,
+        workoutsets.c.id, workoutsets.c.reps, exercises.c.description,
+        exercises.c.duration]) \
+        .select_from(
+            workouts.join(plans, plans.c.id == workouts.c.plan_id)
+            .join(users, users.c.id == plans.c.user_id)
+            .outerjoin(workoutsets,
+                       workoutsets.c.workout_id == workouts.c.id)
+            .outerjoin(exercises,
+                       exercises.c.workoutset_id == workoutsets.c.id)) \
+        .where(workouts.c.date == day).where(users.c.email.isnot(None)) \
+        .where(users.c.id > after) \
+        .order_by(users.c.id, workouts.c.id, workoutsets.c.id,
+                  exercises.c.id)
+
+
+def todays_workouts(day, chunk_size=1000, after=0):
+    '''
+    Yield a Digest for each user after the user id after with workouts on
+    day, in user id order.
+    '''
+    result = db.session.connection() \
+        .execution_options(stream_results=True) \
+        .execute(digest_query(day, after))
+    rows = []
+    while True:
+        chunk = result.fetchmany(chunk_size)
+        if not chunk:
+            break
+        for row in chunk:
+            if rows and row[0] != rows[0][0]:
+                yield _digest(day, rows)
+                rows = []
+            rows.append(row)
+    if rows:
+        yield _digest(day, rows)
+
+
+def _digest(day, rows):
+    user_id, email, first_name = rows[0][:3]
+    workouts = {}
+    for (_, _, _, workout_id, plan_id, category, rest, workoutset_id, reps,
+         description, duration) in rows:
+        _, _, _, workoutsets = workouts.setdefault(
+            workout_id, (plan_id, category, rest, {}))
+        if workoutset_id is not None:
+            _, exercises = workoutsets.setdefault(workoutset_id, (reps, []))
+            if description is not None:
+                exercises.append(SnapshotExercise(description, duration))
+    digest = []
+    for workout_id, (plan_id, category, rest, workoutsets) in \
+            workouts.items():
+        workoutsets = tuple(SnapshotWorkoutSet(reps, tuple(exercises))
+                            for reps, exercises in workoutsets.values())
+        digest.append(SnapshotWorkout(
+            workout_id, plan_id, day, category, bool(rest),
+            sum(workoutset.duration for workoutset in workoutsets),
+            workoutsets))
+    return Digest(user_id, email, first_name, digest)
+
+
+class DigestRenderer(object):
+    '''
+    Builds digest messages from templates looked up once, rather than going
+    through render_template for every user.
+    '''
+
+    def __init__(self, app, day):
+        self.day = day
+        self.subject = (f'{app.config["RUN_MAIL_SUBJECT_PREFIX"]} Your '
+                        f'workouts for {day.strftime("%A %d %B")}')
+        self.sender = app.config['RUN_MAIL_SENDER']
+        self.text = app.jinja_env.get_template('mail/digest.txt')
+        self.html = app.jinja_env.get_template('mail/digest.html')
+
+    def render(self, digest):
+        msg = Message(self.subject, sender=self.sender,
+                      recipients=[digest.email])
+        context = {'digest': digest, 'day': self.day}
+        msg.body = self.text.render(context)
+        msg.html = self.html.render(context)
+        return msg
+
+
+def read_checkpoint(path, day):
+    '''
+    Return the last user id mailed on day and whether the day is done.
+    '''
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return 0, False
+    if data['date'] != day.isoformat():
+        return 0, False
+    return data['last_user_id'], data['done']
+
+
+def write_checkpoint(path, day, last_user_id, done=False):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'date': day.isoformat(), 'last_user_id': last_user_id,
+                   'done': done}, f)
+    os.replace(tmp, path)
+
+
+def send_digests(day, chunk_size=1000, progress=None, checkpoint=None):
+    '''
+    Queue a digest for every user with workouts on day and return the
+    totals.  progress is called with them after each chunk.
+
+    With a checkpoint file, each chunk is sent before it is recorded, and
+    users recorded for day are skipped.
+    '''
+    after, done = read_checkpoint(checkpoint, day) if checkpoint \
+        else (0, False)
+    totals = {'users': 0, 'workouts': 0, 'seconds': 0.0,
+              'resumed_after': after, 'already_sent': done}
+    if done:
+        return totals
+    renderer = DigestRenderer(current_app, day)
+    start = timer()
+    chunk = []
+    last_user_id = after
+
+    def queue():
+        for msg in chunk:
+            outbox.send(msg)
+        if checkpoint:
+            outbox.flush()
+            write_checkpoint(checkpoint, day, last_user_id)
+        totals['users'] += len(chunk)
+        totals['seconds'] = timer() - start
+        chunk.clear()
+        if progress is not None:
+            progress(totals)
+
+    for digest in todays_workouts(day, chunk_size, after):
+        chunk.append(renderer.render(digest))
+        totals['workouts'] += len(digest.workouts)
+        last_user_id = digest.user_id
+        if len(chunk) == chunk_size:
+            queue()
+    if chunk:
+        queue()
+    db.session.rollback()
+    if checkpoint:
+        write_checkpoint(checkpoint, day, last_user_id, done=True)
+    return totals
+
+
+def next_run(at, now):
+    '''
+    The first datetime after now at the time of day at.
+    '''
+    run = datetime.combine(now.date(), at)
+    return run if run > now else run + timedelta(days=1)
+
+
+def run_daily(at, job):
+    '''
+    Call job with the date every day at the time at, until interrupted.
+
+    A day that fails is logged and the loop carries on with the next one.
+    '''
+    while True:
+        run = next_run(at, datetime.now())
+        sleep(max((run - datetime.now()).total_seconds(), 0))
+        try:
+            job(run.date())
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Digests for %s failed',
+                                         run.date())
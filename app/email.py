@@ -1,20 +1,21 @@
-from threading import Thread
 from flask import current_app, render_template
 from flask_mail import Message
-from . import mail
+from . import outbox
 
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
-
-
-def send_email(to, subject, template, **kwargs):
-    app = current_app._get_current_object()
+def build_email(to, subject, template, **kwargs):
+    app = current_app
     msg = Message(app.config['RUN_MAIL_SUBJECT_PREFIX'] + ' ' + subject,
                   sender=app.config['RUN_MAIL_SENDER'], recipients=[to])
     msg.body = render_template(template + '.txt', **kwargs)
     msg.html = render_template(template + '.html', **kwargs)
-    thr = Thread(target=send_async_email, args=[app, msg])
-    thr.start()
-    return thr
+    return msg
+
+
+def send_email(to, subject, template, **kwargs):
+    '''
+    Render a message and queue it on the outbox, waiting while it is full.
+    '''
+    msg = build_email(to, subject, template, **kwargs)
+    outbox.send(msg)
+    return msg
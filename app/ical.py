@@ -0,0 +1,55 @@
+'''
+Serialise training plans as iCalendar (RFC 5545) feeds.
+
+Calendars are produced line by line so they can be streamed straight into a
+response.  Each workout becomes an all-day VEVENT whose UID is stable across
+revisions of the plan, so calendar clients update events in place.
+'''
+PRODID = '-//Run//Training Plan//EN'
+CRLF = '\r\n'
+
+
+def escape(text):
+    '''
+    Escape a TEXT property value.
+    '''
+    return text.replace('\\', '\\\\').replace(';', '\\;') \
+        .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    '''
+    Fold a content line into chunks of at most 75 octets.
+    '''
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + CRLF
+    chunks, limit = [], 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # never split a multi-byte character
+        while cut < len(encoded) and encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        chunks.append(encoded[:cut].decode('utf-8'))
+        encoded, limit = encoded[cut:], 74
+    return (CRLF + ' ').join(chunks) + CRLF
+
+
+def iter_calendar(plan, workouts):
+    '''
+    Yield the lines of a VCALENDAR with one VEVENT per workout.
+    '''
+    stamp = plan.updated.strftime('%Y%m%dT%H%M%SZ')
+    yield 'BEGIN:VCALENDAR' + CRLF
+    yield 'VERSION:2.0' + CRLF
+    yield 'PRODID:' + PRODID + CRLF
+    yield fold('X-WR-CALNAME:' + escape(f'{plan.event.name} training plan'))
+    for workout in workouts:
+        yield 'BEGIN:VEVENT' + CRLF
+        yield f'UID:workout-{workout.id}@run' + CRLF
+        yield f'DTSTAMP:{stamp}' + CRLF
+        yield f'DTSTART;VALUE=DATE:{workout.date:%Y%m%d}' + CRLF
+        yield fold('SUMMARY:' + escape(workout.category))
+        yield fold('DESCRIPTION:' + escape(str(workout)))
+        yield 'END:VEVENT' + CRLF
+    yield 'END:VCALENDAR' + CRLF
@@ -0,0 +1,229 @@
+'''
+Stream event feeds into the events table.
+
+Feeds are read incrementally from JSON (an array of events, or an object
+mapping event names to events as in events.json), JSON Lines or CSV files.
+Each event needs a name, distance and date.  Distances are normalised to the
+keys used by plans.json and events are upserted in batches keyed on
+(name, date).
+'''
+import csv
+import io
+import json
+from datetime import datetime
+from timeit import default_timer as timer
+from sqlalchemy import bindparam, text
+from . import db, cache
+from .exceptions import ValidationError
+from .models import Event
+
+DISTANCES = {
+    '5k': '5k', '5': '5k', '5km': '5k',
+    '10k': '10k', '10': '10k', '10km': '10k',
+    'half': 'half', 'halfmarathon': 'half', '21.1k': 'half',
+    '21.1km': 'half', '13.1': 'half',
+    'full': 'full', 'marathon': 'full', 'fullmarathon': 'full',
+    '42.2k': 'full', '42.2km': 'full', '26.2': 'full',
+}
+
+
+def normalise_distance(distance):
+    '''
+    Map the many spellings found in feeds ("5", "5K", "Half Marathon") to
+    the distances plans are defined for.
+    '''
+    key = str(distance).lower().replace(' ', '').replace('-', '')
+    try:
+        return DISTANCES[key]
+    except KeyError:
+        raise ValidationError(f'unknown distance {distance!r}')
+
+
+def normalise_event(record):
+    try:
+        name, distance, date = (record['name'], record['distance'],
+                                record['date'])
+    except (KeyError, TypeError):
+        raise ValidationError('events need a name, distance and date')
+    name = str(name).strip()
+    if not name or len(name) > 64:
+        raise ValidationError(f'invalid event name {name!r}')
+    try:
+        date = datetime.strptime(str(date)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError(f'invalid date {date!r}, expected YYYY-MM-DD')
+    return {'name': name, 'distance': normalise_distance(distance),
+            'date': date}
+
+
+def iter_json(f, chunk_size=64 * 1024):
+    '''
+    Yield the items of a top-level JSON array, or the (key, value) pairs of
+    a top-level object, without reading the whole document into memory.
+    '''
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def peek():
+        # skip whitespace and return the next significant character
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                raise ValidationError('unexpected end of JSON feed')
+            fill()
+
+    def expect(*allowed):
+        nonlocal pos
+        char = peek()
+        if char not in allowed:
+            raise ValidationError(f'unexpected {char!r} in JSON feed')
+        pos += 1
+        return char
+
+    def value():
+        # decode the next value, only trusting it once more input follows
+        nonlocal pos
+        while True:
+            try:
+                result, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or eof:
+                    pos = end
+                    return result
+            except ValueError:
+                if eof:
+                    raise ValidationError('malformed JSON feed')
+            fill()
+
+    fill()
+    closing = ']' if expect('[', '{') == '[' else '}'
+    if peek() == closing:
+        return
+    while True:
+        if closing == '}':
+            peek()
+            key = value()
+            expect(':')
+            peek()
+            yield key, value()
+        else:
+            peek()
+            yield value()
+        if expect(',', closing) == closing:
+            return
+
+
+def iter_events(f, format):
+    '''
+    Yield raw event records from a feed in the given format.
+
+    A jsonl line that is not JSON is yielded as a ValidationError, so that
+    one bad line does not stop the rest of the feed being read.
+    '''
+    if format == 'csv':
+        yield from csv.DictReader(f)
+    elif format == 'jsonl':
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield ValidationError(f'malformed JSON on line {number}')
+    elif format == 'json':
+        for item in iter_json(f):
+            if isinstance(item, tuple):
+                name, record = item
+                yield dict(record, name=name)
+            else:
+                yield item
+    else:
+        raise ValidationError(f'unknown feed format {format!r}')
+
+
+def upsert_events(rows):
+    '''
+    Insert or update a batch of normalised events keyed on (name, date).
+    '''
+    # the last occurrence of an event in a batch wins
+    rows = list({(row['name'], row['date']): row for row in rows}.values())
+    if not rows:
+        return
+    if db.session.bind.dialect.name in ('sqlite', 'postgresql'):
+        db.session.execute(text(
+            'INSERT INTO events (name, distance, date) '
+            'VALUES (:name, :distance, :date) '
+            'ON CONFLICT (name, date) DO UPDATE '
+            'SET distance = excluded.distance'
+        ).bindparams(bindparam('date', type_=db.Date)), rows)
+        return
+    events = Event.__table__
+    existing = {(name, date) for name, date in db.session.execute(
+        db.select([events.c.name, events.c.date]).where(
+            events.c.name.in_({row['name'] for row in rows})))}
+    new = [row for row in rows if (row['name'], row['date']) not in existing]
+    if new:
+        db.session.execute(events.insert(), new)
+    for row in rows:
+        if (row['name'], row['date']) in existing:
+            db.session.execute(events.update().where(
+                events.c.name == row['name']).where(
+                events.c.date == row['date']).values(
+                distance=row['distance']))
+
+
+def import_events(f, format='json', batch_size=1000, progress=None):
+    '''
+    Import every event in a feed, committing once per batch.
+
+    Invalid records are skipped.  Returns a dict of counts and timings;
+    progress, if given, is called with the same dict after every batch.
+    '''
+    stats = {'imported': 0, 'rejected': 0, 'errors': [], 'seconds': 0}
+    start = timer()
+    batch = []
+
+    def flush():
+        upsert_events(batch)
+        db.session.commit()
+        stats['imported'] += len(batch)
+        stats['seconds'] = timer() - start
+        del batch[:]
+        if progress is not None:
+            progress(stats)
+
+    for record in iter_events(f, format):
+        try:
+            if isinstance(record, ValidationError):
+                raise record
+            batch.append(normalise_event(record))
+        except ValidationError as e:
+            stats['rejected'] += 1
+            if len(stats['errors']) < 10:
+                stats['errors'].append(str(e))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    cache.delete_prefix('events/')
+    return stats
+
+
+def feed_format(path):
+    for extension, format in (('.csv', 'csv'), ('.jsonl', 'jsonl'),
+                              ('.ndjson', 'jsonl'), ('.json', 'json')):
+        if path.lower().endswith(extension):
+            return format
+    raise ValidationError(f'cannot tell the format of {path}')
+
+
+def open_feed(path):
+    return io.open(path, newline='', encoding='utf-8')
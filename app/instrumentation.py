@@ -0,0 +1,220 @@
+'''
+Per-request SQL and template timings, enabled with RUN_INSTRUMENTATION.
+
+While enabled, every statement the engines run and every template rendered
+during a request is timed.  At the end of the request the totals are
+
+* sent back in a Server-Timing header, shown by the browser's network panel,
+* logged as one JSON line, and
+* folded into per-endpoint statistics, shown by the Performance admin view.
+
+Statistics are kept per process.  Work done while a streamed response is
+being sent, such as the ICS feed, happens after the totals are taken and is
+not counted.  When disabled nothing is hooked up.
+'''
+import json
+from threading import Lock
+from timeit import default_timer as timer
+from flask import current_app, g, has_app_context, request, \
+    before_render_template, template_rendered
+from flask_admin import BaseView, expose
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# longest statement kept in logs and statistics
+MAX_STATEMENT_LENGTH = 500
+
+
+class RequestTimings(object):
+    '''
+    What one request spent on SQL and templates, in seconds.
+    '''
+
+    def __init__(self):
+        self.start = timer()
+        self.queries = 0
+        self.sql = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.template = 0.0
+        self.templates = []
+
+    def add_query(self, statement, elapsed):
+        self.queries += 1
+        self.sql += elapsed
+        if elapsed >= self.slowest:
+            self.slowest = elapsed
+            self.slowest_statement = statement[:MAX_STATEMENT_LENGTH]
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'sql;dur={self.sql * 1000:.1f};desc="{self.queries} queries"',
+            f'sql-slowest;dur={self.slowest * 1000:.1f}',
+            f'template;dur={self.template * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}'])
+
+    def to_dict(self, total):
+        return {
+            'queries': self.queries,
+            'sql_ms': round(self.sql * 1000, 3),
+            'slowest_ms': round(self.slowest * 1000, 3),
+            'slowest_statement': self.slowest_statement,
+            'template_ms': round(self.template * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+        }
+
+
+class EndpointStats(object):
+    '''
+    Running totals for the requests to one endpoint.
+    '''
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.requests = 0
+        self.total = self.worst = 0.0
+        self.queries = self.most_queries = 0
+        self.sql = self.template = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+
+    def add(self, timings, total):
+        self.requests += 1
+        self.total += total
+        self.worst = max(self.worst, total)
+        self.queries += timings.queries
+        self.most_queries = max(self.most_queries, timings.queries)
+        self.sql += timings.sql
+        self.template += timings.template
+        if timings.slowest >= self.slowest:
+            self.slowest = timings.slowest
+            self.slowest_statement = timings.slowest_statement
+
+    @property
+    def mean(self):
+        return self.total / self.requests
+
+    @property
+    def mean_queries(self):
+        return self.queries / self.requests
+
+
+class Instrumentation(object):
+    '''
+    Flask extension timing requests when RUN_INSTRUMENTATION is set.
+    '''
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.stats = {}
+        self.lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['instrumentation'] = self
+        if not app.config.get('RUN_INSTRUMENTATION'):
+            return
+        self.enabled = True
+        _listen_to_engines()
+        before_render_template.connect(_start_template, app)
+        template_rendered.connect(_finish_template, app)
+        app.before_request(_start_request)
+        app.after_request(self.finish_request)
+
+    def finish_request(self, response):
+        timings = g.pop('run_timings', None)
+        if timings is None:
+            return response
+        total = timer() - timings.start
+        response.headers['Server-Timing'] = timings.server_timing(total)
+        endpoint = request.endpoint or 'unknown'
+        record = dict(timings.to_dict(total), endpoint=endpoint,
+                      method=request.method, path=request.path,
+                      status=response.status_code)
+        current_app.logger.info('request %s', json.dumps(record,
+                                                         sort_keys=True))
+        with self.lock:
+            if endpoint not in self.stats:
+                self.stats[endpoint] = EndpointStats(endpoint)
+            self.stats[endpoint].add(timings, total)
+        return response
+
+    def slowest_endpoints(self, limit=50):
+        '''
+        Return the EndpointStats with the highest mean response times.
+        '''
+        with self.lock:
+            stats = list(self.stats.values())
+        return sorted(stats, key=lambda stat: stat.mean, reverse=True)[:limit]
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+
+
+def current_timings():
+    '''
+    The RequestTimings of the request being handled, if it is being timed.
+    '''
+    return g.get('run_timings') if has_app_context() else None
+
+
+def _start_request():
+    g.run_timings = RequestTimings()
+
+
+def _start_template(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None:
+        timings.templates.append(timer())
+
+
+def _finish_template(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None and timings.templates:
+        elapsed = timer() - timings.templates.pop()
+        # templates rendered while another renders count towards it
+        if not timings.templates:
+            timings.template += elapsed
+
+
+_listening = False
+
+
+def _listen_to_engines():
+    # engines come and go with the apps and their database URIs, so listen
+    # on the Engine class once rather than on each engine
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _start_query)
+        event.listen(Engine, 'after_cursor_execute', _finish_query)
+        _listening = True
+
+
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.run_query_start = timer()
+
+
+def _finish_query(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    start = getattr(context, 'run_query_start', None)
+    if timings is not None and start is not None:
+        timings.add_query(statement, timer() - start)
+
+
+class PerformanceView(BaseView):
+    '''
+    Admin page listing the slowest endpoints since the process started.
+    '''
+
+    def __init__(self, instrumentation, *args, **kwargs):
+        super(PerformanceView, self).__init__(*args, **kwargs)
+        self.instrumentation = instrumentation
+
+    @expose('/')
+    def index(self):
+        return self.render('admin/performance.html',
+                           enabled=self.instrumentation.enabled,
+                           endpoints=self.instrumentation.slowest_endpoints())
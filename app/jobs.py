@@ -0,0 +1,158 @@
+'''
+Background plan generation.
+
+With RUN_PLAN_JOBS enabled, /create records a PlanJob instead of building the
+plan inside the request.  ``flask plan-worker`` claims queued jobs in
+batches, builds their plans and records the outcome, which the user page
+polls for.  The plan_jobs table is the queue, so no broker is needed and any
+number of workers can share it.
+'''
+import os
+import socket
+from datetime import date, datetime, timedelta
+from time import sleep
+from . import db
+from .models import Plan, PlanJob
+
+
+def build_plan(user, event, level, days):
+    '''
+    Replace a user's plan with a newly generated one, without committing.
+    '''
+    for plan in Plan.query.filter_by(user=user):
+        db.session.delete(plan)
+    plan = Plan(start_date=date.today(), event=event, level=level, user=user)
+    db.session.add(plan)
+    plan.create(days)
+    return plan
+
+
+def enqueue_plan(user, event, level, days):
+    '''
+    Queue the generation of a plan, superseding the user's queued jobs.
+    '''
+    PlanJob.query.filter_by(user_id=user.id, status=PlanJob.QUEUED).update(
+        {'status': PlanJob.SUPERSEDED, 'finished': datetime.utcnow()},
+        synchronize_session=False)
+    job = PlanJob(user_id=user.id, event_id=event.id, level=level)
+    job.weekdays = days
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def pending_job(user):
+    '''
+    The user's latest job if it is yet to finish or has failed.
+    '''
+    job = PlanJob.query.filter_by(user_id=user.id) \
+        .order_by(PlanJob.id.desc()).first()
+    if job is not None and job.status in PlanJob.PENDING + (PlanJob.FAILED,):
+        return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_jobs(worker, limit):
+    '''
+    Mark up to limit of the oldest queued jobs as running for this worker.
+
+    The status check in the UPDATE keeps two workers from claiming the same
+    job.
+    '''
+    queued = db.session.query(PlanJob.id).filter(
+        PlanJob.status == PlanJob.QUEUED).order_by(PlanJob.id).limit(limit)
+    PlanJob.query.filter(PlanJob.id.in_(queued.subquery())) \
+        .filter(PlanJob.status == PlanJob.QUEUED) \
+        .update({'status': PlanJob.RUNNING, 'worker': worker,
+                 'started': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    return PlanJob.query.filter_by(worker=worker, status=PlanJob.RUNNING) \
+        .order_by(PlanJob.id).all()
+
+
+def requeue_stale_jobs(timeout):
+    '''
+    Put back jobs whose worker has been running them for longer than timeout,
+    presumably because it died.
+    '''
+    count = PlanJob.query.filter(
+        PlanJob.status == PlanJob.RUNNING,
+        PlanJob.started < datetime.utcnow() - timeout).update(
+        {'status': PlanJob.QUEUED, 'worker': None, 'started': None},
+        synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def _finish(job, plan):
+    job.status, job.plan_id = PlanJob.DONE, plan.id
+    job.finished = datetime.utcnow()
+
+
+def _fail(job, error):
+    job.status, job.error = PlanJob.FAILED, str(error)
+    job.finished = datetime.utcnow()
+
+
+def run_jobs(jobs):
+    '''
+    Build the plans for claimed jobs in one transaction.
+
+    If any of them fails the batch is rolled back and retried one job at a
+    time, so a bad job only fails itself.
+    '''
+    # only the latest of a user's jobs is worth building
+    latest = {job.user_id: job for job in jobs}
+    for job in jobs:
+        if latest[job.user_id] is not job:
+            job.status, job.finished = PlanJob.SUPERSEDED, datetime.utcnow()
+    db.session.commit()
+    jobs = list(latest.values())
+    ids = [job.id for job in jobs]
+    try:
+        for job in jobs:
+            _finish(job, build_plan(job.user, job.event, job.level,
+                                    job.weekdays))
+        db.session.commit()
+        return
+    except Exception:
+        db.session.rollback()
+    for job in PlanJob.query.filter(PlanJob.id.in_(ids)).all():
+        try:
+            _finish(job, build_plan(job.user, job.event, job.level,
+                                    job.weekdays))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            _fail(job, e)
+            db.session.commit()
+
+
+def work(batch_size=20, poll=1.0, once=False, stale=timedelta(minutes=10),
+         log=None, requeue_every=timedelta(minutes=1), stop=None):
+    '''
+    Process queued jobs until interrupted or stop (an Event) is set, or until
+    the queue is empty if once is set.  Jobs stranded by dead workers are
+    put back every requeue_every.  Returns the number of jobs processed.
+    '''
+    worker = worker_name()
+    processed = 0
+    next_requeue = datetime.utcnow()
+    while stop is None or not stop.is_set():
+        if datetime.utcnow() >= next_requeue:
+            requeue_stale_jobs(stale)
+            next_requeue = datetime.utcnow() + requeue_every
+        jobs = claim_jobs(worker, batch_size)
+        if jobs:
+            run_jobs(jobs)
+            processed += len(jobs)
+            if log is not None:
+                log(f'{worker} built {len(jobs)} plans ({processed} total)')
+        elif once:
+            break
+        else:
+            sleep(poll)
+    return processed
@@ -1,16 +1,45 @@
 from calendar import HTMLCalendar
-from datetime import date
-from itertools import groupby
+
+
+def group_by_month(workouts):
+    '''
+    Bucket workouts sorted by date into an ordered list of
+    ((year, month), {day: workout}) covering every month from the first
+    workout to the last, including months without workouts.
+    '''
+    months = []
+    for workout in workouts:
+        key = (workout.date.year, workout.date.month)
+        if not months or months[-1][0] != key:
+            if months:
+                months.extend((month, {}) for month in
+                              months_between(months[-1][0], key))
+            months.append((key, {}))
+        months[-1][1][workout.date.day] = workout
+    return months
+
+
+def months_between(first, last):
+    '''
+    Yield the (year, month) pairs strictly between two months
+    '''
+    year, month = first
+    while True:
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        if (year, month) >= last:
+            return
+        yield year, month
 
 
 class WorkoutCalendar(HTMLCalendar):
     '''
-    A workout calendar renderer
+    A workout calendar renderer for a date-ordered sequence of workouts
     '''
 
     def __init__(self, workouts, *args, **kwargs):
         super(WorkoutCalendar, self).__init__(*args, **kwargs)
-        self.workouts = workouts
+        self.months = group_by_month(workouts)
+        self.days = {}
 
     def formatday(self, day, weekday):
 
@@ -18,29 +47,31 @@ class WorkoutCalendar(HTMLCalendar):
         if day == 0:
             return self.day_cell('noday', '&nbsp;')
 
-        date_obj = date(self.year, self.month, day)
         cssclass = self.cssclasses[weekday]
-        if date.today() == date_obj:
-            cssclass += ' today'
+        iso_date = self.iso_month + '{0:02d}'.format(day)
+        workout = self.days.get(day)
 
         # There are no logs for this day, doesn't need special attention
-        if date_obj not in self.workouts:
-            return self.day_cell(cssclass, day)
+        if workout is None:
+            return self.day_cell(cssclass, day, iso_date)
 
         # Day with a workout
-        workout = self.workouts.get(date_obj)
         body = []
         body.append(repr(day))
         body.append(
             '<a href="/workout/{0}"><button type="button" class="btn btn-{1} btn-block">{2} ({3:,.0f}mins)</button></a>'.format(workout.id, workout.category, workout.category.capitalize(), workout.duration))
-        return self.day_cell(cssclass, '{0}'.format(''.join(body)))
+        return self.day_cell(cssclass, '{0}'.format(''.join(body)), iso_date)
 
-    def formatmonth(self, year, month, withyear=False):
+    def formatmonth(self, year, month, withyear=False, days=None):
         '''
         Format the table header. This is basically the same code from python's
         calendar module but with additional bootstrap classes
         '''
         self.year, self.month = year, month
+        self.iso_month = '{0:04d}-{1:02d}-'.format(year, month)
+        if days is None:
+            days = dict(self.months).get((year, month), {})
+        self.days = days
         out = []
         out.append('<table class="month table table-bordered">\n')
         out.append(self.formatmonthname(year, month))
@@ -53,8 +84,26 @@ class WorkoutCalendar(HTMLCalendar):
         out.append('</table>\n')
         return ''.join(out)
 
-    def day_cell(self, cssclass, body):
+    def formatmonths(self):
+        '''
+        Format every month from the first workout to the last
+        '''
+        return [self.formatmonth(year, month, days=days)
+                for (year, month), days in self.months]
+
+    def day_cell(self, cssclass, body, iso_date=None):
         '''
         Renders a day cell
         '''
-        return '<td class="{0}" style="vertical-align: center;">{1}</td>'.format(cssclass, body)
+        if iso_date is None:
+            return '<td class="{0}" style="vertical-align: center;">{1}</td>'.format(cssclass, body)
+        return '<td class="{0}" data-date="{1}" style="vertical-align: center;">{2}</td>'.format(cssclass, iso_date, body)
+
+
+def mark_today(html, today):
+    '''
+    Add the today class to the cell for today in a rendered calendar, so the
+    rest of the rendering does not depend on the day it was made.
+    '''
+    marker = '" data-date="{0}"'.format(today.isoformat())
+    return html.replace(marker, ' today' + marker, 1)
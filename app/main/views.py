@@ -1,21 +1,24 @@
 from datetime import date, timedelta
-from ics import Calendar
-from ics import Event as icsEvent
 from flask import render_template, session, redirect, url_for, current_app, \
-    flash, send_file
+    flash, request, Response, stream_with_context, jsonify, abort
 from flask_login import current_user, login_required
-from .. import db
-from ..models import User, Event, Plan, Workout
+from sqlalchemy.orm import subqueryload
+from werkzeug.http import is_resource_modified
+from .. import db, cache
+from ..models import User, Event, Plan, PlanJob, Workout, WorkoutSet, \
+    upcoming_events
 from ..email import send_email
+from ..ical import iter_calendar
+from ..jobs import build_plan, enqueue_plan, pending_job
+from ..snapshot import load_schedule, load_workout
 from . import main
 from .forms import PlanForm, WorkoutForm
-from .calendar import WorkoutCalendar
+from .calendar import WorkoutCalendar, mark_today
 
 
 @main.route('/', methods=['GET', 'POST'])
 def index():
-    events = [event for event in Event.query.order_by(
-        'date').all() if event.date >= date.today()]
+    events = upcoming_events(current_app.config['RUN_INDEX_EVENTS'])
     return render_template('index.html', events=events)
 
 
@@ -24,22 +27,15 @@ def index():
 def user(id):
     user = User.query.filter_by(id=id).first_or_404()
     plan = Plan.query.filter_by(user=user).first()
+    job = pending_job(user)
     calendars = False
 
     if plan:
-        workouts = {workout.date: workout for workout in plan.workouts}
+        today = date.today()
+        calendars = [mark_today(calendar, today)
+                     for calendar in plan_calendars(plan)]
 
-        calendars = []
-
-        for i, workout_date in enumerate(workouts):
-            if i == 0:
-                calendar_workout_date = workout_date
-            if i == 0 or is_next_month(calendar_workout_date, workout_date):
-                calendars.append(WorkoutCalendar(
-                    workouts).formatmonth(workout_date.year, workout_date.month))
-                calendar_workout_date = workout_date
-
-    return render_template('user.html', user=user, plan=plan,
+    return render_template('user.html', user=user, plan=plan, job=job,
                            calendars=calendars)
 
 
@@ -47,58 +43,81 @@ def user(id):
 @login_required
 def create():
     form = PlanForm()
-    form.event_id.choices = [(e.id, e.name)
-                             for e in Event.query.order_by('name') if date.today() < e.date < (date.today() + timedelta(weeks=4 * 12))]
+    today = date.today()
+    form.event_id.choices = Event.query.between(
+        today + timedelta(days=1), today + timedelta(weeks=4 * 12)) \
+        .order_by(Event.name).with_entities(Event.id, Event.name).all()
     if form.validate_on_submit():
-        plan = Plan.query.filter_by(
-            user=current_user._get_current_object()).first()
-        if plan is not None:
-            db.session.delete(plan)
+        user = current_user._get_current_object()
         event = Event.query.filter_by(id=form.event_id.data).first()
-        plan = Plan(start_date=date.today(), event=event, level=form.level.data,
-                    user=current_user._get_current_object())
-        db.session.add(plan)
         days = [day for day in form.days.data]
-        plan.create(days)
-        db.session.commit()
-        flash('Plan created.')
+        if current_app.config['RUN_PLAN_JOBS']:
+            enqueue_plan(user, event, form.level.data, days)
+            flash('Your plan is being created.')
+        else:
+            build_plan(user, event, form.level.data, days)
+            db.session.commit()
+            flash('Plan created.')
         return redirect(url_for('.user', id=current_user.id))
     return render_template('create.html', form=form)
 
 
+@main.route('/plan-job/<int:id>')
+@login_required
+def plan_job(id):
+    job = PlanJob.query.get_or_404(id)
+    if job.user_id != current_user.id:
+        abort(404)
+    return jsonify(job.to_dict())
+
+
 @main.route('/workout/<int:id>', methods=['GET', 'POST'])
 @login_required
 def workout(id):
-    workout = Workout.query.get_or_404(id)
+    workout = load_workout(id) or Workout.query.options(
+        subqueryload(Workout.workoutsets).subqueryload(WorkoutSet.exercises)
+    ).get_or_404(id)
     return render_template('workout.html', workout=workout)
 
 
 @main.route('/plan/<int:id>/ical', methods=['GET', 'POST'])
 def ical(id):
     plan = Plan.query.get_or_404(id)
-    c = Calendar()
-    for workout in plan.workouts:
-        e = icsEvent()
-        e.name = workout.category
-        e.begin = str(workout.date)
-        e.description = str(workout)
-        print(e.description)
-        c.events.append(e)
-
-    print(c.events)
-
-    with open('app/workout-cal.ics', 'w') as f:
-        f.writelines(c)
-
-    try:
-        return send_file('workout-cal.ics', attachment_filename='workout-cal.ics')
-    except Exception as e:
-        return str(e)
-
-    return redirect(url_for('.plan', id=id))
-
-
-def is_next_month(first_date, second_date):
-    """ Return True if second_date is in following month to first_date """
-    return (second_date.month - first_date.month) + \
-        (second_date.year - first_date.year) * first_date.month == 1
+    etag = f'{plan.id}-{plan.version}'
+    # answer conditional requests before loading or rendering anything
+    if request.method in ('GET', 'HEAD') and not is_resource_modified(
+            request.environ, etag, last_modified=plan.updated):
+        response = Response(status=304)
+    else:
+        key = plan.cache_key('ics')
+        body = cache.get(key)
+        if body is None:
+            body = stream_with_context(cache_as_generated(
+                key, iter_calendar(plan, load_schedule(plan))))
+        response = Response(body, mimetype='text/calendar')
+        response.headers['Content-Disposition'] = \
+            'attachment; filename=workout-cal.ics'
+    response.set_etag(etag)
+    response.last_modified = plan.updated
+    return response
+
+
+def cache_as_generated(key, chunks):
+    """ Pass chunks through, caching them once they have all been sent """
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(body))
+
+
+def plan_calendars(plan):
+    """ Return the rendered months of a plan, cached per plan revision """
+    key = plan.cache_key('calendars')
+    calendars = cache.get(key)
+    if calendars is None:
+        calendars = WorkoutCalendar(load_schedule(plan)).formatmonths()
+        # older revisions of this plan will never be asked for again
+        cache.delete_prefix(plan.cache_prefix)
+        cache.set(key, calendars)
+    return calendars
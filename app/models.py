@@ -1,17 +1,23 @@
-from datetime import datetime, date, timedelta
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime, date
 from dateutil import parser as datetime_parser
 from dateutil.tz import tzutc
 from collections import namedtuple
-from itertools import cycle
 from flask import url_for
 from flask_admin import BaseView, expose
 from flask_admin.contrib.sqla import ModelView
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from . import db, admin, login_manager
+from flask_sqlalchemy import BaseQuery
+from . import db, admin, login_manager, plan_registry, cache, \
+    instrumentation
 from .exceptions import ValidationError
-from .builder import weeks_between_dates, progression_start_date, \
-    reps_or_duration, rest_week
+from .instrumentation import PerformanceView
+from .builder import weeks_between_dates
+from .compiler import compile_schedule, encode_snapshot, workout_duration
+
+UPCOMING_EVENTS_TTL = 60
 
 
 class PaginatedAPIMixin(object):
@@ -32,12 +38,78 @@ class PaginatedAPIMixin(object):
                 'next': url_for(endpoint, page=page + 1, per_page=per_page,
                                 **kwargs) if resources.has_next else None,
                 'prev': url_for(endpoint, page=page - 1, per_page=per_page,
-                                **kwargs) if resources.has_next else None
+                                **kwargs) if resources.has_prev else None
+            }
+        }
+        return data
+
+    @staticmethod
+    def to_cursor_collection_dict(query, key, after, per_page, endpoint,
+                                  count=False, item_dict=None, **kwargs):
+        '''
+        Page through query in key order, starting after an opaque cursor.
+
+        Each page is a range scan on key rather than an OFFSET, so deep pages
+        cost the same as the first; the total is only counted on request.
+        '''
+        page = query.order_by(key)
+        if after:
+            page = page.filter(key > decode_cursor(after))
+        return PaginatedAPIMixin.to_cursor_page_dict(
+            page.limit(per_page + 1).all(), key.key, after, per_page,
+            endpoint, query.order_by(None).count() if count else None,
+            item_dict, **kwargs)
+
+    @staticmethod
+    def to_cursor_page_dict(items, key, after, per_page, endpoint,
+                            total=None, item_dict=None, **kwargs):
+        '''
+        Build a cursor page from up to per_page + 1 items following the
+        cursor, in order of their key attribute.
+        '''
+        if total is not None:
+            kwargs['count'] = 1
+        has_next = len(items) > per_page
+        items = items[:per_page]
+        data = {
+            'items': [item_dict(item) if item_dict else item.to_dict()
+                      for item in items],
+            '_meta': {
+                'per_page': per_page,
+            },
+            '_links': {
+                'self': url_for(endpoint, after=after, per_page=per_page,
+                                **kwargs),
+                'next': url_for(endpoint, per_page=per_page,
+                                after=encode_cursor(getattr(items[-1], key)),
+                                **kwargs) if has_next else None
             }
         }
+        if total is not None:
+            data['_meta']['total_items'] = total
         return data
 
 
+def _float(value):
+    # Numeric columns read back as Decimals, which JSON has no type for
+    return None if value is None else float(value)
+
+
+def encode_cursor(value):
+    return urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value = json.loads(urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValidationError('invalid cursor')
+    # every key paged on is an integer id
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValidationError('invalid cursor')
+    return value
+
+
 @login_manager.user_loader
 def load_user(id):
     return User.query.get(int(id))
@@ -86,14 +158,81 @@ class User(UserMixin, PaginatedAPIMixin, db.Model):
             self.set_password(data['password'])
 
 
+class EventQuery(BaseQuery):
+    '''
+    Chainable event filters that run in SQL against the events indexes
+    '''
+
+    def between(self, start=None, end=None):
+        '''
+        Events on or after start and before end
+        '''
+        query = self
+        if start is not None:
+            query = query.filter(Event.date >= start)
+        if end is not None:
+            query = query.filter(Event.date < end)
+        return query
+
+    def upcoming(self, today=None):
+        return self.between(start=today or date.today()).order_by(
+            Event.date, Event.id)
+
+    def distance(self, distance):
+        return self.filter(Event.distance == distance)
+
+    def named(self, text):
+        '''
+        Events with text anywhere in their name, ignoring case
+        '''
+        text = text.replace('\\', '\\\\').replace('%', '\\%') \
+            .replace('_', '\\_')
+        return self.filter(Event.name.ilike(f'%{text}%', escape='\\'))
+
+    def after(self, cursor):
+        '''
+        Events following a (date, id) cursor in date order
+        '''
+        after_date, after_id = cursor
+        return self.filter(db.or_(
+            Event.date > after_date,
+            db.and_(Event.date == after_date, Event.id > after_id)))
+
+
+EventSummary = namedtuple('EventSummary', ['id', 'name', 'distance', 'date'])
+
+
+def upcoming_events(limit, distance=None):
+    '''
+    Return the next limit events as EventSummary tuples, shared between
+    requests for UPCOMING_EVENTS_TTL seconds.
+    '''
+    today = date.today()
+    key = f'events/upcoming/{today}/{distance}/{limit}'
+    events = cache.get(key)
+    if events is None:
+        query = Event.query.upcoming(today)
+        if distance is not None:
+            query = query.distance(distance)
+        events = [EventSummary(*row) for row in query.with_entities(
+            Event.id, Event.name, Event.distance, Event.date).limit(limit)]
+        cache.set(key, events, timeout=UPCOMING_EVENTS_TTL)
+    return events
+
+
 class Event(PaginatedAPIMixin, db.Model):
 
     __tablename__ = 'events'
+    __table_args__ = (
+        db.Index('ix_events_distance_date', 'distance', 'date'),
+        db.Index('uq_events_name_date', 'name', 'date', unique=True),
+    )
+    query_class = EventQuery
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64))
     distance = db.Column(db.String(64))
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
     plans = db.relationship('Plan', backref='event', lazy='dynamic')
 
     def __repr__(self):
@@ -126,7 +265,8 @@ class Exercise(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(128))
     duration = db.Column(db.Numeric)
-    workoutset_id = db.Column(db.Integer, db.ForeignKey('workoutsets.id'))
+    workoutset_id = db.Column(db.Integer, db.ForeignKey('workoutsets.id'),
+                              index=True)
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.description} ({self.duration})>'
@@ -139,6 +279,12 @@ class Exercise(db.Model):
             duration = f'{self.duration:.0f}mins'
         return f'{self.description} ({duration})'
 
+    def to_dict(self, expand=()):
+        return {
+            'description': self.description,
+            'duration': _float(self.duration),
+        }
+
 
 class WorkoutSet(db.Model):
 
@@ -146,8 +292,10 @@ class WorkoutSet(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     reps = db.Column(db.Integer)
-    exercises = db.relationship('Exercise', backref='workoutset')
-    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.id'))
+    exercises = db.relationship('Exercise', backref='workoutset',
+                                order_by='Exercise.id')
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.id'),
+                           index=True)
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.reps}>'
@@ -163,17 +311,32 @@ class WorkoutSet(db.Model):
         durations = [exercise.duration for exercise in self.exercises]
         return self.reps * sum(durations)
 
+    def to_dict(self, expand=()):
+        data = {
+            'reps': self.reps,
+            'duration': _float(self.duration),
+        }
+        if 'exercises' in expand:
+            data['exercises'] = [exercise.to_dict(expand)
+                                 for exercise in self.exercises]
+        return data
+
 
 class Workout(PaginatedAPIMixin, db.Model):
 
     __tablename__ = 'workouts'
+    __table_args__ = (
+        db.Index('ix_workouts_plan_id_date', 'plan_id', 'date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, default=datetime.now())
+    date = db.Column(db.Date, default=datetime.now(), index=True)
     category = db.Column(db.String(128))
     rest = db.Column(db.Boolean)
+    # total of the workout sets, maintained by update_durations
+    duration = db.Column(db.Numeric, index=True)
     workoutsets = db.relationship(
-        'WorkoutSet', backref='workout', lazy='dynamic',
+        'WorkoutSet', backref='workout', order_by='WorkoutSet.id',
         cascade='all, delete-orphan')
     plan_id = db.Column(db.Integer, db.ForeignKey('plans.id'))
 
@@ -189,21 +352,21 @@ class Workout(PaginatedAPIMixin, db.Model):
             description += ']\n'
         return description
 
-    @property
-    def duration(self):
-        durations = [workoutset.duration for workoutset in self.workoutsets]
-        return sum(durations)
-
-    def to_dict(self):
+    def to_dict(self, expand=()):
         data = {
             'id': self.id,
-            'date': self.date.iso_format() + 'Z',
+            'date': self.date.isoformat() + 'Z',
             'category': self.category,
             'rest': self.rest,
+            'duration': _float(self.duration),
             '_links': {
                 'self': url_for('api.get_workout', id=self.id),
+                'plan': url_for('api.get_plan', id=self.plan_id),
             }
         }
+        if 'workoutsets' in expand:
+            data['workoutsets'] = [workoutset.to_dict(expand)
+                                   for workoutset in self.workoutsets]
         return data
 
     def from_dict(self, data):
@@ -225,434 +388,69 @@ class Plan(db.Model):
     workouts = db.relationship(
         'Workout', backref='plan', lazy='dynamic',
         cascade='all, delete-orphan')
-    event_id = db.Column(db.Integer, db.ForeignKey('events.id'))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    # total of the workouts, maintained by update_durations
+    duration = db.Column(db.Numeric)
+    # bumped whenever the workouts change, for keying cached renderings
+    revision = db.Column(db.Integer, nullable=False, default=1)
+    updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # comma separated training weekdays, Monday being 0
+    days = db.Column(db.String(16))
+    # the workouts serialised by encode_snapshot, cleared by update_durations
+    # whenever they change
+    snapshot = db.Column(db.Text)
 
     @property
     def progressions(self):
-        plans = {
-            '5k': {
-                'Beginner': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-                'Intermediate': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-                'Advanced': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-            },
-            '10k': {
-                'Beginner': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-                'Intermediate': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-                'Advanced': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ]
-            },
-            'half': {
-                'Beginner': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-                'Intermediate': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-                'Advanced': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-            },
-            'full': {
-                'Beginner': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-                'Intermediate': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ],
-                'Advanced': [
-                    (self.runeasy_progression, {
-                        'start': 25,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    }),
-                    (self.intervals_hillsprint_progression, {
-                        'intervals_warmupdown': 10,
-                        'intervals_reps_start': 5,
-                        'intervals_reps_step': 1,
-                        'intervals_reps_interval': 1,
-                        'intervals_reps_max': 8,
-                        'intervals_duration_start': 0.25,
-                        'intervals_duration_step': 0.25,
-                        'intervals_duration_interval': 1,
-                        'intervals_duration_maximum': 1,
-                        'hillsprint_warmupdown': 12,
-                        'hillsprint_reps_start': 6,
-                        'hillsprint_reps_step': 2,
-                        'hillsprint_reps_interval': 3,
-                        'hillsprint_reps_max': 10,
-                        'hillsprint_duration_start': 0.25,
-                        'hillsprint_duration_step': 0,
-                        'hillsprint_duration_interval': 0,
-                        'hillsprint_duration_maximum': 0.25
-                    }),
-                    (self.runeasy_progression, {
-                        'start': 30,
-                        'step': 5,
-                        'interval': 3,
-                        'maximum': 35
-                    })
-                ]
-            }
-        }
-        return plans[self.event.distance][self.level]
+        return plan_registry.get(self.event.distance, self.level)
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.level}>'
 
+    @property
+    def cache_prefix(self):
+        return f'plan/{self.id}/'
+
+    @property
+    def version(self):
+        '''
+        Identifies the current revision of this plan, even once SQLite has
+        reused the id of a deleted plan whose revisions also began at 1
+        '''
+        return f'{self.revision}-{self.updated:%Y%m%d%H%M%S%f}'
+
+    def cache_key(self, name):
+        '''
+        Key for a cached rendering of the current revision of the plan
+        '''
+        return f'{self.cache_prefix}{name}/{self.version}'
+
+    def load_graph(self):
+        '''
+        Load the plan's workouts together with their sets and exercises
+        '''
+        return PlanGraph(self)
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'level': self.level,
+            'start_date': self.start_date.isoformat() + 'Z',
+            'days': self.weekdays,
+            'duration': _float(self.duration),
+            'revision': self.revision,
+            'updated': self.updated.isoformat() + 'Z',
+            '_links': {
+                'self': url_for('api.get_plan', id=self.id),
+                'workouts': url_for('api.get_plan_workouts', id=self.id),
+                'event': url_for('api.get_event', id=self.event_id)
+                if self.event_id else None,
+                'ical': url_for('main.ical', id=self.id),
+            }
+        }
+        return data
+
     @property
     def length(self):
         '''
@@ -660,119 +458,279 @@ class Plan(db.Model):
         '''
         return weeks_between_dates(self.start_date, self.event.date)
 
+    @property
+    def weekdays(self):
+        return [int(day) for day in (self.days or '').split(',') if day]
+
+    @weekdays.setter
+    def weekdays(self, days):
+        self.days = ','.join(str(day) for day in days)
+
     def create(self, days):
         '''
         Populate schedule with workouts based on selected plan
         '''
+        self.weekdays = days
+        self.insert_schedule(compile_schedule(
+            self.event.distance, self.level, self.start_date,
+            self.event.date, days))
+
+    def insert_schedule(self, schedule):
+        '''
+        Write a schedule of WorkoutRows with one multi-row INSERT per table.
+        '''
+        if not schedule:
+            return
+        if self.id is None:
+            db.session.add(self)
+            db.session.flush()
+        self.duration, self.snapshot = \
+            insert_schedules({self.id: schedule})[self.id]
+
+
+def insert_schedules(schedules):
+    '''
+    Write the schedules of several plans, given as {plan_id: WorkoutRows},
+    with one multi-row INSERT per table and return their total durations and
+    snapshots as {plan_id: (duration, snapshot)}.
+
+    Primary keys are read back in insertion order so that child rows can be
+    linked to their parents without a round trip per row.
+    '''
+    plan_ids = list(schedules)
+    rows = [(plan_id, workout, workout_duration(workout))
+            for plan_id in plan_ids for workout in schedules[plan_id]]
+    schedule = [workout for _, workout, _ in rows]
+    workout_ids = _bulk_insert(
+        Workout,
+        [{'plan_id': plan_id, 'date': workout.date,
+          'category': workout.category, 'rest': workout.rest,
+          'duration': duration}
+         for plan_id, workout, duration in rows],
+        Workout.plan_id.in_(plan_ids))
+
+    workoutsets = [(workout_id, workoutset)
+                   for workout_id, workout in zip(workout_ids, schedule)
+                   for workoutset in workout.workoutsets]
+    workoutset_ids = _bulk_insert(
+        WorkoutSet,
+        [{'workout_id': workout_id, 'reps': workoutset.reps}
+         for workout_id, workoutset in workoutsets],
+        WorkoutSet.workout_id.in_(
+            db.session.query(Workout.id).filter(
+                Workout.plan_id.in_(plan_ids))))
+
+    db.session.execute(
+        Exercise.__table__.insert(),
+        [{'workoutset_id': workoutset_id,
+          'description': exercise.description,
+          'duration': exercise.duration}
+         for workoutset_id, (_, workoutset) in zip(workoutset_ids,
+                                                   workoutsets)
+         for exercise in workoutset.exercises])
+    durations = dict.fromkeys(plan_ids, 0)
+    ids = {plan_id: [] for plan_id in plan_ids}
+    for workout_id, (plan_id, _, duration) in zip(workout_ids, rows):
+        durations[plan_id] += duration
+        ids[plan_id].append(workout_id)
+    return {plan_id: (durations[plan_id],
+                      encode_snapshot(ids[plan_id], schedules[plan_id]))
+            for plan_id in plan_ids}
+
+
+def _bulk_insert(model, rows, criterion):
+    '''
+    Insert rows for model in one executemany and return their new ids.
+    '''
+    db.session.execute(model.__table__.insert(), rows)
+    ids = [row.id for row in db.session.query(model.id).filter(
+        criterion).order_by(model.id)]
+    if len(ids) != len(rows):
+        raise RuntimeError(
+            f'expected {len(rows)} new {model.__tablename__}, '
+            f'found {len(ids)}')
+    return ids
+
+
+class PlanJob(db.Model):
+    '''
+    A request to generate a plan, worked through by flask plan-worker
+    '''
+
+    __tablename__ = 'plan_jobs'
+    __table_args__ = (
+        db.Index('ix_plan_jobs_status_id', 'status', 'id'),
+    )
+
+    QUEUED, RUNNING, DONE, FAILED, SUPERSEDED = (
+        'queued', 'running', 'done', 'failed', 'superseded')
+    PENDING = (QUEUED, RUNNING)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'))
+    level = db.Column(db.String(64))
+    # comma separated weekday numbers, Monday being 0
+    days = db.Column(db.String(16))
+    status = db.Column(db.String(16), nullable=False, default=QUEUED)
+    worker = db.Column(db.String(64))
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started = db.Column(db.DateTime)
+    finished = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    plan_id = db.Column(db.Integer, db.ForeignKey('plans.id',
+                                                  ondelete='SET NULL'))
+
+    user = db.relationship('User')
+    event = db.relationship('Event')
 
-        # determine actual start dates for the selected workout days
-        start_dates = [progression_start_date(
-            self.start_date, day) for day in days]
-
-        # populate workouts based on selected plan
-        for start_date, progression in zip(start_dates, self.progressions):
-            progression[0](start_date, self.length, **progression[1])
-
-    def runeasy_progression(self, start_date, plan_length, start, step,
-                            interval, maximum):
-
-        for week in range(plan_length):
-            date = start_date + timedelta(weeks=week)
-            workout = Workout(plan=self, date=date,
-                              category='easy', rest=rest_week(week, plan_length))
-            workout_set = WorkoutSet(workout=workout, reps=1)
-            duration = reps_or_duration(plan_length=plan_length,
-                                        plan_week=week,
-                                        workout_week=week,
-                                        start=start,
-                                        step=step,
-                                        maximum=maximum,
-                                        interval=interval)
-            exercise = Exercise(workoutset=workout_set,
-                                description='easy', duration=duration)
-
-    def intervals_hillsprint_progression(self,
-                                         start_date,
-                                         plan_length,
-                                         intervals_warmupdown,
-                                         intervals_reps_start,
-                                         intervals_reps_step,
-                                         intervals_reps_interval,
-                                         intervals_reps_max,
-                                         intervals_duration_start,
-                                         intervals_duration_step,
-                                         intervals_duration_interval,
-                                         intervals_duration_maximum,
-                                         hillsprint_warmupdown,
-                                         hillsprint_reps_start,
-                                         hillsprint_reps_step,
-                                         hillsprint_reps_interval,
-                                         hillsprint_reps_max,
-                                         hillsprint_duration_start,
-                                         hillsprint_duration_step,
-                                         hillsprint_duration_interval,
-                                         hillsprint_duration_maximum):
-
-        for week in range(plan_length):
-            date = start_date + timedelta(weeks=week)
-            if week % 2 == 0:
-                workout = Workout(plan=self, date=date, category='intervals')
-                workout_set = WorkoutSet(workout=workout,
-                                         reps=1,
-                                         exercises=[Exercise(description='easy',
-                                                             duration=intervals_warmupdown)])
-                reps = reps_or_duration(plan_length=plan_length,
-                                        plan_week=week,
-                                        workout_week=int(week / 2),
-                                        start=intervals_reps_start,
-                                        step=intervals_reps_step,
-                                        maximum=intervals_reps_max,
-                                        interval=intervals_reps_interval)
-                workout_set = WorkoutSet(workout=workout,
-                                         reps=reps)
-                duration = reps_or_duration(plan_length=plan_length,
-                                            plan_week=week,
-                                            workout_week=int(week / 2),
-                                            start=intervals_duration_start,
-                                            step=intervals_duration_step,
-                                            maximum=intervals_duration_maximum,
-                                            interval=intervals_duration_interval)
-                exercise = Exercise(workoutset=workout_set,
-                                    description='fast', duration=duration)
-                exercise = Exercise(workoutset=workout_set,
-                                    description='easy', duration=1)
-                workout_set = WorkoutSet(workout=workout,
-                                         reps=1,
-                                         exercises=[Exercise(description='easy',
-                                                             duration=intervals_warmupdown)])
-            else:
-                workout = Workout(plan=self, date=date, category='hillsprint')
-                workout_set = WorkoutSet(workout=workout,
-                                         reps=1,
-                                         exercises=[Exercise(description='easy',
-                                                             duration=hillsprint_warmupdown)])
-                reps = reps_or_duration(plan_length=plan_length,
-                                        plan_week=week,
-                                        workout_week=int(week / 2),
-                                        start=hillsprint_reps_start,
-                                        step=hillsprint_reps_step,
-                                        maximum=hillsprint_reps_max,
-                                        interval=hillsprint_reps_interval)
-                workout_set = WorkoutSet(workout=workout,
-                                         reps=reps)
-                duration = reps_or_duration(plan_length=plan_length,
-                                            plan_week=week,
-                                            workout_week=int(week / 2),
-                                            start=hillsprint_duration_start,
-                                            step=hillsprint_duration_step,
-                                            maximum=hillsprint_duration_maximum,
-                                            interval=hillsprint_duration_interval)
-                exercise = Exercise(workoutset=workout_set,
-                                    description='hillsprint', duration=duration)
-                workout_set = WorkoutSet(workout=workout,
-                                         reps=1,
-                                         exercises=[Exercise(description='easy',
-                                                             duration=hillsprint_warmupdown)])
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.id} {self.status}>'
+
+    @property
+    def weekdays(self):
+        return [int(day) for day in self.days.split(',') if day]
+
+    @weekdays.setter
+    def weekdays(self, days):
+        self.days = ','.join(str(day) for day in days)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'plan_id': self.plan_id,
+            'created': self.created.isoformat() + 'Z',
+            'finished': self.finished and self.finished.isoformat() + 'Z',
+        }
+
+
+class PlanGraph(object):
+    '''
+    A plan's workouts, with their sets and exercises, loaded in three queries
+    whatever the length of the plan.
+    '''
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.workouts = plan.workouts.order_by(Workout.date, Workout.id) \
+            .options(db.subqueryload(Workout.workoutsets)
+                     .subqueryload(WorkoutSet.exercises)).all()
+        self.by_date = {workout.date: workout for workout in self.workouts}
+
+    def __iter__(self):
+        return iter(self.workouts)
+
+    def __len__(self):
+        return len(self.workouts)
+
+
+def update_durations(session, workout_ids=(), plan_ids=()):
+    '''
+    Recompute the stored durations of the given workouts from their sets and
+    exercises, then roll them up into their plans, bump their revisions and
+    drop their now stale snapshots.
+
+    Returns the ids of the plans updated.
+    '''
+    workouts, workoutsets, exercises, plans = (
+        Workout.__table__, WorkoutSet.__table__, Exercise.__table__,
+        Plan.__table__)
+    workout_ids, plan_ids = set(workout_ids), set(plan_ids)
+    if not workout_ids and not plan_ids:
+        return plan_ids
+    if workout_ids:
+        session.execute(workouts.update().where(
+            workouts.c.id.in_(workout_ids)).values(duration=db.select([
+                db.func.coalesce(db.func.sum(
+                    workoutsets.c.reps * exercises.c.duration), 0)]).where(
+                workoutsets.c.workout_id == workouts.c.id).where(
+                exercises.c.workoutset_id == workoutsets.c.id).as_scalar()))
+        plan_ids.update(plan_id for plan_id, in session.execute(db.select(
+            [workouts.c.plan_id]).where(workouts.c.id.in_(workout_ids))))
+    plan_ids.discard(None)
+    if plan_ids:
+        session.execute(plans.update().where(
+            plans.c.id.in_(plan_ids)).values(duration=db.select([
+                db.func.coalesce(db.func.sum(workouts.c.duration), 0)]).where(
+                workouts.c.plan_id == plans.c.id).as_scalar(),
+                revision=plans.c.revision + 1, updated=datetime.utcnow(),
+                snapshot=None))
+    return plan_ids
+
+
+def _history_values(obj, attribute):
+    history = db.inspect(obj).attrs[attribute].history
+    return {value for value in history.sum() if value is not None}
+
+
+@db.event.listens_for(db.session, 'after_flush')
+def _update_durations_after_flush(session, flush_context):
+    workout_ids, workoutset_ids, plan_ids = set(), set(), set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Exercise):
+            workoutset_ids |= _history_values(obj, 'workoutset_id')
+        elif isinstance(obj, WorkoutSet):
+            workout_ids |= _history_values(obj, 'workout_id')
+        elif isinstance(obj, Workout):
+            plan_ids |= _history_values(obj, 'plan_id')
+            if obj not in session.deleted:
+                workout_ids.add(obj.id)
+    if workoutset_ids:
+        workout_ids.update(workout_id for workout_id, in session.execute(
+            db.select([WorkoutSet.workout_id]).where(
+                WorkoutSet.id.in_(workoutset_ids))))
+    workout_ids.discard(None)
+    plan_ids = update_durations(session, workout_ids, plan_ids)
+    if plan_ids:
+        session.info['stale_durations'] = (workout_ids, plan_ids)
+
+
+@db.event.listens_for(db.session, 'after_flush_postexec')
+def _expire_durations(session, flush_context):
+    stale = session.info.pop('stale_durations', None)
+    if not stale:
+        return
+    # look the objects up by identity, as reading their ids could load them
+    workout_ids, plan_ids = stale
+    for model, ids, attrs in (
+            (Workout, workout_ids, ['duration']),
+            (Plan, plan_ids, ['duration', 'revision', 'updated', 'snapshot'])):
+        mapper = db.inspect(model)
+        for id in ids:
+            obj = session.identity_map.get(
+                mapper.identity_key_from_primary_key((id,)))
+            if obj is not None:
+                session.expire(obj, attrs)
+
+
+@db.event.listens_for(db.session, 'after_flush')
+def _note_event_changes(session, flush_context):
+    if any(isinstance(obj, Event)
+           for obj in session.new | session.dirty | session.deleted):
+        session.info['events_changed'] = True
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def _invalidate_event_cache(session):
+    # only once committed, or another request could cache the old events
+    # again before they change, or cache changes that are rolled back
+    if session.info.pop('events_changed', False):
+        cache.delete_prefix('events/')
+
+
+@db.event.listens_for(db.session, 'after_transaction_end')
+def _forget_event_changes(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('events_changed', None)
+
+
+@db.event.listens_for(Plan, 'after_insert')
+@db.event.listens_for(Plan, 'after_delete')
+def _invalidate_plan_cache(mapper, connection, target):
+    # ids can be reused once a plan is deleted, so never trust old entries
+    cache.delete_prefix(target.cache_prefix)
 
 
 class MyView(BaseView):
@@ -781,7 +739,15 @@ class MyView(BaseView):
         return 'Hello World!'
 
 
+class PlanView(ModelView):
+    # snapshots are long, and only ever written alongside the workouts
+    column_exclude_list = form_excluded_columns = ('snapshot',)
+
+
 admin.add_view(ModelView(User, db.session))
 admin.add_view(ModelView(Event, db.session))
-admin.add_view(ModelView(Plan, db.session))
+admin.add_view(PlanView(Plan, db.session))
 admin.add_view(ModelView(Workout, db.session))
+admin.add_view(ModelView(PlanJob, db.session))
+admin.add_view(PerformanceView(instrumentation, name='Performance',
+                               endpoint='performance'))
@@ -0,0 +1,253 @@
+'''
+Outbound email through a bounded queue and a small pool of sender threads.
+
+Messages put on the outbox are sent by RUN_MAIL_WORKERS threads, started by
+the first message.  Each worker takes up to RUN_MAIL_BATCH_SIZE messages at
+a time and sends them over its own SMTP connection, which it keeps open
+between batches until it has been idle for RUN_MAIL_IDLE_TIMEOUT seconds.
+
+The queue holds at most RUN_MAIL_QUEUE_SIZE messages.  When it is full,
+senders block for up to RUN_MAIL_PUT_TIMEOUT seconds and then get
+OutboxFull, so a blast can never get further ahead of the workers than that.
+
+A message that fails with a temporary error is retried on a fresh connection
+up to RUN_MAIL_RETRIES times, RUN_MAIL_RETRY_DELAY seconds later and twice
+as long each time after.  Permanent (5xx) refusals are logged and dropped.
+flush waits for the queue to empty, and shutdown, which also runs when the
+process exits, sends what is queued and stops the workers.
+'''
+import atexit
+import smtplib
+from queue import Empty, Full, Queue
+from threading import Condition, Thread
+from time import sleep
+from timeit import default_timer as timer
+from flask import current_app
+
+# put once for each worker to stop it
+STOP = object()
+
+
+class OutboxFull(Exception):
+    '''
+    Raised when a message cannot be queued before the timeout.
+    '''
+
+
+class Outbox(object):
+    '''
+    Flask extension sending mail through a pool of workers.
+
+    Each app has its own queue and workers, kept in app.extensions.
+    '''
+
+    def __init__(self, mail, app=None):
+        self.mail = mail
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        previous = app.extensions.get('outbox')
+        if previous is not None:
+            previous.shutdown()
+        app.extensions['outbox'] = MailPool(app, self.mail)
+
+    @property
+    def pool(self):
+        return current_app.extensions['outbox']
+
+    def send(self, message, timeout=None):
+        self.pool.put(message, timeout)
+
+    def flush(self, timeout=None):
+        return self.pool.flush(timeout)
+
+    def shutdown(self, timeout=None):
+        return self.pool.shutdown(timeout)
+
+    def stats(self):
+        return self.pool.stats()
+
+
+class MailPool(object):
+    '''
+    The queue and sender threads of one app.
+    '''
+
+    def __init__(self, app, mail):
+        config = app.config
+        self.app = app
+        self.mail = mail
+        self.workers = config['RUN_MAIL_WORKERS']
+        self.batch_size = config['RUN_MAIL_BATCH_SIZE']
+        self.put_timeout = config['RUN_MAIL_PUT_TIMEOUT']
+        self.retries = config['RUN_MAIL_RETRIES']
+        self.retry_delay = config['RUN_MAIL_RETRY_DELAY']
+        self.idle_timeout = config['RUN_MAIL_IDLE_TIMEOUT']
+        self.queue = Queue(config['RUN_MAIL_QUEUE_SIZE'])
+        self.threads = []
+        self.closed = self.stopped = False
+        # guards everything below and is notified as messages finish
+        self.changed = Condition()
+        self.pending = 0
+        self.sent = self.failed = self.retried = 0
+
+    def put(self, message, timeout=None):
+        '''
+        Queue a message, waiting up to timeout (RUN_MAIL_PUT_TIMEOUT by
+        default) for room.
+        '''
+        with self.changed:
+            if self.closed:
+                raise RuntimeError('the outbox has been shut down')
+            if not self.threads:
+                self._start()
+            self.pending += 1
+        try:
+            self.queue.put(message, timeout=self.put_timeout
+                           if timeout is None else timeout)
+        except Full:
+            self._finished()
+            raise OutboxFull(f'{self.queue.maxsize} messages are waiting')
+
+    def flush(self, timeout=None):
+        '''
+        Wait until every queued message has been sent or has failed.
+        Returns False if that takes longer than timeout.
+        '''
+        deadline = None if timeout is None else timer() + timeout
+        with self.changed:
+            while self.pending:
+                remaining = None if deadline is None else deadline - timer()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.changed.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=None):
+        '''
+        Stop taking messages, send those queued and stop the workers.
+
+        Returns False if the queue was not emptied within timeout, leaving
+        the workers running so that a later call can finish the job.
+        '''
+        deadline = None if timeout is None else timer() + timeout
+        with self.changed:
+            # a put that found the outbox open has already counted its
+            # message in pending, under this lock, so flush waits for it
+            self.closed = True
+        if not self.flush(timeout):
+            return False
+        with self.changed:
+            # only once the queue is empty, so nothing can end up behind a
+            # STOP, and only once however often shutdown is called
+            stopping = [thread for thread in self.threads
+                        if thread.is_alive()] if not self.stopped else []
+            self.stopped = True
+        for thread in stopping:
+            self.queue.put_nowait(STOP)
+        for thread in stopping:
+            thread.join(None if deadline is None
+                        else max(deadline - timer(), 0))
+        return True
+
+    def stats(self):
+        with self.changed:
+            return {'workers': len(self.threads), 'queued': self.queue.qsize(),
+                    'pending': self.pending, 'sent': self.sent,
+                    'failed': self.failed, 'retried': self.retried}
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = Thread(target=self._work, name=f'outbox-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        atexit.register(self.shutdown)
+
+    def _work(self):
+        with self.app.app_context():
+            connection = None
+            try:
+                while True:
+                    batch = self._take()
+                    if not batch:
+                        # idle, so let the server have its connection back
+                        connection = _close(connection)
+                        continue
+                    for message in batch:
+                        if message is STOP:
+                            return
+                        connection = self._deliver(connection, message)
+                        self._finished()
+            finally:
+                _close(connection)
+
+    def _take(self):
+        try:
+            batch = [self.queue.get(timeout=self.idle_timeout)]
+        except Empty:
+            return []
+        # never take a second STOP, which is another worker's
+        while batch[-1] is not STOP and len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _deliver(self, connection, message):
+        '''
+        Send a message, retrying temporary failures, and return the
+        connection to send the next one over.
+        '''
+        for attempt in range(self.retries + 1):
+            try:
+                if connection is None:
+                    connection = self.mail.connect()
+                    connection.__enter__()
+                connection.send(message)
+                self._count('sent')
+                return connection
+            except Exception as e:
+                # after a refusal the server is still listening
+                if not isinstance(e, (smtplib.SMTPResponseException,
+                                      smtplib.SMTPRecipientsRefused)):
+                    connection = _close(connection)
+                if _permanent(e) or attempt == self.retries:
+                    self.app.logger.error('Could not send %r to %s: %s',
+                                          message.subject,
+                                          ', '.join(message.send_to), e)
+                    self._count('failed')
+                    return connection
+                self._count('retried')
+                sleep(self.retry_delay * 2 ** attempt)
+        return connection
+
+    def _count(self, outcome):
+        with self.changed:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def _finished(self):
+        with self.changed:
+            self.pending -= 1
+            self.changed.notify_all()
+
+
+def _close(connection):
+    if connection is not None:
+        try:
+            connection.__exit__(None, None, None)
+        except Exception:
+            pass
+
+
+def _permanent(error):
+    '''
+    Whether sending the message again cannot help.
+    '''
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    # bad messages fail before reaching the server, broken connections after
+    return not isinstance(error, (smtplib.SMTPException, OSError))
@@ -0,0 +1,264 @@
+'''
+Regenerate every stored plan from the current plans.json and builder.
+
+Plans are read in id order and split into chunks.  Each process of a
+multiprocessing pool takes a chunk, compiles its schedules in pure Python and
+compares them with the stored workouts over its own database connection,
+returning only the schedules that changed.  The parent bulk-writes those, one
+transaction per chunk, and records the last plan id written in a checkpoint
+file so an interrupted run picks up where it stopped.
+'''
+import json
+import os
+from collections import namedtuple
+from datetime import datetime
+from multiprocessing import Pool
+from sqlalchemy import create_engine
+from timeit import default_timer as timer
+from . import db, cache, plan_registry
+from .compiler import ExerciseRow, WorkoutSetRow, WorkoutRow, compile_plan, \
+    workout_duration
+from .models import Event, Plan, Workout, WorkoutSet, Exercise, \
+    insert_schedules
+
+PlanSpec = namedtuple('PlanSpec', ['id', 'distance', 'level', 'start_date',
+                                   'event_date', 'days'])
+ChunkReport = namedtuple('ChunkReport', ['last_id', 'plans', 'changed',
+                                         'skipped', 'failed', 'diffs'])
+
+# state of a worker process: the plan templates indexed by (distance, level),
+# the engine to read stored schedules with and whether this is a dry run
+_worker = {}
+
+
+def _init_worker(progressions, database_url=None, dry_run=False):
+    _worker['progressions'] = progressions
+    _worker['engine'] = database_url and create_engine(database_url)
+    _worker['dry_run'] = dry_run
+
+
+def compile_chunk(specs):
+    '''
+    Compile the schedules of a chunk of PlanSpecs and compare them with the
+    stored ones.
+
+    Returns a ChunkReport whose changed maps plan ids to their new schedules.
+    Plans without training days are skipped and plans without a template
+    reported as failed.
+    '''
+    compiled, skipped, failed = {}, 0, {}
+    for spec in specs:
+        progressions = _worker['progressions'].get((spec.distance,
+                                                    spec.level))
+        if progressions is None:
+            failed[spec.id] = f'no {spec.level} plan for {spec.distance} ' \
+                'events'
+        elif not spec.days:
+            skipped += 1
+        else:
+            compiled[spec.id] = compile_plan(
+                progressions, spec.start_date, spec.event_date,
+                [int(day) for day in spec.days.split(',')])
+    if _worker['engine']:
+        with _worker['engine'].connect() as connection:
+            stored = stored_schedules(list(compiled), connection)
+    else:
+        stored = stored_schedules(list(compiled), db.session)
+    changed = {plan_id: schedule for plan_id, schedule in compiled.items()
+               if schedule != stored[plan_id]}
+    diffs = {plan_id: describe_changes(stored[plan_id], schedule)
+             for plan_id, schedule in changed.items()} \
+        if _worker['dry_run'] else {}
+    return ChunkReport(specs[-1].id, len(specs), changed, skipped, failed,
+                       diffs)
+
+
+def plan_specs(after=0):
+    '''
+    Return the PlanSpecs of every plan with an id above after, in id order.
+    '''
+    return [PlanSpec(*row) for row in db.session.query(
+        Plan.id, Event.distance, Plan.level, Plan.start_date, Event.date,
+        Plan.days).join(Event, Plan.event_id == Event.id)
+        .filter(Plan.id > after).order_by(Plan.id)]
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def stored_schedules(plan_ids, connection):
+    '''
+    Load the stored schedules of some plans as {plan_id: WorkoutRows}, in
+    three queries whatever their size.
+
+    Durations are read as floats and rests as booleans, so the rows compare
+    equal to freshly compiled ones.
+    '''
+    return {plan_id: tuple(row for _, row in rows)
+            for plan_id, rows in stored_workouts(plan_ids, connection).items()}
+
+
+def stored_workouts(plan_ids, connection):
+    '''
+    As stored_schedules, but as {plan_id: [(workout_id, WorkoutRow), ...]}.
+    '''
+    workouts, workoutsets, exercises = (
+        Workout.__table__, WorkoutSet.__table__, Exercise.__table__)
+    if not plan_ids:
+        return {}
+    workout_ids = db.select([workouts.c.id]).where(
+        workouts.c.plan_id.in_(plan_ids))
+    exercise_rows = {}
+    for workoutset_id, description, duration in connection.execute(
+            db.select([exercises.c.workoutset_id, exercises.c.description,
+                       exercises.c.duration])
+            .select_from(exercises.join(workoutsets))
+            .where(workoutsets.c.workout_id.in_(workout_ids))
+            .order_by(exercises.c.id)).fetchall():
+        exercise_rows.setdefault(workoutset_id, []).append(
+            ExerciseRow(description, _float(duration)))
+    workoutset_rows = {}
+    for workoutset_id, workout_id, reps in connection.execute(
+            db.select([workoutsets.c.id, workoutsets.c.workout_id,
+                       workoutsets.c.reps])
+            .where(workoutsets.c.workout_id.in_(workout_ids))
+            .order_by(workoutsets.c.id)).fetchall():
+        workoutset_rows.setdefault(workout_id, []).append(WorkoutSetRow(
+            reps, tuple(exercise_rows.get(workoutset_id, ()))))
+    schedules = {plan_id: [] for plan_id in plan_ids}
+    for workout_id, plan_id, date, category, rest in connection.execute(
+            db.select([workouts.c.id, workouts.c.plan_id, workouts.c.date,
+                       workouts.c.category, workouts.c.rest])
+            .where(workouts.c.plan_id.in_(plan_ids))
+            .order_by(workouts.c.id)).fetchall():
+        schedules[plan_id].append((workout_id, WorkoutRow(
+            date, category, bool(rest),
+            tuple(workoutset_rows.get(workout_id, ())))))
+    return schedules
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def describe_changes(old, new):
+    '''
+    Summarise how a plan's schedule changes, one line per changed workout.
+    '''
+    old, new = {w.date: w for w in old}, {w.date: w for w in new}
+    lines = []
+    for day in sorted(set(old) | set(new)):
+        before, after = old.get(day), new.get(day)
+        if before == after:
+            continue
+        if before is None:
+            lines.append(f'+ {day} {_describe(after)}')
+        elif after is None:
+            lines.append(f'- {day} {_describe(before)}')
+        else:
+            lines.append(f'~ {day} {_describe(before)} -> {_describe(after)}')
+    return lines
+
+
+def _describe(workout):
+    return f'{workout.category} {workout_duration(workout):g}mins'
+
+
+def delete_schedules(plan_ids):
+    '''
+    Delete the workouts, sets and exercises of some plans in three
+    statements.
+    '''
+    workout_ids = db.session.query(Workout.id).filter(
+        Workout.plan_id.in_(plan_ids))
+    workoutset_ids = db.session.query(WorkoutSet.id).filter(
+        WorkoutSet.workout_id.in_(workout_ids))
+    Exercise.query.filter(Exercise.workoutset_id.in_(workoutset_ids)) \
+        .delete(synchronize_session=False)
+    WorkoutSet.query.filter(WorkoutSet.workout_id.in_(workout_ids)) \
+        .delete(synchronize_session=False)
+    Workout.query.filter(Workout.plan_id.in_(plan_ids)) \
+        .delete(synchronize_session=False)
+
+
+def write_chunk(report):
+    '''
+    Replace the workouts of the plans that changed in a chunk and bump their
+    revisions.
+    '''
+    if not report.changed:
+        return
+    plans = Plan.__table__
+    delete_schedules(list(report.changed))
+    written = insert_schedules(report.changed)
+    db.session.execute(
+        plans.update().where(plans.c.id == db.bindparam('plan_id'))
+        .values(duration=db.bindparam('new_duration'),
+                snapshot=db.bindparam('new_snapshot'),
+                revision=plans.c.revision + 1, updated=datetime.utcnow()),
+        [{'plan_id': plan_id, 'new_duration': duration,
+          'new_snapshot': snapshot}
+         for plan_id, (duration, snapshot) in written.items()])
+    db.session.commit()
+    for plan_id in report.changed:
+        cache.delete_prefix(f'plan/{plan_id}/')
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)['last_id']
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, last_id):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'last_id': last_id}, f)
+    os.replace(tmp, path)
+
+
+def regenerate_plans(chunk_size=500, processes=None, dry_run=False,
+                     checkpoint=None, progress=None):
+    '''
+    Regenerate every plan, calling progress with a ChunkReport, the running
+    totals and the elapsed time after each chunk.  Returns the totals.
+    '''
+    after = read_checkpoint(checkpoint) if checkpoint and not dry_run else 0
+    specs = plan_specs(after)
+    progressions = {key: plan_registry.get(*key)
+                    for key in plan_registry.keys()}
+    totals = {'plans': 0, 'changed': 0, 'skipped': 0, 'failed': 0,
+              'total': len(specs), 'resumed_after': after}
+    start = timer()
+    chunks = list(chunked(specs, chunk_size))
+    # an in-memory database cannot be shared with other processes
+    if processes == 1 or db.engine.url.database in (None, '', ':memory:'):
+        _init_worker(progressions, None, dry_run)
+        pool, reports = None, map(compile_chunk, chunks)
+    else:
+        pool = Pool(processes, _init_worker, (
+            progressions, db.engine.url, dry_run))
+        reports = pool.imap(compile_chunk, chunks)
+    try:
+        for report in reports:
+            if not dry_run:
+                write_chunk(report)
+            totals['plans'] += report.plans
+            totals['changed'] += len(report.changed)
+            totals['skipped'] += report.skipped
+            totals['failed'] += len(report.failed)
+            if checkpoint and not dry_run:
+                write_checkpoint(checkpoint, report.last_id)
+            if progress is not None:
+                progress(report, totals, timer() - start)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    if checkpoint and not dry_run and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    totals['seconds'] = timer() - start
+    return totals
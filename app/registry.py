@@ -0,0 +1,162 @@
+'''
+Registry of training plan templates loaded from plans.json.
+
+The file is parsed and validated once into immutable definitions indexed by
+(distance, level).  It is re-read when its modification time changes, so new
+plans can be shipped without restarting the application.  An invalid file is
+logged and ignored, leaving the previous definitions in service.
+'''
+import json
+import logging
+import os
+from collections import namedtuple
+from threading import Lock
+from time import monotonic
+from .exceptions import ValidationError
+
+DEFAULT_PLANS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plans.json')
+
+Progression = namedtuple('Progression', ['start', 'step', 'interval',
+                                         'maximum'])
+ExerciseDefinition = namedtuple('ExerciseDefinition', ['description',
+                                                       'duration'])
+WorkoutSetDefinition = namedtuple('WorkoutSetDefinition', ['reps',
+                                                           'exercises'])
+WorkoutDefinition = namedtuple('WorkoutDefinition', ['category', 'warmup',
+                                                     'warmdown',
+                                                     'workoutsets'])
+
+
+def _number(data, key, where):
+    value = data.get(key)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValidationError(f'{where}: {key} must be a number')
+    if value < 0:
+        raise ValidationError(f'{where}: {key} must not be negative')
+    return value
+
+
+def _progression(data, prefix, where):
+    return Progression(_number(data, prefix + '_start', where),
+                       _number(data, prefix + '_step', where),
+                       _number(data, prefix + '_step_interval', where),
+                       _number(data, prefix + '_max', where))
+
+
+def _workout(data, where):
+    if not isinstance(data, dict) or not data.get('category'):
+        raise ValidationError(f'{where}: category is required')
+    workoutsets = []
+    for i, settings in enumerate(data.get('workoutset_settings') or []):
+        set_where = f'{where}.workoutset_settings[{i}]'
+        exercises = tuple(
+            ExerciseDefinition(exercise.get('description'),
+                               _progression(exercise, 'duration',
+                                            f'{set_where}[{j}]'))
+            for j, exercise in enumerate(
+                settings.get('exercise_settings') or []))
+        if not exercises:
+            raise ValidationError(f'{set_where}: exercise_settings is empty')
+        workoutsets.append(WorkoutSetDefinition(
+            _progression(settings, 'reps', set_where), exercises))
+    if not workoutsets:
+        raise ValidationError(f'{where}: workoutset_settings is empty')
+    return WorkoutDefinition(data['category'],
+                             _number(data, 'warmup', where),
+                             _number(data, 'warmdown', where),
+                             tuple(workoutsets))
+
+
+def parse_plans(data):
+    '''
+    Validate a plans document and return (version, index).
+
+    index maps (distance, level) to a tuple of progressions, one per training
+    day, each being a tuple of WorkoutDefinitions that alternate week by week.
+    '''
+    if not isinstance(data, dict):
+        raise ValidationError('plans document must be an object')
+    workouts = {name: _workout(workout, f'workouts.{name}')
+                for name, workout in (data.get('workouts') or {}).items()}
+    index = {}
+    for distance, levels in (data.get('plans') or {}).items():
+        for level, progressions in levels.items():
+            where = f'plans.{distance}.{level}'
+            try:
+                index[distance, level] = tuple(
+                    tuple(workouts[name] for name in progression)
+                    for progression in progressions)
+            except KeyError as e:
+                raise ValidationError(f'{where}: unknown workout {e}')
+            if not all(index[distance, level]):
+                raise ValidationError(f'{where}: empty progression')
+    if not index:
+        raise ValidationError('plans document defines no plans')
+    return data.get('version'), index
+
+
+class PlanRegistry(object):
+    '''
+    Plan templates indexed by (distance, level), reloaded on file change.
+    '''
+
+    def __init__(self, app=None, path=DEFAULT_PLANS_FILE):
+        self.path = path
+        self.reload_interval = 2
+        self.logger = logging.getLogger(__name__)
+        self.version = None
+        self._index = None
+        self._mtime = None
+        self._checked = 0
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get('RUN_PLANS_FILE', self.path)
+        self.reload_interval = app.config.get('RUN_PLANS_RELOAD_INTERVAL',
+                                              self.reload_interval)
+        self.logger = app.logger
+        app.extensions['plan_registry'] = self
+        self.load()
+
+    def load(self):
+        '''
+        Read and validate the plans file, replacing the current templates.
+        '''
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path) as f:
+                version, index = parse_plans(json.load(f))
+            self.version, self._index, self._mtime = version, index, mtime
+            self._checked = monotonic()
+
+    def _reload_if_changed(self):
+        if self._index is None:
+            self.load()
+            return
+        if monotonic() - self._checked < self.reload_interval:
+            return
+        self._checked = monotonic()
+        try:
+            if os.stat(self.path).st_mtime != self._mtime:
+                self.load()
+                self.logger.info(f'Reloaded plans version {self.version} '
+                                 f'from {self.path}')
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Keeping plans version {self.version}: {e}')
+
+    def get(self, distance, level):
+        '''
+        Return the progressions for a distance and level.
+        '''
+        self._reload_if_changed()
+        try:
+            return self._index[distance, level]
+        except KeyError:
+            raise ValidationError(f'no {level} plan for {distance} events')
+
+    def keys(self):
+        self._reload_if_changed()
+        return sorted(self._index)
@@ -0,0 +1,213 @@
+'''
+Record statements slower than RUN_SLOW_QUERY_MS, with their query plans.
+
+Each slow statement is kept with its parameters, the view and the
+application function that ran it, and the output of EXPLAIN QUERY PLAN
+(SQLite) or EXPLAIN (PostgreSQL) for SELECTs.  Entries go to a bounded ring
+buffer in the process and, as JSON lines, to the rotating RUN_SLOW_QUERY_LOG
+file, which `flask slow-queries` aggregates by statement shape.
+
+Statements from requests, workers and commands are all recorded.  Unless
+RUN_SLOW_QUERY_MS is set nothing is hooked up.
+'''
+import json
+import logging
+import os
+import re
+import traceback
+from collections import deque
+from datetime import datetime
+from glob import escape, glob
+from logging.handlers import RotatingFileHandler
+from timeit import default_timer as timer
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MAX_PARAMETERS_LENGTH = 1000
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SlowQueryLog(object):
+    '''
+    Flask extension recording slow statements when RUN_SLOW_QUERY_MS is set.
+
+    The log is shared by every engine in the process, so the threshold is
+    that of the app initialised last.
+    '''
+
+    def __init__(self, app=None):
+        self.threshold = None
+        self.listening = False
+        self.entries = deque(maxlen=1000)
+        self.logger = logging.getLogger('run.slow_queries')
+        self.logger.propagate = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['slow_queries'] = self
+        threshold = app.config.get('RUN_SLOW_QUERY_MS')
+        self.threshold = None if threshold is None else threshold / 1000
+        if self.threshold is None:
+            return
+        self.entries = deque(self.entries,
+                             maxlen=app.config['RUN_SLOW_QUERY_BUFFER'])
+        path = app.config['RUN_SLOW_QUERY_LOG']
+        if path and not any(getattr(handler, 'baseFilename', None) ==
+                            os.path.abspath(path)
+                            for handler in self.logger.handlers):
+            os.makedirs(os.path.dirname(os.path.abspath(path)),
+                        exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=1024 * 1024,
+                                          backupCount=5)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+        if not self.listening:
+            # as in instrumentation, engines are swapped by tests and tools
+            event.listen(Engine, 'before_cursor_execute', _start_query)
+            event.listen(Engine, 'after_cursor_execute', self.finish_query)
+            self.listening = True
+
+    def finish_query(self, conn, cursor, statement, parameters, context,
+                     executemany):
+        start = getattr(context, 'run_slow_query_start', None)
+        if start is None or self.threshold is None:
+            return
+        elapsed = timer() - start
+        if elapsed >= self.threshold:
+            self.record(conn, statement, parameters, elapsed, executemany)
+
+    def record(self, conn, statement, parameters, elapsed, executemany):
+        entry = {
+            'time': datetime.utcnow().isoformat() + 'Z',
+            'ms': round(elapsed * 1000, 3),
+            'statement': statement,
+            'parameters': repr(parameters)[:MAX_PARAMETERS_LENGTH],
+            'view': request.endpoint if has_request_context() else None,
+            'caller': caller(),
+            'plan': None if executemany else explain(conn, statement,
+                                                     parameters),
+        }
+        self.entries.append(entry)
+        self.logger.info(json.dumps(entry))
+        return entry
+
+
+def caller():
+    '''
+    The innermost application frame outside this module, as file:line
+    function.
+    '''
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(APP_DIR) and \
+                frame.filename != os.path.abspath(__file__):
+            return (f'{os.path.relpath(frame.filename, APP_DIR)}:'
+                    f'{frame.lineno} {frame.name}')
+    return None
+
+
+def explain(conn, statement, parameters):
+    '''
+    Return the query plan of a SELECT as a list of lines, on the connection
+    that ran it so the same transaction state applies.
+    '''
+    if not re.match(r'\s*(SELECT|WITH)\b', statement, re.IGNORECASE):
+        return None
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+    # a raw cursor, so the EXPLAIN is neither timed nor recorded itself
+    cursor = conn.connection.cursor()
+    # on PostgreSQL a failed statement aborts the app's transaction, unless
+    # it is rolled back to a savepoint
+    savepoint = dialect == 'postgresql'
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT run_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = [' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()]
+        except Exception as e:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT run_explain')
+            plan = [f'EXPLAIN failed: {e}']
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT run_explain')
+        return plan
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+
+
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.run_slow_query_start = timer()
+
+
+def statement_shape(statement):
+    '''
+    Normalise a statement so those differing only in literals, parameters
+    and the length of IN lists compare equal.
+    '''
+    shape = re.sub(r"'(?:[^']|'')*'", '?', statement)
+    shape = re.sub(r'%\(\w+\)s|:\w+|%s|\$\d+', '?', shape)
+    shape = re.sub(r'(?<![\w.])-?\d+(?:\.\d+)?\b', '?', shape)
+    shape = re.sub(r'\s+', ' ', shape).strip()
+    return re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', shape)
+
+
+def read_entries(path):
+    '''
+    Yield the entries of a slow query log and its rotated backups, oldest
+    first.
+    '''
+    backups = sorted(glob(escape(path) + '.[0-9]*'),
+                     key=lambda name: int(name.rsplit('.', 1)[1]),
+                     reverse=True)
+    for name in backups + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def aggregate(entries):
+    '''
+    Group entries by statement shape, returning a list of dicts with the
+    count, total, mean and worst time in ms, the callers and views seen and
+    the plan and statement of the slowest, slowest total first.
+    '''
+    groups = {}
+    for entry in entries:
+        shape = statement_shape(entry['statement'])
+        group = groups.get(shape)
+        if group is None:
+            group = groups[shape] = {
+                'shape': shape, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'callers': {}, 'views': {}, 'statement': None, 'plan': None}
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        for key, value in (('callers', entry.get('caller')),
+                           ('views', entry.get('view'))):
+            if value:
+                group[key][value] = group[key].get(value, 0) + 1
+        if entry['ms'] >= group['max_ms']:
+            group['max_ms'] = entry['ms']
+            group['statement'] = entry['statement']
+            group['plan'] = entry.get('plan')
+    for group in groups.values():
+        group['mean_ms'] = group['total_ms'] / group['count']
+    return sorted(groups.values(), key=lambda group: group['total_ms'],
+                  reverse=True)
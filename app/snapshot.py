@@ -0,0 +1,191 @@
+'''
+Serve plans from their snapshots.
+
+Plan.snapshot holds the plan's workouts, sets and exercises serialised by
+encode_snapshot when the plan is generated or regenerated.  Read-mostly
+pages and feeds rebuild the workouts from that one column instead of joining
+the workouts, sets and exercises tables.
+
+Any change to a plan's workouts through the ORM clears its snapshot (see
+update_durations), so a plan without a snapshot is read from the normalised
+tables, which stay the source of truth.  Reads never write snapshots;
+check_snapshots compares every snapshot with those tables and with fix
+writes the missing and stale ones.
+'''
+import json
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from operator import attrgetter
+from . import db
+from .compiler import SNAPSHOT_VERSION, encode_snapshot
+from .models import Exercise, Plan, Workout, WorkoutSet
+from .regenerate import stored_workouts
+
+SNAPSHOT_STATUSES = ('current', 'missing', 'outdated', 'invalid',
+                     'mismatched')
+
+
+class SnapshotExercise(namedtuple('SnapshotExercise',
+                                  ['description', 'duration'])):
+    __slots__ = ()
+    __str__ = Exercise.__str__
+    to_dict = Exercise.to_dict
+
+
+class SnapshotWorkoutSet(namedtuple('SnapshotWorkoutSet',
+                                    ['reps', 'exercises'])):
+    __slots__ = ()
+    __str__ = WorkoutSet.__str__
+    duration = WorkoutSet.duration
+    to_dict = WorkoutSet.to_dict
+
+
+class SnapshotWorkout(namedtuple('SnapshotWorkout',
+                                 ['id', 'plan_id', 'date', 'category', 'rest',
+                                  'duration', 'workoutsets'])):
+    '''
+    A read-only stand-in for a Workout with its sets and exercises loaded.
+    '''
+    __slots__ = ()
+    __str__ = Workout.__str__
+    to_dict = Workout.to_dict
+
+
+class PlanSnapshot(object):
+    '''
+    A plan's workouts decoded from its snapshot, in the order of PlanGraph.
+    '''
+
+    def __init__(self, plan, workouts):
+        self.plan = plan
+        self.workouts = sorted(workouts, key=attrgetter('date', 'id'))
+        self.by_date = {workout.date: workout for workout in self.workouts}
+        self.by_id = {workout.id: workout for workout in self.workouts}
+
+    def __iter__(self):
+        return iter(self.workouts)
+
+    def __len__(self):
+        return len(self.workouts)
+
+    @classmethod
+    def decode(cls, plan):
+        '''
+        Return the plan's snapshot, or None if it has no usable one.
+        '''
+        data = _load(plan.snapshot)
+        if not isinstance(data, dict) or data.get('v') != SNAPSHOT_VERSION:
+            return None
+        return cls(plan, [decode_workout(plan.id, row) for row in data['w']])
+
+
+def decode_workout(plan_id, row):
+    workout_id, day, category, rest, workoutsets = row
+    workoutsets = tuple(
+        SnapshotWorkoutSet(reps, tuple(
+            SnapshotExercise(description, _decimal(duration))
+            for description, duration in exercises))
+        for reps, exercises in workoutsets)
+    year, month, day = day.split('-')
+    return SnapshotWorkout(
+        workout_id, plan_id, date(int(year), int(month), int(day)), category,
+        rest, sum(workoutset.duration for workoutset in workoutsets),
+        workoutsets)
+
+
+def _decimal(value):
+    # Numeric columns read back as Decimals, and so the templates expect
+    return None if value is None else Decimal(str(value))
+
+
+def _load(snapshot):
+    try:
+        return json.loads(snapshot) if snapshot else None
+    except ValueError:
+        return None
+
+
+def load_schedule(plan):
+    '''
+    Return the plan's workouts from its snapshot or, when it has none, from
+    the normalised tables.
+
+    Reads never write: a missing snapshot is left for check-snapshots --fix
+    or the next regeneration, so a GET neither commits nor expires what the
+    session holds.
+    '''
+    workouts = PlanSnapshot.decode(plan)
+    return plan.load_graph() if workouts is None else workouts
+
+
+def load_workout(id):
+    '''
+    Return a workout from its plan's snapshot in one query, or None if the
+    plan has no usable snapshot.
+    '''
+    plan = Plan.query.filter(Plan.id == db.session.query(
+        Workout.plan_id).filter(Workout.id == id).as_scalar()).first()
+    snapshot = PlanSnapshot.decode(plan) if plan else None
+    return snapshot.by_id.get(id) if snapshot else None
+
+
+def snapshot_status(snapshot, expected):
+    '''
+    Compare a stored snapshot with the one encoded from the normalised
+    tables.
+    '''
+    if not snapshot:
+        return 'missing'
+    data = _load(snapshot)
+    if not isinstance(data, dict):
+        return 'invalid'
+    if data.get('v') != SNAPSHOT_VERSION:
+        return 'outdated'
+    return 'current' if data.get('w') == json.loads(expected)['w'] \
+        else 'mismatched'
+
+
+def check_snapshots(chunk_size=500, fix=False, progress=None):
+    '''
+    Check the snapshot of every plan against its workouts, a chunk of plans
+    at a time, and with fix rewrite those that are not current.
+
+    progress is called after each chunk with the chunk's {plan_id: status}
+    problems and the running totals, which are also returned.
+    '''
+    plans = Plan.__table__
+    totals = dict.fromkeys(SNAPSHOT_STATUSES + ('plans', 'fixed'), 0)
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select([plans.c.id, plans.c.revision, plans.c.snapshot])
+            .where(plans.c.id > last_id).order_by(plans.c.id)
+            .limit(chunk_size)).fetchall()
+        if not rows:
+            return totals
+        last_id = rows[-1].id
+        stored = stored_workouts([row.id for row in rows], db.session)
+        problems, fixes = {}, []
+        for plan_id, revision, snapshot in rows:
+            expected = encode_snapshot(
+                [workout_id for workout_id, _ in stored[plan_id]],
+                [workout for _, workout in stored[plan_id]])
+            status = snapshot_status(snapshot, expected)
+            totals[status] += 1
+            if status != 'current':
+                problems[plan_id] = status
+                fixes.append({'plan_id': plan_id, 'old_revision': revision,
+                              'new_snapshot': expected})
+        if fix and fixes:
+            # plans edited since they were read are left for the next run
+            result = db.session.execute(
+                plans.update().where(plans.c.id == db.bindparam('plan_id'))
+                .where(plans.c.revision == db.bindparam('old_revision'))
+                .values(snapshot=db.bindparam('new_snapshot')), fixes)
+            totals['fixed'] += result.rowcount \
+                if result.supports_sane_multi_rowcount() else len(fixes)
+            db.session.commit()
+        totals['plans'] += len(rows)
+        if progress:
+            progress(problems, totals)
@@ -0,0 +1,109 @@
+'''
+NumPy versions of the progression arithmetic in app/builder.py.
+
+rest_weeks and progress take arrays (or anything broadcastable) wherever the
+scalar rest_week and reps_or_duration take numbers, and give the same
+values, bit for bit, as calling those element by element, as long as the
+number of steps taken fits in an int64.  progression_table
+computes a progression for every week of a batch of plans of different
+lengths in one call, for bulk regeneration and analytics.
+
+The date helpers work on arrays of date ordinals (date.toordinal()), like
+their scalar counterparts in builder.py.
+'''
+from datetime import date
+import numpy as np
+
+
+def rest_weeks(weeks, plan_lengths):
+    '''
+    Boolean array of whether each week is a rest week, as rest_week.
+    '''
+    weeks, plan_lengths = np.asarray(weeks), np.asarray(plan_lengths)
+    build_up = plan_lengths % 4
+    progression = (weeks <= build_up) & (build_up < 3)
+    # numpy's % takes the sign of the divisor, as Python's does
+    return ~progression & ((weeks - build_up) % 4 == 0)
+
+
+def progress(plan_lengths, plan_weeks, workout_weeks, start, step, maximum,
+             interval):
+    '''
+    Array of reps or durations, as reps_or_duration.
+    '''
+    rest = rest_weeks(plan_weeks, plan_lengths).astype(np.int64)
+    interval = np.asarray(interval)
+    # guard the division, weeks without an interval just take start
+    safe_interval = np.where(interval > 0, interval, 1)
+    steps = np.trunc(np.asarray(workout_weeks) / safe_interval) \
+        .astype(np.int64)
+    result = np.where(interval > 0, start + (steps - rest) * step, start)
+    ceiling = maximum - rest * step
+    # min() keeps its first argument on ties, which tells 0.0 from -0.0
+    return np.where(ceiling < result, ceiling, result)
+
+
+def week_grid(plan_lengths):
+    '''
+    Return (lengths, weeks, mask) for a batch of plans: lengths as a column,
+    week numbers as a row and a mask of the weeks within each plan.
+    '''
+    lengths = np.asarray(plan_lengths, dtype=np.int64)[:, np.newaxis]
+    weeks = np.arange(lengths.max(initial=0))[np.newaxis, :]
+    return lengths, weeks, weeks < lengths
+
+
+def progression_table(progression, plan_lengths, cycle=1):
+    '''
+    Return a (plans, weeks) array of a Progression for every week of each
+    plan, for a workout alternating with cycle - 1 others.  Weeks past the
+    end of a plan are zero.
+    '''
+    lengths, weeks, mask = week_grid(plan_lengths)
+    values = progress(lengths, weeks, weeks // cycle, progression.start,
+                      progression.step, progression.maximum,
+                      progression.interval)
+    return np.where(mask, values, 0)
+
+
+def to_ordinals(dates):
+    return np.array([day.toordinal() for day in dates], dtype=np.int64)
+
+
+def from_ordinals(ordinals):
+    return [date.fromordinal(ordinal)
+            for ordinal in np.asarray(ordinals).ravel().tolist()]
+
+
+def mondays(ordinals):
+    '''
+    Ordinals of the Mondays on or before some date ordinals.
+    '''
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    return ordinals - (ordinals - 1) % 7
+
+
+def weeks_between(start_ordinals, end_ordinals):
+    '''
+    Weeks between the Mondays of pairs of date ordinals, as
+    weeks_between_ordinals.
+    '''
+    return (mondays(end_ordinals) - mondays(start_ordinals)) // 7
+
+
+def progression_starts(plan_start_ordinals, days):
+    '''
+    Ordinals of the first workouts of progressions, as
+    progression_start_ordinal.
+    '''
+    return mondays(plan_start_ordinals) + 7 + np.asarray(days)
+
+
+def workout_ordinals(plan_start_ordinals, day, plan_lengths):
+    '''
+    Return a (plans, weeks) array of the ordinals of a progression's weekly
+    workouts for each plan, and the mask of the weeks within each plan.
+    '''
+    lengths, weeks, mask = week_grid(plan_lengths)
+    first = progression_starts(plan_start_ordinals, day)[:, np.newaxis]
+    return np.where(mask, first + 7 * weeks, 0), mask
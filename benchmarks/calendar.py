@@ -0,0 +1,38 @@
+"""
+Time rendering the calendar months for whole plans.
+
+    $ python -m benchmarks.calendar
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+from timeit import default_timer as timer
+from app.compiler import compile_schedule, workout_duration
+from app.main.calendar import WorkoutCalendar
+
+Workout = namedtuple('Workout', ['id', 'date', 'category', 'duration'])
+REPEAT = 50
+
+
+def plan_workouts(weeks):
+    start_date = date(2018, 1, 1)
+    schedule = compile_schedule('5k', 'Beginner', start_date,
+                                start_date + timedelta(weeks=weeks),
+                                [1, 3, 5])
+    return sorted((Workout(i, row.date, row.category, workout_duration(row))
+                   for i, row in enumerate(schedule)),
+                  key=lambda workout: workout.date)
+
+
+def main():
+    for weeks in (12, 52):
+        workouts = plan_workouts(weeks)
+        start = timer()
+        for _ in range(REPEAT):
+            months = WorkoutCalendar(workouts).formatmonths()
+        elapsed = (timer() - start) / REPEAT
+        print(f'{weeks:>3} weeks: {elapsed * 1000:6.2f} ms for '
+              f'{len(months)} months ({len(workouts)} workouts)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+Measure how many plan schedules the pure compiler produces per second.
+
+    $ python -m benchmarks.compile_schedule
+"""
+from datetime import date, timedelta
+from timeit import default_timer as timer
+from app.compiler import compile_schedule
+
+DAYS = [1, 3, 5]
+PLANS = 2000
+
+
+def main():
+    start_date = date(2018, 1, 1)
+    for weeks in (4, 12, 20, 52):
+        event_date = start_date + timedelta(weeks=weeks)
+        start = timer()
+        for _ in range(PLANS):
+            compile_schedule('5k', 'Beginner', start_date, event_date, DAYS)
+        elapsed = timer() - start
+        print(f'{weeks:>3} weeks: {PLANS / elapsed:10,.0f} plans/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Compare the builder date helpers: the former timedelta arithmetic, the
+ordinal arithmetic now in builder.py and the NumPy ordinal-array versions.
+
+    $ python -m benchmarks.dates
+"""
+import random
+from datetime import date, timedelta
+from timeit import default_timer as timer
+from app.builder import progression_start_date, weeks_between_dates
+from app.vectorized import progression_starts, to_ordinals, weeks_between
+
+PAIRS = 100000
+
+
+def timedelta_progression_start_date(plan_start_date, day):
+    return plan_start_date + timedelta(weeks=1) - \
+        timedelta(days=plan_start_date.weekday()) + timedelta(days=day)
+
+
+def timedelta_weeks_between_dates(start_date, end_date):
+    monday1 = (start_date - timedelta(days=start_date.weekday()))
+    monday2 = (end_date - timedelta(days=end_date.weekday()))
+    return int((monday2 - monday1).days / 7)
+
+
+def measure(name, f):
+    start = timer()
+    f()
+    elapsed = timer() - start
+    print(f'{name:<40} {elapsed * 1000:8.2f}ms '
+          f'{PAIRS / elapsed:14,.0f}/s')
+
+
+def main():
+    random.seed(0)
+    starts = [date(2018, 1, 1) + timedelta(days=random.randrange(365))
+              for _ in range(PAIRS)]
+    ends = [start + timedelta(days=random.randrange(28, 365))
+            for start in starts]
+    pairs = list(zip(starts, ends))
+
+    measure('weeks_between_dates (timedelta)', lambda: [
+        timedelta_weeks_between_dates(start, end) for start, end in pairs])
+    measure('weeks_between_dates (ordinals)', lambda: [
+        weeks_between_dates(start, end) for start, end in pairs])
+    start_ordinals, end_ordinals = to_ordinals(starts), to_ordinals(ends)
+    measure('weeks_between (ordinal arrays)', lambda: weeks_between(
+        start_ordinals, end_ordinals))
+
+    measure('progression_start_date (timedelta)', lambda: [
+        timedelta_progression_start_date(start, 3) for start in starts])
+    measure('progression_start_date (ordinals)', lambda: [
+        progression_start_date(start, 3) for start in starts])
+    measure('progression_starts (ordinal arrays)', lambda: progression_starts(
+        start_ordinals, 3))
+
+
+if __name__ == '__main__':
+    main()
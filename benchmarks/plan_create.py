@@ -0,0 +1,69 @@
+"""
+Compare flushing a generated plan through the ORM unit of work, one row at a
+time, against the multi-row bulk INSERT path used by Plan.create.
+
+    $ python -m benchmarks.plan_create
+"""
+from datetime import date, timedelta
+from timeit import default_timer as timer
+from app import create_app, db
+from app.models import Event, Plan, Workout, WorkoutSet, Exercise
+from app.compiler import compile_schedule
+
+WEEKS = 20
+DAYS = [1, 3, 5]
+REPEAT = 20
+
+
+def insert_orm(plan, schedule):
+    for row in schedule:
+        workout = Workout(plan=plan, date=row.date, category=row.category,
+                          rest=row.rest)
+        for set_row in row.workoutsets:
+            workoutset = WorkoutSet(workout=workout, reps=set_row.reps)
+            for exercise in set_row.exercises:
+                Exercise(workoutset=workoutset,
+                         description=exercise.description,
+                         duration=exercise.duration)
+
+
+def insert_bulk(plan, schedule):
+    plan.insert_schedule(schedule)
+
+
+def time_flush(insert, event):
+    elapsed = 0
+    for _ in range(REPEAT):
+        plan = Plan(start_date=date(2018, 1, 1), event=event,
+                    level='Beginner')
+        db.session.add(plan)
+        db.session.flush()
+        schedule = compile_schedule(event.distance, plan.level,
+                                    plan.start_date, event.date, DAYS)
+        start = timer()
+        insert(plan, schedule)
+        db.session.flush()
+        elapsed += timer() - start
+        db.session.rollback()
+    return elapsed / REPEAT
+
+
+def main():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        event = Event(name='Benchmark 5k', distance='5k',
+                      date=date(2018, 1, 1) + timedelta(weeks=WEEKS))
+        db.session.add(event)
+        db.session.commit()
+        event_id = event.id
+        for name, insert in [('orm', insert_orm), ('bulk', insert_bulk)]:
+            event = Event.query.get(event_id)
+            per_plan = time_flush(insert, event)
+            print(f'{name:>5}: {per_plan * 1000:8.2f} ms per '
+                  f'{WEEKS}-week plan ({len(DAYS)} days/week)')
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
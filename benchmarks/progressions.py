@@ -0,0 +1,45 @@
+"""
+Compare the scalar and NumPy progression arithmetic over batches of plans.
+
+    $ python -m benchmarks.progressions
+"""
+import random
+from timeit import default_timer as timer
+from app.builder import reps_or_duration
+from app.registry import Progression
+from app.vectorized import progression_table
+
+PROGRESSION = Progression(start=1, step=1, interval=2, maximum=6)
+CYCLE = 2
+
+
+def scalar(plan_lengths):
+    return [[reps_or_duration(length, week, week // CYCLE,
+                              PROGRESSION.start, PROGRESSION.step,
+                              PROGRESSION.maximum, PROGRESSION.interval)
+             for week in range(length)]
+            for length in plan_lengths]
+
+
+def vectorized(plan_lengths):
+    return progression_table(PROGRESSION, plan_lengths, CYCLE)
+
+
+def main():
+    random.seed(0)
+    for plans in (1, 1000, 100000):
+        plan_lengths = [random.randint(4, 52) for _ in range(plans)]
+        weeks = sum(plan_lengths)
+        timings = {}
+        for f in (scalar, vectorized):
+            start = timer()
+            f(plan_lengths)
+            timings[f.__name__] = timer() - start
+        print(f'{plans:>7} plans ({weeks:>9,} weeks): '
+              f'scalar {timings["scalar"] * 1000:9.2f}ms  '
+              f'vectorized {timings["vectorized"] * 1000:8.2f}ms  '
+              f'x{timings["scalar"] / timings["vectorized"]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
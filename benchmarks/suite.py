@@ -0,0 +1,322 @@
+"""
+Time the hot paths end to end against in-memory and file-backed SQLite,
+write the results as JSON and compare them with a stored baseline.
+
+    $ python -m benchmarks.suite --save-baseline     # on a quiet machine
+    $ python -m benchmarks.suite                     # compare with it
+    $ python -m benchmarks.suite --quick --only ical --output results.json
+
+Each case is run several times and its median compared with the baseline's;
+the run fails if any case is slower by more than --threshold.  Baselines only
+mean something on the machine they were recorded on, so none is shipped.
+
+Cases:
+
+* plan_create: Plan.create for every distance and level, 4 to 52 weeks
+* formatmonth: WorkoutCalendar.formatmonth over every month of 52-week plans
+* ical: the ICS view for 52-week plans, and the calendar built from the
+  snapshot and from the tables
+* events_page: the last page of events by page number and by cursor
+* import: event feeds into an empty table, again as updates, and events.json
+  as seeddb loads it
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from timeit import default_timer as timer
+from app import create_app, db, cache, plan_registry
+from app.ical import iter_calendar
+from app.importer import import_events, open_feed
+from app.main.calendar import WorkoutCalendar
+from app.models import Event, Plan, encode_cursor
+from app.snapshot import PlanSnapshot
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+SEED_EVENTS = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'events.json')
+START_DATE = date(2018, 1, 1)
+DAYS = [1, 3, 5]
+FULL = {'repeat': 5, 'weeks': (4, 12, 26, 52), 'events': 20000}
+QUICK = {'repeat': 2, 'weeks': (4, 52), 'events': 2000}
+
+BENCHMARKS = []
+
+
+def benchmark(f):
+    BENCHMARKS.append(f)
+    return f
+
+
+def measure(f, repeat, setup=None):
+    '''
+    Return the times in seconds of repeat calls of f, each after an untimed
+    call of setup, following one untimed call to warm the caches.
+    '''
+    if setup:
+        setup()
+    f()
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = timer()
+        f()
+        times.append(timer() - start)
+    return times
+
+
+def create_plan(distance, level, weeks, days=DAYS):
+    event = Event(name=f'{distance} {level} {weeks}w', distance=distance,
+                  date=START_DATE + timedelta(weeks=weeks))
+    plan = Plan(start_date=START_DATE, event=event, level=level)
+    db.session.add(plan)
+    plan.create(days)
+    db.session.commit()
+    return plan
+
+
+@benchmark
+def plan_create(app, scale):
+    for distance, level in plan_registry.keys():
+        for weeks in scale['weeks']:
+            event = Event(name=f'Create {distance} {level} {weeks}w',
+                          distance=distance,
+                          date=START_DATE + timedelta(weeks=weeks))
+            db.session.add(event)
+            db.session.commit()
+
+            def create():
+                plan = Plan(start_date=START_DATE, event=event, level=level)
+                db.session.add(plan)
+                plan.create(DAYS)
+                db.session.flush()
+
+            yield (f'plan_create/{distance}/{level}/{weeks}w',
+                   measure(create, scale['repeat'], db.session.rollback))
+            db.session.rollback()
+
+
+@benchmark
+def formatmonth(app, scale):
+    for distance in ('5k', 'full'):
+        graph = create_plan(distance, 'Advanced', 52).load_graph()
+        calendar = WorkoutCalendar(graph)
+
+        def render():
+            for (year, month), days in calendar.months:
+                calendar.formatmonth(year, month, days=days)
+
+        yield f'formatmonth/{distance}/52w', measure(render, scale['repeat'])
+
+
+@benchmark
+def ical(app, scale):
+    client = app.test_client()
+    for distance in ('5k', 'full'):
+        plan = create_plan(distance, 'Advanced', 52)
+        url = f'/plan/{plan.id}/ical'
+
+        def download():
+            response = client.get(url)
+            assert response.status_code == 200 and response.get_data()
+
+        def from_snapshot():
+            ''.join(iter_calendar(plan, PlanSnapshot.decode(plan)))
+
+        def from_tables():
+            ''.join(iter_calendar(plan, plan.load_graph()))
+
+        yield f'ical/{distance}/52w/view', measure(download, scale['repeat'])
+        # both start from nothing loaded, as a request would
+        yield (f'ical/{distance}/52w/snapshot',
+               measure(from_snapshot, scale['repeat'], db.session.expire_all))
+        yield (f'ical/{distance}/52w/tables',
+               measure(from_tables, scale['repeat'], db.session.expire_all))
+
+
+@benchmark
+def events_page(app, scale):
+    per_page = 100
+    events = scale['events']
+    db.session.execute(Event.__table__.insert(), [
+        {'name': f'Race {i}', 'distance': '10k',
+         'date': START_DATE + timedelta(days=i % 3650)}
+        for i in range(events)])
+    db.session.commit()
+    last_page = -(-events // per_page)
+    last_id = db.session.query(Event.id).order_by(Event.id) \
+        .offset((last_page - 1) * per_page - 1).limit(1).scalar()
+    with app.test_request_context():
+        def by_page():
+            Event.to_collection_dict(Event.query.order_by(Event.id),
+                                     last_page, per_page, 'api.get_events')
+
+        def by_cursor():
+            Event.to_cursor_collection_dict(
+                Event.query, Event.id, encode_cursor(last_id), per_page,
+                'api.get_events')
+
+        yield (f'events_page/{events}/page',
+               measure(by_page, scale['repeat']))
+        yield (f'events_page/{events}/cursor',
+               measure(by_cursor, scale['repeat']))
+
+
+@benchmark
+def imports(app, scale):
+    events = scale['events']
+    with tempfile.TemporaryDirectory() as directory:
+        feeds = {'csv': os.path.join(directory, 'events.csv'),
+                 'jsonl': os.path.join(directory, 'events.jsonl')}
+        rows = [{'name': f'Race {i}', 'distance': '10k',
+                 'date': (START_DATE + timedelta(days=i % 3650)).isoformat()}
+                for i in range(events)]
+        with open(feeds['csv'], 'w', newline='') as f:
+            writer = csv.DictWriter(f, ['name', 'distance', 'date'])
+            writer.writeheader()
+            writer.writerows(rows)
+        with open(feeds['jsonl'], 'w') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+
+        def empty():
+            db.session.execute(Event.__table__.delete())
+            db.session.commit()
+
+        def load(path, format):
+            def run():
+                with open_feed(path) as f:
+                    import_events(f, format)
+            return run
+
+        for format, path in feeds.items():
+            yield (f'import/{format}/{events}/insert',
+                   measure(load(path, format), scale['repeat'], empty))
+            yield (f'import/{format}/{events}/update',
+                   measure(load(path, format), scale['repeat']))
+        yield ('import/seeddb', measure(load(SEED_EVENTS, 'json'),
+                                        scale['repeat'], empty))
+
+
+def run(databases, scale, only=None, progress=None):
+    '''
+    Run the benchmarks against each database and return their results as
+    {name: {median_ms, min_ms, runs}}.
+    '''
+    results = {}
+    for database in databases:
+        for f in BENCHMARKS:
+            if only and only not in f.__name__:
+                continue
+            for name, times in run_one(f, database, scale):
+                name = f'{database}/{name}'
+                results[name] = {
+                    'median_ms': round(statistics.median(times) * 1000, 3),
+                    'min_ms': round(min(times) * 1000, 3),
+                    'runs': len(times),
+                }
+                if progress:
+                    progress(name, results[name])
+    return results
+
+
+def run_one(f, database, scale):
+    # a fresh app and database per benchmark, so none sees another's rows
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app('testing')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://' if \
+            database == 'memory' else \
+            'sqlite:///' + os.path.join(directory, 'benchmark.sqlite')
+        app.config['RUN_CACHE_TYPE'] = 'null'
+        cache.init_app(app)
+        with app.app_context():
+            db.create_all()
+            try:
+                for name, times in f(app, scale):
+                    yield name, times
+            finally:
+                db.session.remove()
+                db.drop_all()
+                # let go of the file before the directory goes
+                db.get_engine().dispose()
+
+
+def compare(results, baseline, threshold):
+    '''
+    Return (name, baseline ms, ms, ratio) for the cases slower than the
+    baseline by more than threshold.
+    '''
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get('results', {}).get(name)
+        if not base or not base['median_ms']:
+            continue
+        ratio = result['median_ms'] / base['median_ms']
+        if ratio > 1 + threshold:
+            regressions.append((name, base['median_ms'],
+                                result['median_ms'], ratio))
+    return regressions
+
+
+def metadata(quick):
+    return {
+        'created': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'quick': quick,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database', choices=['memory', 'file', 'both'],
+                        default='both')
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer sizes and repeats, for a smoke run')
+    parser.add_argument('--only', help='run the benchmarks matching this')
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='record these results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='slowdown allowed before failing, 0.25 = 25%%')
+    args = parser.parse_args(argv)
+
+    databases = ['memory', 'file'] if args.database == 'both' \
+        else [args.database]
+    scale = QUICK if args.quick else FULL
+    results = run(databases, scale, args.only, lambda name, result: print(
+        f'{name:<55} {result["median_ms"]:10.2f}ms', file=sys.stderr))
+    report = {'meta': metadata(args.quick), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f'Saved {len(results)} results to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, record one with '
+              f'--save-baseline')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for name, before, after, ratio in regressions:
+        print(f'REGRESSION {name}: {before:.2f}ms -> {after:.2f}ms '
+              f'(x{ratio:.2f})')
+    print(f'{len(regressions)} of {len(results)} cases slower than the '
+          f'baseline by more than {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import tempfile
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
@@ -12,9 +13,37 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     RUN_MAIL_SUBJECT_PREFIX = '[Run]'
     RUN_MAIL_SENDER = 'Run Admin <ben.m.randerson@gmail.com>'
+    RUN_MAIL_WORKERS = int(os.environ.get('RUN_MAIL_WORKERS', '2'))
+    RUN_MAIL_QUEUE_SIZE = int(os.environ.get('RUN_MAIL_QUEUE_SIZE', '1000'))
+    RUN_MAIL_BATCH_SIZE = int(os.environ.get('RUN_MAIL_BATCH_SIZE', '50'))
+    RUN_MAIL_PUT_TIMEOUT = float(os.environ.get('RUN_MAIL_PUT_TIMEOUT', '30'))
+    RUN_MAIL_RETRIES = int(os.environ.get('RUN_MAIL_RETRIES', '3'))
+    RUN_MAIL_RETRY_DELAY = float(os.environ.get('RUN_MAIL_RETRY_DELAY', '1'))
+    RUN_MAIL_IDLE_TIMEOUT = float(
+        os.environ.get('RUN_MAIL_IDLE_TIMEOUT', '30'))
     RUN_ADMIN = os.environ.get('RUN_ADMIN')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
+    RUN_PLANS_FILE = os.environ.get('RUN_PLANS_FILE') or \
+        os.path.join(basedir, 'plans.json')
+    RUN_PLANS_RELOAD_INTERVAL = int(
+        os.environ.get('RUN_PLANS_RELOAD_INTERVAL', '2'))
+    RUN_CACHE_TYPE = os.environ.get('RUN_CACHE_TYPE', 'simple')
+    RUN_CACHE_DIR = os.environ.get('RUN_CACHE_DIR') or \
+        os.path.join(tempfile.gettempdir(), 'run-cache')
+    RUN_CACHE_SIZE = int(os.environ.get('RUN_CACHE_SIZE', '1024'))
+    RUN_PLAN_JOBS = os.environ.get('RUN_PLAN_JOBS', 'false').lower() in \
+        ['true', 'on', '1']
+    RUN_PLAN_JOBS_BATCH_SIZE = int(
+        os.environ.get('RUN_PLAN_JOBS_BATCH_SIZE', '20'))
+    RUN_INSTRUMENTATION = os.environ.get(
+        'RUN_INSTRUMENTATION', 'false').lower() in ['true', 'on', '1']
+    RUN_SLOW_QUERY_MS = float(os.environ['RUN_SLOW_QUERY_MS']) \
+        if os.environ.get('RUN_SLOW_QUERY_MS') else None
+    RUN_SLOW_QUERY_LOG = os.environ.get('RUN_SLOW_QUERY_LOG') or \
+        'logs/slow-queries.log'
+    RUN_SLOW_QUERY_BUFFER = int(os.environ.get('RUN_SLOW_QUERY_BUFFER', '1000'))
+    RUN_INDEX_EVENTS = int(os.environ.get('RUN_INDEX_EVENTS', '100'))
 
     @staticmethod
     def init_app(app):
@@ -0,0 +1,47 @@
+"""store workout and plan durations
+
+Revision ID: 3f1c2a7d9e4b
+Revises: ba9225c10a01
+Create Date: 2026-10-18 19:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9e4b'
+down_revision = 'ba9225c10a01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('workouts', sa.Column('duration', sa.Numeric(),
+                                        nullable=True))
+    op.create_index(op.f('ix_workouts_duration'), 'workouts', ['duration'],
+                    unique=False)
+    op.add_column('plans', sa.Column('duration', sa.Numeric(), nullable=True))
+
+    # backfill from the existing workout sets and exercises
+    op.execute("""
+        UPDATE workouts SET duration = (
+            SELECT COALESCE(SUM(workoutsets.reps * exercises.duration), 0)
+            FROM workoutsets JOIN exercises
+                ON exercises.workoutset_id = workoutsets.id
+            WHERE workoutsets.workout_id = workouts.id)
+    """)
+    op.execute("""
+        UPDATE plans SET duration = (
+            SELECT COALESCE(SUM(workouts.duration), 0)
+            FROM workouts
+            WHERE workouts.plan_id = plans.id)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.drop_column('duration')
+    op.drop_index(op.f('ix_workouts_duration'), table_name='workouts')
+    with op.batch_alter_table('workouts') as batch_op:
+        batch_op.drop_column('duration')
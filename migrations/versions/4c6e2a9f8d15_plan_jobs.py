@@ -0,0 +1,49 @@
+"""plan generation jobs
+
+Revision ID: 4c6e2a9f8d15
+Revises: 9d3b7f1e6a24
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c6e2a9f8d15'
+down_revision = '9d3b7f1e6a24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'plan_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('event_id', sa.Integer(), nullable=True),
+        sa.Column('level', sa.String(length=64), nullable=True),
+        sa.Column('days', sa.String(length=16), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('worker', sa.String(length=64), nullable=True),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.Column('started', sa.DateTime(), nullable=True),
+        sa.Column('finished', sa.DateTime(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('plan_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+        sa.ForeignKeyConstraint(['plan_id'], ['plans.id'],
+                                ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_plan_jobs_status_id', 'plan_jobs', ['status', 'id'],
+                    unique=False)
+    op.create_index(op.f('ix_plan_jobs_user_id'), 'plan_jobs', ['user_id'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_plan_jobs_user_id'), table_name='plan_jobs')
+    op.drop_index('ix_plan_jobs_status_id', table_name='plan_jobs')
+    op.drop_table('plan_jobs')
@@ -0,0 +1,42 @@
+"""index foreign keys and dates
+
+Revision ID: 5b8f0e2d7c63
+Revises: c7d93e15ab42
+Create Date: 2026-10-18 20:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8f0e2d7c63'
+down_revision = 'c7d93e15ab42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_events_date'), 'events', ['date'], unique=False)
+    op.create_index(op.f('ix_plans_event_id'), 'plans', ['event_id'],
+                    unique=False)
+    op.create_index(op.f('ix_plans_user_id'), 'plans', ['user_id'],
+                    unique=False)
+    op.create_index(op.f('ix_workouts_date'), 'workouts', ['date'],
+                    unique=False)
+    op.create_index('ix_workouts_plan_id_date', 'workouts',
+                    ['plan_id', 'date'], unique=False)
+    op.create_index(op.f('ix_workoutsets_workout_id'), 'workoutsets',
+                    ['workout_id'], unique=False)
+    op.create_index(op.f('ix_exercises_workoutset_id'), 'exercises',
+                    ['workoutset_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_exercises_workoutset_id'), table_name='exercises')
+    op.drop_index(op.f('ix_workoutsets_workout_id'), table_name='workoutsets')
+    op.drop_index('ix_workouts_plan_id_date', table_name='workouts')
+    op.drop_index(op.f('ix_workouts_date'), table_name='workouts')
+    op.drop_index(op.f('ix_plans_user_id'), table_name='plans')
+    op.drop_index(op.f('ix_plans_event_id'), table_name='plans')
+    op.drop_index(op.f('ix_events_date'), table_name='events')
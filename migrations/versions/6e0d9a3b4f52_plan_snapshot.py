@@ -0,0 +1,27 @@
+"""add plan snapshot
+
+Revision ID: 6e0d9a3b4f52
+Revises: b17f4d3c2e80
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e0d9a3b4f52'
+down_revision = 'b17f4d3c2e80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing plans are served from their workouts until they are viewed or
+    # `flask check-snapshots --fix` writes their snapshots
+    op.add_column('plans', sa.Column('snapshot', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.drop_column('snapshot')
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""add plan revision
+
+Revision ID: 8a4e6b0c5d21
+Revises: 3f1c2a7d9e4b
+Create Date: 2026-10-18 19:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6b0c5d21'
+down_revision = '3f1c2a7d9e4b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('plans', sa.Column('revision', sa.Integer(), nullable=False,
+                                     server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.drop_column('revision')
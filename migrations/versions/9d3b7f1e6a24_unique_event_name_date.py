@@ -0,0 +1,40 @@
+"""unique events by name and date
+
+Revision ID: 9d3b7f1e6a24
+Revises: e2a51c8f9b07
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3b7f1e6a24'
+down_revision = 'e2a51c8f9b07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keep the first of any duplicated events, moving their plans onto it.
+    # The index treats NULLs as distinct, so events without a name or date
+    # are never duplicates and are left alone.
+    op.execute(
+        'UPDATE plans SET event_id = ('
+        ' SELECT MIN(keep.id) FROM events keep, events dup'
+        ' WHERE dup.id = plans.event_id'
+        ' AND keep.name = dup.name AND keep.date = dup.date)'
+        ' WHERE event_id IN (SELECT id FROM events'
+        ' WHERE name IS NOT NULL AND date IS NOT NULL)')
+    op.execute(
+        'DELETE FROM events WHERE name IS NOT NULL AND date IS NOT NULL'
+        ' AND id NOT IN (SELECT id FROM (SELECT MIN(id) AS id FROM events'
+        ' WHERE name IS NOT NULL AND date IS NOT NULL'
+        ' GROUP BY name, date) AS keep)')
+    op.create_index('uq_events_name_date', 'events', ['name', 'date'],
+                    unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_events_name_date', table_name='events')
@@ -0,0 +1,60 @@
+"""plan training days
+
+Revision ID: b17f4d3c2e80
+Revises: 4c6e2a9f8d15
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from datetime import timedelta
+from itertools import groupby
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b17f4d3c2e80'
+down_revision = '4c6e2a9f8d15'
+branch_labels = None
+depends_on = None
+
+plans = sa.table('plans', sa.column('id', sa.Integer),
+                 sa.column('days', sa.String))
+workouts = sa.table('workouts', sa.column('id', sa.Integer),
+                    sa.column('plan_id', sa.Integer),
+                    sa.column('date', sa.Date))
+
+
+def training_days(dates):
+    '''
+    Recover the training weekdays of a plan from its workout dates in id
+    order: each progression was written as a run of weekly workouts, so a
+    new progression starts wherever the dates stop being a week apart.
+    '''
+    days, previous = [], None
+    for date in dates:
+        if previous is None or date != previous + timedelta(weeks=1):
+            days.append(date.weekday())
+        previous = date
+    return ','.join(str(day) for day in days)
+
+
+def upgrade():
+    op.add_column('plans', sa.Column('days', sa.String(length=16),
+                                     nullable=True))
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select([workouts.c.plan_id, workouts.c.date])
+        .where(workouts.c.plan_id.isnot(None))
+        .order_by(workouts.c.plan_id, workouts.c.id))
+    updates = [{'plan_id': plan_id,
+                'days': training_days(date for _, date in group)}
+               for plan_id, group in groupby(rows, lambda row: row[0])]
+    if updates:
+        connection.execute(
+            plans.update().where(plans.c.id == sa.bindparam('plan_id'))
+            .values(days=sa.bindparam('days')), updates)
+
+
+def downgrade():
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.drop_column('days')
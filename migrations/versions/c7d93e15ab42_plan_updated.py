@@ -0,0 +1,31 @@
+"""add plan updated timestamp
+
+Revision ID: c7d93e15ab42
+Revises: 8a4e6b0c5d21
+Create Date: 2026-10-18 20:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d93e15ab42'
+down_revision = '8a4e6b0c5d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite cannot add a NOT NULL column with a non-constant default to a
+    # table with rows, so fill it in before making it NOT NULL
+    op.add_column('plans', sa.Column('updated', sa.DateTime(), nullable=True))
+    op.execute('UPDATE plans SET updated = CURRENT_TIMESTAMP')
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.alter_column('updated', existing_type=sa.DateTime(),
+                              nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.drop_column('updated')
@@ -0,0 +1,25 @@
+"""index events by distance and date
+
+Revision ID: e2a51c8f9b07
+Revises: 5b8f0e2d7c63
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a51c8f9b07'
+down_revision = '5b8f0e2d7c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_events_distance_date', 'events', ['distance', 'date'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_events_distance_date', table_name='events')
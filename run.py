@@ -1,10 +1,16 @@
 import os
-import json
+from datetime import date, datetime
 import click
-from datetime import datetime
 from flask_migrate import Migrate
-from app import create_app, db
-from app.models import User, Event, Exercise
+from app import create_app, db, outbox
+from app.digests import run_daily, send_digests
+from app.exceptions import ValidationError
+from app.importer import feed_format, import_events, open_feed
+from app.jobs import work
+from app.regenerate import regenerate_plans
+from app.slow_queries import aggregate, read_entries
+from app.snapshot import check_snapshots
+from app.models import User, Exercise
 
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
 migrate = Migrate(app, db)
@@ -42,15 +48,197 @@ def seeddb():
                 last_name='Randerson')
     user.set_password('test')
     db.session.add(user)
-    EVENTS = json.load(open('events.json'))
-    for event in EVENTS:
-        date = datetime.strptime(EVENTS[event]['date'], '%Y-%m-%d').date()
-        d = EVENTS[event]['date']
-        e = Event(name=event,
-                  distance=EVENTS[event]['distance'],
-                  date=date)
-        db.session.add(e)
     db.session.commit()
+    with open_feed('events.json') as f:
+        report_import(import_events(f, 'json'))
+
+
+@app.cli.command('import-events')
+@click.argument('path')
+@click.option('--format', 'feed', type=click.Choice(['json', 'jsonl', 'csv']),
+              help='Feed format, guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Events upserted per transaction.')
+def import_events_command(path, feed, batch_size):
+    """Insert or update events from a JSON, JSON Lines or CSV feed."""
+    try:
+        feed = feed or feed_format(path)
+        with open_feed(path) as f:
+            stats = import_events(
+                f, feed, batch_size,
+                progress=lambda stats: click.echo(
+                    f'{stats["imported"]} events...', err=True))
+    except ValidationError as e:
+        raise click.ClickException(str(e))
+    report_import(stats)
+
+
+def report_import(stats):
+    rate = stats['imported'] / stats['seconds'] if stats['seconds'] else 0
+    click.echo(f'Imported {stats["imported"]} events in '
+               f'{stats["seconds"]:.2f}s ({rate:,.0f} rows/s), '
+               f'rejected {stats["rejected"]}')
+    for error in stats['errors']:
+        click.echo(f'  {error}', err=True)
+
+
+@app.cli.command('plan-worker')
+@click.option('--batch-size', default=None, type=int,
+              help='Jobs claimed at a time [RUN_PLAN_JOBS_BATCH_SIZE].')
+@click.option('--poll', default=1.0, show_default=True,
+              help='Seconds to wait when the queue is empty.')
+@click.option('--once', is_flag=True,
+              help='Exit once the queue is empty.')
+def plan_worker(batch_size, poll, once):
+    """Build queued plans in the background."""
+    batch_size = batch_size or app.config['RUN_PLAN_JOBS_BATCH_SIZE']
+    processed = work(batch_size, poll, once, log=click.echo)
+    click.echo(f'Processed {processed} jobs')
+
+
+@app.cli.command('regenerate-plans')
+@click.option('--chunk-size', default=500, show_default=True,
+              help='Plans compiled and written per transaction.')
+@click.option('--processes', default=None, type=int,
+              help='Worker processes, one per CPU by default.')
+@click.option('--checkpoint', default='regenerate-plans.checkpoint',
+              show_default=True, help='File recording progress for resuming.')
+@click.option('--restart', is_flag=True,
+              help='Ignore the checkpoint left by an interrupted run.')
+@click.option('--dry-run', is_flag=True,
+              help='Report the plans that would change without writing.')
+def regenerate_plans_command(chunk_size, processes, checkpoint, restart,
+                             dry_run):
+    """Rebuild every plan from the current plan templates."""
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    def progress(report, totals, seconds):
+        for plan_id, error in report.failed.items():
+            click.echo(f'Plan {plan_id} failed: {error}', err=True)
+        for plan_id, lines in report.diffs.items():
+            click.echo(f'Plan {plan_id}:')
+            for line in lines:
+                click.echo(f'  {line}')
+        rate = totals['plans'] / seconds if seconds else 0
+        click.echo(f'{totals["plans"]}/{totals["total"]} plans, '
+                   f'{totals["changed"]} changed, {rate:,.0f} plans/s',
+                   err=True)
+
+    totals = regenerate_plans(chunk_size, processes, dry_run, checkpoint,
+                              progress)
+    if totals['resumed_after']:
+        click.echo(f'Resumed after plan {totals["resumed_after"]}')
+    click.echo(f'{"Would change" if dry_run else "Changed"} '
+               f'{totals["changed"]} of {totals["plans"]} plans in '
+               f'{totals["seconds"]:.1f}s, skipped {totals["skipped"]} '
+               f'without training days, {totals["failed"]} failed')
+
+
+@app.cli.command('check-snapshots')
+@click.option('--chunk-size', default=500, show_default=True,
+              help='Plans checked per query.')
+@click.option('--fix', is_flag=True,
+              help='Rewrite the snapshots that are not current.')
+def check_snapshots_command(chunk_size, fix):
+    """Compare every plan snapshot with its workouts."""
+    def progress(problems, totals):
+        for plan_id, status in problems.items():
+            click.echo(f'Plan {plan_id}: {status}')
+
+    totals = check_snapshots(chunk_size, fix, progress)
+    click.echo(f'{totals["current"]} of {totals["plans"]} snapshots current, '
+               f'{totals["missing"]} missing, {totals["outdated"]} outdated, '
+               f'{totals["invalid"]} invalid, {totals["mismatched"]} '
+               f'mismatched' + (f', {totals["fixed"]} fixed' if fix else ''))
+    # plans without a snapshot are served from their workouts, so only
+    # snapshots that disagree with them are errors
+    if not fix and (totals['mismatched'] or totals['invalid']):
+        raise SystemExit(1)
+
+
+@app.cli.command('slow-queries')
+@click.option('--log', default=None,
+              help='Slow query log to read, RUN_SLOW_QUERY_LOG by default.')
+@click.option('--limit', default=10, show_default=True,
+              help='Statement shapes to show.')
+@click.option('--plans/--no-plans', default=True,
+              help='Show the query plan of the slowest of each shape.')
+def slow_queries_command(log, limit, plans):
+    """Summarise the slow query log by statement shape."""
+    groups = aggregate(read_entries(log or app.config['RUN_SLOW_QUERY_LOG']))
+    if not groups:
+        click.echo('No slow queries recorded.')
+        return
+    for group in groups[:limit]:
+        click.echo(f'{group["count"]} x {group["mean_ms"]:,.1f}ms mean, '
+                   f'{group["max_ms"]:,.1f}ms worst, '
+                   f'{group["total_ms"]:,.1f}ms total')
+        click.echo(f'  {group["shape"]}')
+        for label, counts in (('from', group['callers']),
+                              ('in', group['views'])):
+            for name, count in sorted(counts.items(),
+                                      key=lambda item: -item[1])[:3]:
+                click.echo(f'  {label} {name} ({count})')
+        if plans and group['plan']:
+            for line in group['plan']:
+                click.echo(f'    {line}')
+        click.echo()
+
+
+@app.cli.command('send-digests')
+@click.option('--date', 'day', default=None,
+              help='Send the workouts of this day, YYYY-MM-DD, not today.')
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Users read, rendered and sent at a time.')
+@click.option('--at', default=None,
+              help='Keep running and send every day at this time, HH:MM.')
+@click.option('--checkpoint', default='send-digests.checkpoint',
+              show_default=True,
+              help='File recording the users mailed, for resuming.')
+@click.option('--restart', is_flag=True,
+              help='Ignore the checkpoint and mail everyone again.')
+def send_digests_command(day, chunk_size, at, checkpoint, restart):
+    """Email users the workouts they have today.
+
+    Mail is sent over RUN_MAIL_WORKERS SMTP connections, 2 by default, and
+    that sets the pace of a large send: size it for the relay and the number
+    of users.  A day already sent is skipped and an interrupted one resumes
+    after the users already mailed.
+    """
+    if day and at:
+        raise click.UsageError('--date and --at cannot be used together')
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    def progress(totals):
+        rate = totals['users'] / totals['seconds'] if totals['seconds'] else 0
+        click.echo(f'{totals["users"]} digests sent, {rate:,.0f}/s',
+                   err=True)
+
+    def send(day):
+        stats = outbox.stats()
+        totals = send_digests(day, chunk_size, progress, checkpoint)
+        if totals['already_sent']:
+            click.echo(f'{day}: digests already sent, see {checkpoint}')
+            return
+        if totals['resumed_after']:
+            click.echo(f'{day}: resumed after user {totals["resumed_after"]}')
+        outbox.flush()
+        seconds = totals['seconds']
+        sent = outbox.stats()
+        rate = totals['users'] / seconds if seconds else 0
+        click.echo(f'{day}: {totals["users"]} digests with '
+                   f'{totals["workouts"]} workouts in {seconds:.1f}s '
+                   f'({rate:,.0f}/s), {sent["sent"] - stats["sent"]} sent, '
+                   f'{sent["failed"] - stats["failed"]} failed')
+
+    if at is None:
+        send(datetime.strptime(day, '%Y-%m-%d').date() if day
+             else date.today())
+        outbox.shutdown()
+    else:
+        run_daily(datetime.strptime(at, '%H:%M').time(), send)
 
 
 @app.cli.command()
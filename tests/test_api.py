@@ -0,0 +1,253 @@
+import unittest
+from datetime import date, timedelta
+from app import create_app, db
+from sqlalchemy import event as sqlalchemy_event
+from app.models import Event, Plan, User, encode_cursor
+
+
+class APITestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add_all([Event(name=f'Race {i}', distance='5k',
+                                  date=date(2018, 1, 1) + timedelta(days=i))
+                            for i in range(25)])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_cursor_pagination_visits_every_event_once(self):
+        url, names, pages = '/api/events?after=&per_page=10&count=1', [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            names += [event['name'] for event in data['items']]
+            url = data['_links']['next']
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(names, [f'Race {i}' for i in range(25)])
+        self.assertEqual(data['_meta']['total_items'], 25)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/events?after=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        for value in ({'id': 1}, [1], None, True, 1.5, 'x', '1'):
+            for url in ('/api/events', '/api/users'):
+                response = self.client.get(f'{url}?after=' +
+                                           encode_cursor(value))
+                self.assertEqual(response.status_code, 400)
+
+    def test_per_page_is_at_least_one(self):
+        for url in ('/api/events?after=&per_page=0', '/api/events?per_page=-1',
+                    '/api/users?after=&per_page=-1'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['_meta']['per_page'], 1)
+
+    def test_page_links(self):
+        data = self.client.get('/api/events?page=1').get_json()
+        self.assertIsNone(data['_links']['prev'])
+        self.assertIsNotNone(data['_links']['next'])
+        data = self.client.get('/api/events?page=3').get_json()
+        self.assertIsNotNone(data['_links']['prev'])
+        self.assertIsNone(data['_links']['next'])
+
+    def count_queries(self, f):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        sqlalchemy_event.listen(db.engine, 'before_cursor_execute',
+                                before_cursor_execute)
+        try:
+            return f(), statements
+        finally:
+            sqlalchemy_event.remove(db.engine, 'before_cursor_execute',
+                                    before_cursor_execute)
+
+    def test_event_batch(self):
+        batch = [{'name': f'Batch {i}', 'distance': '10', 'date': '2030-01-01'}
+                 for i in range(50)]
+        response, statements = self.count_queries(
+            lambda: self.client.post('/api/events:batch', json=batch))
+        self.assertEqual(response.status_code, 201)
+        data = response.get_json()
+        self.assertEqual(data['created'], 50)
+        self.assertEqual([item['data']['name'] for item in data['items']],
+                         [item['name'] for item in batch])
+        self.assertEqual(Event.query.filter_by(distance='10k').count(), 50)
+        # existence check, insert, read back
+        self.assertEqual(len(statements), 3)
+
+    def test_event_batch_is_all_or_nothing(self):
+        batch = [{'name': 'New', 'distance': '5k', 'date': '2030-01-01'},
+                 {'name': 'Race 0', 'distance': '5k', 'date': '2018-01-01'},
+                 {'name': 'Bad', 'distance': '5k'},
+                 {'name': 'New', 'distance': '5k', 'date': '2030-01-01'}]
+        response = self.client.post('/api/events:batch', json=batch)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([item['status'] for item in
+                          response.get_json()['items']], [424, 400, 400, 400])
+        self.assertEqual(Event.query.count(), 25)
+
+    def test_user_batch(self):
+        batch = [{'first_name': f'First {i}', 'last_name': f'Last {i}',
+                  'email': f'user{i}@example.com', 'password': 'secret'}
+                 for i in range(5)]
+        response, statements = self.count_queries(
+            lambda: self.client.post('/api/users:batch', json=batch))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(User.query.count(), 5)
+        self.assertTrue(User.query.filter_by(
+            email='user3@example.com').one().verify_password('secret'))
+
+        batch = [{'first_name': 'Other', 'last_name': 'Other',
+                  'email': 'user3@example.com', 'password': 'secret'},
+                 {'first_name': 'Missing'}]
+        response = self.client.post('/api/users:batch', json=batch)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([item['status'] for item in
+                          response.get_json()['items']], [400, 400])
+        self.assertEqual(User.query.count(), 5)
+
+    def test_user_batch_reports_name_clashes(self):
+        db.session.add(User(first_name='Taken', last_name='Smith',
+                            email='taken@example.com'))
+        db.session.commit()
+        batch = [{'first_name': 'Taken', 'last_name': 'Jones',
+                  'email': 'a@example.com', 'password': 'secret'},
+                 {'first_name': 'Ann', 'last_name': 'Lee',
+                  'email': 'b@example.com', 'password': 'secret'},
+                 {'first_name': 'Bob', 'last_name': 'Lee',
+                  'email': 'c@example.com', 'password': 'secret'}]
+        response = self.client.post('/api/users:batch', json=batch)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [(item['status'], item.get('message')) for item in
+             response.get_json()['items']],
+            [(400, 'please use a different first name'), (424, None),
+             (400, 'please use a different last name')])
+        self.assertEqual(User.query.count(), 1)
+
+    def test_user_batch_size_is_limited(self):
+        batch = [{'first_name': f'First {i}', 'last_name': f'Last {i}',
+                  'email': f'user{i}@example.com', 'password': 'secret'}
+                 for i in range(51)]
+        response = self.client.post('/api/users:batch', json=batch)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('limited to 50', response.get_json()['message'])
+
+    def test_batch_must_be_an_array(self):
+        for body in ({'name': 'Race'}, []):
+            response = self.client.post('/api/events:batch', json=body)
+            self.assertEqual(response.status_code, 400)
+
+    def create_plan(self):
+        event = Event(name='EMF 10k', distance='10k', date=date(2018, 4, 1))
+        plan = Plan(start_date=date(2018, 1, 1), event=event,
+                    level='Intermediate')
+        db.session.add(plan)
+        plan.create([1, 3, 5])
+        db.session.commit()
+        return plan
+
+    def page_through(self, url):
+        workouts = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            workouts += data['items']
+            url = data['_links']['next']
+        return workouts, data['_meta']
+
+    def test_plan(self):
+        plan = self.create_plan()
+        data = self.client.get(f'/api/plans/{plan.id}').get_json()
+        self.assertEqual(data['days'], [1, 3, 5])
+        self.assertEqual(data['start_date'], '2018-01-01Z')
+        self.assertEqual(data['duration'], float(plan.duration))
+        self.assertEqual(data['_links']['workouts'],
+                         f'/api/plans/{plan.id}/workouts')
+        data = self.client.get(
+            f'/api/plans/{plan.id}?fields=level').get_json()
+        self.assertEqual(set(data), {'id', 'level', '_links'})
+        self.assertEqual(self.client.get('/api/plans/0').status_code, 404)
+
+    def test_plan_workouts_from_snapshot_and_tables(self):
+        plan = self.create_plan()
+        url = (f'/api/plans/{plan.id}/workouts?per_page=7&count=1'
+               f'&expand=exercises&fields=date,category')
+        from_snapshot, meta = self.page_through(url)
+        self.assertEqual(meta['total_items'], plan.workouts.count())
+        self.assertEqual([workout['id'] for workout in from_snapshot],
+                         sorted(workout.id for workout in plan.workouts))
+        self.assertEqual(set(from_snapshot[0]),
+                         {'id', 'date', 'category', 'workoutsets', '_links'})
+        intervals = next(workout for workout in from_snapshot
+                         if workout['category'] == 'intervals')
+        self.assertEqual(intervals['workoutsets'][1], {
+            'reps': 5, 'duration': 6.25, 'exercises': [
+                {'description': 'fast', 'duration': 0.25},
+                {'description': 'easy', 'duration': 1}]})
+
+        plan.snapshot = None
+        db.session.commit()
+        from_tables, meta = self.page_through(url)
+        self.assertEqual(from_tables, from_snapshot)
+        self.assertEqual(meta['total_items'], len(from_snapshot))
+
+    def test_plan_workouts_queries(self):
+        plan = self.create_plan()
+        url = f'/api/plans/{plan.id}/workouts?per_page=50&expand=exercises'
+        db.session.expire_all()
+        response, statements = self.count_queries(lambda: self.client.get(url))
+        self.assertEqual(len(response.get_json()['items']), 36)
+        self.assertEqual(len(statements), 1)
+
+        plan.snapshot = None
+        db.session.commit()
+        response, statements = self.count_queries(lambda: self.client.get(url))
+        self.assertEqual(len(response.get_json()['items']), 36)
+        # plan, workouts, sets, exercises
+        self.assertEqual(len(statements), 4)
+
+    def test_workout(self):
+        plan = self.create_plan()
+        workout = plan.workouts.first()
+        for snapshot in (plan.snapshot, None):
+            plan.snapshot = snapshot
+            db.session.commit()
+            data = self.client.get(
+                f'/api/workouts/{workout.id}?expand=workoutsets').get_json()
+            self.assertEqual(data['date'], workout.date.isoformat() + 'Z')
+            self.assertEqual(data['_links']['plan'], f'/api/plans/{plan.id}')
+            self.assertEqual(data['workoutsets'],
+                             [{'reps': 1, 'duration': 25.0}])
+        self.assertEqual(self.client.get('/api/workouts/0').status_code, 404)
+
+    def test_invalid_fieldsets(self):
+        plan = self.create_plan()
+        for query in ('fields=password', 'expand=plan', 'after=bad',
+                      'after=' + encode_cursor('1')):
+            response = self.client.get(
+                f'/api/plans/{plan.id}/workouts?{query}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_plan_workouts_per_page_is_at_least_one(self):
+        plan = self.create_plan()
+        for snapshot in (plan.snapshot, None):
+            plan.snapshot = snapshot
+            db.session.commit()
+            data = self.client.get(
+                f'/api/plans/{plan.id}/workouts?per_page=0').get_json()
+            self.assertEqual(len(data['items']), 1)
+            self.assertIsNotNone(data['_links']['next'])
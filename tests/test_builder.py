@@ -0,0 +1,34 @@
+import unittest
+from datetime import date, timedelta
+from hypothesis import given, strategies as st
+from app.builder import monday_ordinal, progression_start_date, \
+    weeks_between_dates
+
+dates = st.dates(date(1900, 1, 1), date(2200, 1, 1))
+
+
+class DateHelpersTestCase(unittest.TestCase):
+    @given(dates)
+    def test_monday_ordinal(self, day):
+        monday = date.fromordinal(monday_ordinal(day.toordinal()))
+        self.assertEqual(monday, day - timedelta(days=day.weekday()))
+
+    @given(dates, st.integers(0, 6))
+    def test_progression_start_date(self, start, day):
+        self.assertEqual(progression_start_date(start, day),
+                         start + timedelta(weeks=1) -
+                         timedelta(days=start.weekday()) +
+                         timedelta(days=day))
+
+    @given(dates, dates)
+    def test_weeks_between_dates(self, start, end):
+        monday1 = start - timedelta(days=start.weekday())
+        monday2 = end - timedelta(days=end.weekday())
+        self.assertEqual(weeks_between_dates(start, end),
+                         int((monday2 - monday1).days / 7))
+
+    def test_examples(self):
+        self.assertEqual(weeks_between_dates(date(2018, 1, 1),
+                                             date(2018, 2, 1)), 4)
+        self.assertEqual(progression_start_date(date(2018, 1, 3), 2),
+                         date(2018, 1, 10))
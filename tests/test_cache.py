@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+from app import create_app, db, cache
+from app.cache import SimpleCache, FileSystemCache
+from app.models import Event, Plan
+from app.main.calendar import mark_today
+from app.main.views import plan_calendars
+
+
+class SimpleCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = SimpleCache(maxsize=2)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_expired_entries_are_missed(self):
+        self.cache.set('a', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_delete_prefix(self):
+        self.cache.set('plan/1/calendars/1', 'x')
+        self.cache.set('plan/12/calendars/1', 'y')
+        self.cache.delete_prefix('plan/1/')
+        self.assertIsNone(self.cache.get('plan/1/calendars/1'))
+        self.assertEqual(self.cache.get('plan/12/calendars/1'), 'y')
+
+
+class FileSystemCacheTestCase(SimpleCacheTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = FileSystemCache(self.directory, maxsize=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_least_recently_used_is_evicted(self):
+        for key in 'abc':
+            self.cache.set(key, key)
+        self.assertEqual(len([key for key in 'abc' if self.cache.get(key)]),
+                         2)
+
+    def test_delete_prefix_only_looks_in_its_directory(self):
+        self.cache = FileSystemCache(self.directory)
+        self.cache.set('plan/1/calendars/1', 'x')
+        self.cache.set('plan/12/calendars/1', 'y')
+        self.cache.set('events/upcoming', 'z')
+        with patch('os.listdir') as listdir, patch('os.walk') as walk:
+            self.cache.delete_prefix('plan/12/')
+        listdir.assert_not_called()
+        walk.assert_not_called()
+        self.assertIsNone(self.cache.get('plan/12/calendars/1'))
+        self.assertEqual(self.cache.get('plan/1/calendars/1'), 'x')
+
+        self.cache.set('plan/12/calendars/1', 'y')
+        self.cache.delete_prefix('plan/1')
+        self.assertIsNone(self.cache.get('plan/1/calendars/1'))
+        self.assertIsNone(self.cache.get('plan/12/calendars/1'))
+        self.assertEqual(self.cache.get('events/upcoming'), 'z')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('events/upcoming'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_keys_cannot_clash_with_directories(self):
+        self.cache = FileSystemCache(self.directory)
+        for key in ('a', 'a/b', 'a.d/b', '.', 'a/'):
+            self.cache.set(key, key)
+        for key in ('a', 'a/b', 'a.d/b', '.', 'a/'):
+            self.assertEqual(self.cache.get(key), key)
+
+    def test_entries_are_shared_between_instances(self):
+        self.cache.set('plan/1/calendars/1', ['<table>'])
+        other = FileSystemCache(self.directory)
+        self.assertEqual(other.get('plan/1/calendars/1'), ['<table>'])
+
+
+class CalendarCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        event = Event(name='EMF', distance='5k',
+                      date=date(2018, 1, 1) + timedelta(weeks=8))
+        self.plan = Plan(start_date=date(2018, 1, 1), event=event,
+                         level='Beginner')
+        db.session.add(self.plan)
+        self.plan.create([1, 3, 5])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_calendars_are_cached_per_revision(self):
+        calendars = plan_calendars(self.plan)
+        self.assertIs(plan_calendars(self.plan), calendars)
+
+        workout = self.plan.workouts.first()
+        workout.category = 'intervals'
+        db.session.commit()
+        self.assertEqual(self.plan.revision, 2)
+        self.assertIsNot(plan_calendars(self.plan), calendars)
+        self.assertIsNone(cache.get(f'plan/{self.plan.id}/calendars/1'))
+
+    def test_deleting_a_plan_invalidates_its_calendars(self):
+        plan_calendars(self.plan)
+        key = self.plan.cache_key('calendars')
+        db.session.delete(self.plan)
+        db.session.commit()
+        self.assertIsNone(cache.get(key))
+
+    def test_today_is_marked_after_rendering(self):
+        calendars = ''.join(plan_calendars(self.plan))
+        self.assertNotIn(' today', calendars)
+        marked = mark_today(calendars, date(2018, 1, 9))
+        self.assertIn('class="tue today" data-date="2018-01-09"', marked)
@@ -0,0 +1,31 @@
+import unittest
+from collections import namedtuple
+from datetime import date
+from app.main.calendar import WorkoutCalendar, group_by_month
+
+Workout = namedtuple('Workout', ['id', 'date', 'category', 'duration'])
+
+
+class WorkoutCalendarTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workouts = [Workout(1, date(2017, 11, 28), 'easy', 25),
+                         Workout(2, date(2017, 11, 30), 'intervals', 35),
+                         Workout(3, date(2018, 2, 1), 'easy', 30)]
+
+    def test_months_span_year_boundary_and_gaps(self):
+        months = group_by_month(self.workouts)
+        self.assertEqual([month for month, days in months],
+                         [(2017, 11), (2017, 12), (2018, 1), (2018, 2)])
+        self.assertEqual(sorted(months[0][1]), [28, 30])
+        self.assertEqual(months[1][1], {})
+
+    def test_formatmonths(self):
+        calendars = WorkoutCalendar(self.workouts).formatmonths()
+        self.assertEqual(len(calendars), 4)
+        self.assertIn('December 2017', calendars[1])
+        self.assertIn('href="/workout/3"', calendars[3])
+        self.assertIn('data-date="2018-02-01"', calendars[3])
+        self.assertNotIn('/workout/', calendars[2])
+
+    def test_no_workouts(self):
+        self.assertEqual(WorkoutCalendar([]).formatmonths(), [])
@@ -0,0 +1,43 @@
+import unittest
+from datetime import date, timedelta
+from app.compiler import compile_schedule, WorkoutRow, \
+    template_cache_info, clear_template_cache
+
+
+class CompilerTestCase(unittest.TestCase):
+    def compile(self, weeks=12, days=(1, 3, 5)):
+        return compile_schedule('5k', 'Beginner', date(2018, 1, 1),
+                                date(2018, 1, 1) + timedelta(weeks=weeks),
+                                days)
+
+    def test_schedule_is_immutable(self):
+        schedule = self.compile()
+        self.assertIsInstance(schedule, tuple)
+        self.assertIsInstance(schedule[0], WorkoutRow)
+        with self.assertRaises(AttributeError):
+            schedule[0].category = 'intervals'
+
+    def test_one_workout_per_day_per_week(self):
+        schedule = self.compile(weeks=12, days=(0, 2))
+        self.assertEqual(len(schedule), 2 * 12)
+        self.assertEqual({workout.date.weekday() for workout in schedule},
+                         {0, 2})
+
+    def test_progressions_follow_days(self):
+        schedule = self.compile(weeks=4)
+        self.assertEqual([workout.category for workout in schedule[::4]],
+                         ['easy', 'intervals', 'easy'])
+        self.assertEqual(schedule[0].date, date(2018, 1, 9))
+        self.assertEqual(schedule[4].date, date(2018, 1, 11))
+
+    def test_template_is_shared_between_start_dates(self):
+        clear_template_cache()
+        first = self.compile()
+        second = compile_schedule('5k', 'Beginner', date(2018, 3, 7),
+                                  date(2018, 3, 7) + timedelta(weeks=12),
+                                  [1, 3, 5])
+        info = template_cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+        self.assertEqual(second[0].date, date(2018, 3, 13))
+        self.assertEqual([workout.workoutsets for workout in first],
+                         [workout.workoutsets for workout in second])
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, time, timedelta
+from unittest.mock import patch
+from sqlalchemy import event as sqlalchemy_event
+from app import create_app, db, mail, outbox
+from app.digests import next_run, run_daily, send_digests, \
+    todays_workouts, write_checkpoint
+from app.models import Event, Plan, User, Workout
+
+
+class DigestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.users = [User(email=f'user{i}@example.com', first_name=f'F{i}',
+                           last_name=f'L{i}') for i in range(3)]
+        event = Event(name='EMF 10k', distance='10k',
+                      date=date(2018, 1, 1) + timedelta(weeks=12))
+        for user, days in zip(self.users, ([0, 2, 4], [0, 3], [1, 3, 5])):
+            plan = Plan(start_date=date(2018, 1, 1), event=event,
+                        level='Intermediate', user=user)
+            db.session.add(plan)
+            plan.create(days)
+        # a plan nobody owns is left out
+        db.session.add(Plan(start_date=date(2018, 1, 1), event=event,
+                            level='Beginner'))
+        db.session.commit()
+        self.day = date(2018, 2, 5)
+
+    def tearDown(self):
+        outbox.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_todays_workouts_in_one_query(self):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        sqlalchemy_event.listen(db.engine, 'before_cursor_execute',
+                                before_cursor_execute)
+        try:
+            digests = list(todays_workouts(self.day, chunk_size=2))
+        finally:
+            sqlalchemy_event.remove(db.engine, 'before_cursor_execute',
+                                    before_cursor_execute)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([digest.email for digest in digests],
+                         ['user0@example.com', 'user1@example.com'])
+        for digest in digests:
+            workouts = Workout.query.join(Plan).filter(
+                Plan.user_id == digest.user_id, Workout.date == self.day) \
+                .order_by(Workout.id).all()
+            self.assertEqual([str(workout) for workout in digest.workouts],
+                             [str(workout) for workout in workouts])
+            self.assertEqual([workout.duration for workout in digest.workouts],
+                             [workout.duration for workout in workouts])
+
+    def test_send_digests(self):
+        reports = []
+        with mail.record_messages() as outgoing:
+            totals = send_digests(self.day, chunk_size=1,
+                                  progress=lambda totals: reports.append(
+                                      totals['users']))
+            outbox.flush()
+        self.assertEqual((totals['users'], reports), (2, [1, 2]))
+        self.assertEqual(sorted(msg.recipients[0] for msg in outgoing),
+                         ['user0@example.com', 'user1@example.com'])
+        msg = outgoing[0]
+        self.assertIn('Monday 05 February', msg.subject)
+        self.assertTrue(msg.body.startswith('Hi F'))
+        self.assertIn('Workout', msg.body)
+        self.assertIn('<li>', msg.html)
+
+    def test_next_run(self):
+        at = time(6, 30)
+        self.assertEqual(next_run(at, datetime(2018, 2, 5, 6, 0)),
+                         datetime(2018, 2, 5, 6, 30))
+        self.assertEqual(next_run(at, datetime(2018, 2, 5, 6, 30)),
+                         datetime(2018, 2, 6, 6, 30))
+
+    def test_checkpoint_resumes_and_skips_sent_days(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'digests.checkpoint')
+            # the first user was mailed before the last run failed
+            write_checkpoint(checkpoint, self.day, self.users[0].id)
+            with mail.record_messages() as outgoing:
+                totals = send_digests(self.day, checkpoint=checkpoint)
+                again = send_digests(self.day, checkpoint=checkpoint)
+                other_day = send_digests(self.day + timedelta(days=1),
+                                         checkpoint=checkpoint)
+                outbox.flush()
+        self.assertEqual((totals['resumed_after'], totals['users']),
+                         (self.users[0].id, 1))
+        self.assertTrue(again['already_sent'])
+        # a checkpoint from another day is no help
+        self.assertEqual((other_day['resumed_after'], other_day['users']),
+                         (0, 1))
+        self.assertEqual([msg.recipients for msg in outgoing],
+                         [['user1@example.com'], ['user2@example.com']])
+
+    def test_failed_day_does_not_stop_the_loop(self):
+        days = []
+
+        def job(day):
+            days.append(day)
+            if len(days) == 1:
+                raise ValueError('relay down')
+            raise KeyboardInterrupt
+        with patch('app.digests.sleep'), \
+                self.assertLogs(self.app.logger, 'ERROR') as logs, \
+                self.assertRaises(KeyboardInterrupt):
+            run_daily(time(6), job)
+        self.assertEqual(len(days), 2)
+        self.assertIn('relay down', logs.output[0])
@@ -0,0 +1,149 @@
+import socketserver
+import unittest
+from threading import Event, Lock, Thread
+from time import sleep
+from app import create_app, mail, outbox
+from app.email import build_email, send_email
+from app.outbox import OutboxFull
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost')
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for line in self.rfile:
+                    if line == b'.\r\n':
+                        break
+                    data.append(line)
+                server.hold.wait()
+                with server.lock:
+                    reply = server.replies.pop(0) if server.replies \
+                        else '250 OK'
+                    if reply.startswith('250'):
+                        server.messages.append(b''.join(data))
+                self.reply(reply)
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    '''
+    Just enough of an SMTP server to count connections and messages, refuse
+    messages with the queued replies and hold them until released.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super(SMTPStandIn, self).__init__(('127.0.0.1', 0), SMTPHandler)
+        self.lock = Lock()
+        self.connections = 0
+        self.messages = []
+        self.replies = []
+        self.hold = Event()
+        self.hold.set()
+
+
+class EmailTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = SMTPStandIn()
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.app = create_app('testing')
+        self.app.config.update(
+            MAIL_SERVER='127.0.0.1', MAIL_PORT=self.server.server_address[1],
+            MAIL_USE_TLS=False, MAIL_SUPPRESS_SEND=False,
+            RUN_MAIL_WORKERS=2, RUN_MAIL_BATCH_SIZE=10,
+            RUN_MAIL_RETRY_DELAY=0.01)
+        mail.init_app(self.app)
+        outbox.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.server.hold.set()
+        outbox.shutdown(timeout=5)
+        self.app_context.pop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def send(self, count):
+        for i in range(count):
+            send_email(f'user{i}@example.com', 'New User', 'mail/new_user',
+                       user={'first_name': 'John'})
+
+    def test_connections_are_reused(self):
+        self.send(40)
+        self.assertTrue(outbox.flush(timeout=10))
+        self.assertEqual(len(self.server.messages), 40)
+        self.assertLessEqual(self.server.connections, 2)
+        self.assertEqual(outbox.stats()['sent'], 40)
+        self.assertIn(b'Subject: [Run] New User', self.server.messages[0])
+
+    def test_temporary_failures_are_retried(self):
+        self.server.replies = ['451 Try again later'] * 2
+        with self.assertLogs(self.app.logger, 'ERROR') as logs:
+            self.send(1)
+            outbox.flush(timeout=10)
+            self.server.replies = ['550 No such user']
+            self.send(1)
+            outbox.flush(timeout=10)
+        stats = outbox.stats()
+        self.assertEqual((stats['sent'], stats['failed'], stats['retried']),
+                         (1, 1, 2))
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertIn('550', logs.output[0])
+
+    def test_full_queue_pushes_back(self):
+        self.app.config.update(RUN_MAIL_WORKERS=1, RUN_MAIL_QUEUE_SIZE=1,
+                               RUN_MAIL_BATCH_SIZE=1)
+        outbox.init_app(self.app)
+        self.server.hold.clear()
+        self.send(1)
+        # wait for the worker to take the first message and stall on it
+        while outbox.stats()['queued']:
+            sleep(0.01)
+        self.send(1)
+        with self.assertRaises(OutboxFull):
+            outbox.send(build_email('john@example.com', 'New User',
+                                    'mail/new_user', user={}), timeout=0.05)
+        self.server.hold.set()
+        self.assertTrue(outbox.shutdown(timeout=10))
+        self.assertEqual(len(self.server.messages), 2)
+        with self.assertRaises(RuntimeError):
+            self.send(1)
+
+    def test_shutdown_timeout(self):
+        self.server.hold.clear()
+        self.send(3)
+        # the workers are stuck on the server, so nothing can be stopped yet
+        self.assertFalse(outbox.shutdown(timeout=0.1))
+        with self.assertRaises(RuntimeError):
+            self.send(1)
+        self.server.hold.set()
+        self.assertTrue(outbox.shutdown(timeout=10))
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(outbox.stats()['pending'], 0)
+        self.assertTrue(outbox.flush(timeout=1))
+
+    def test_suppressed_when_testing(self):
+        app = create_app('testing')
+        with app.app_context(), mail.record_messages() as outgoing:
+            send_email('john@example.com', 'New User', 'mail/new_user',
+                       user={'first_name': 'John'})
+            outbox.shutdown()
+        self.assertEqual([message.recipients for message in outgoing],
+                         [['john@example.com']])
+        self.assertEqual(self.server.connections, 0)
@@ -0,0 +1,92 @@
+import unittest
+from datetime import date, timedelta
+from app import create_app, db
+from app.models import Event, upcoming_events
+
+
+class EventQueryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        today = date.today()
+        db.session.add_all([
+            Event(name='Past 5k', distance='5k',
+                  date=today - timedelta(days=1)),
+            Event(name='Park 5k', distance='5k', date=today),
+            Event(name='City 10k', distance='10k',
+                  date=today + timedelta(weeks=2)),
+            Event(name='City Half', distance='half',
+                  date=today + timedelta(weeks=60)),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def names(self, query):
+        return [event.name for event in query]
+
+    def test_filters(self):
+        today = date.today()
+        self.assertEqual(self.names(Event.query.upcoming()),
+                         ['Park 5k', 'City 10k', 'City Half'])
+        self.assertEqual(
+            self.names(Event.query.between(today, today + timedelta(weeks=2))),
+            ['Park 5k'])
+        self.assertEqual(self.names(Event.query.distance('5k').upcoming()),
+                         ['Park 5k'])
+        self.assertEqual(self.names(Event.query.named('city').upcoming()),
+                         ['City 10k', 'City Half'])
+
+    def test_named_matches_wildcards_literally(self):
+        db.session.add(Event(name='100% Trail_Run', distance='10k',
+                             date=date.today()))
+        db.session.commit()
+        self.assertEqual(self.names(Event.query.named('%')),
+                         ['100% Trail_Run'])
+        self.assertEqual(self.names(Event.query.named('park_5k')), [])
+        self.assertEqual(self.names(Event.query.named('trail_run')),
+                         ['100% Trail_Run'])
+
+    def test_cursor(self):
+        first = Event.query.upcoming().first()
+        self.assertEqual(
+            self.names(Event.query.upcoming().after((first.date, first.id))),
+            ['City 10k', 'City Half'])
+
+    def test_upcoming_events_are_cached_until_events_change(self):
+        events = upcoming_events(limit=2)
+        self.assertEqual([event.name for event in events],
+                         ['Park 5k', 'City 10k'])
+        self.assertIs(upcoming_events(limit=2), events)
+        db.session.add(Event(name='Fun Run', distance='5k',
+                             date=date.today() + timedelta(days=1)))
+        db.session.commit()
+        self.assertEqual([event.name for event in upcoming_events(limit=2)],
+                         ['Park 5k', 'Fun Run'])
+
+    def test_upcoming_events_are_invalidated_on_commit(self):
+        events = upcoming_events(limit=2)
+        event = Event.query.filter_by(name='City 10k').one()
+        event.date = date.today() + timedelta(weeks=3)
+        db.session.flush()
+        self.assertIs(upcoming_events(limit=2), events)
+        db.session.rollback()
+        db.session.commit()
+        self.assertIs(upcoming_events(limit=2), events)
+        event.date = date.today() + timedelta(days=1)
+        db.session.commit()
+        self.assertIsNot(upcoming_events(limit=2), events)
+
+    def test_api_filters(self):
+        client = self.app.test_client()
+        data = client.get('/api/events?distance=5k&start=' +
+                          date.today().isoformat()).get_json()
+        self.assertEqual([event['name'] for event in data['items']],
+                         ['Park 5k'])
+        self.assertEqual(client.get('/api/events?start=soon').status_code,
+                         400)
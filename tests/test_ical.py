@@ -0,0 +1,99 @@
+import unittest
+from datetime import date, timedelta
+from sqlalchemy import event as sqlalchemy_event
+from app import create_app, db, cache
+from app.ical import fold, escape
+from app.models import Event, Plan
+
+
+class ICalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        event = Event(name='EMF', distance='5k',
+                      date=date(2018, 1, 1) + timedelta(weeks=6))
+        self.plan = Plan(start_date=date(2018, 1, 1), event=event,
+                         level='Beginner')
+        db.session.add(self.plan)
+        self.plan.create([1, 3, 5])
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.url = f'/plan/{self.plan.id}/ical'
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_export(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/calendar')
+        body = response.get_data(as_text=True)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3 * 6)
+        self.assertIn('DTSTART;VALUE=DATE:20180109\r\n', body)
+        self.assertEqual(self.client.get(self.url).get_data(as_text=True),
+                         body)
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        etag = response.headers['ETag']
+        response = self.client.get(self.url,
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+
+        self.plan.workouts.first().category = 'intervals'
+        db.session.commit()
+        response = self.client.get(self.url,
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('SUMMARY:intervals',
+                      response.get_data(as_text=True))
+
+    def test_not_modified_before_loading_workouts(self):
+        etag = self.client.get(self.url).headers['ETag']
+        # as for another worker, with nothing cached or loaded
+        cache.clear()
+        db.session.remove()
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        sqlalchemy_event.listen(db.engine, 'before_cursor_execute',
+                                before_cursor_execute)
+        try:
+            response = self.client.get(self.url,
+                                       headers={'If-None-Match': etag})
+        finally:
+            sqlalchemy_event.remove(db.engine, 'before_cursor_execute',
+                                    before_cursor_execute)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('FROM plans', statements[0])
+
+    def test_etag_changes_when_a_plan_id_is_reused(self):
+        etag = self.client.get(self.url).headers['ETag']
+        plan_id, event = self.plan.id, self.plan.event
+        db.session.delete(self.plan)
+        db.session.commit()
+        plan = Plan(start_date=date(2018, 1, 1), event=event,
+                    level='Beginner')
+        db.session.add(plan)
+        plan.create([0, 2])
+        db.session.commit()
+        self.assertEqual(plan.id, plan_id)
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.get_data(as_text=True).count('BEGIN:VEVENT'), 2 * 6)
+
+    def test_fold_and_escape(self):
+        self.assertEqual(escape('a,b;c\nd'), 'a\\,b\\;c\\nd')
+        folded = fold('DESCRIPTION:' + 'x' * 100)
+        lines = folded.split('\r\n')
+        self.assertEqual([len(line) for line in lines], [75, 38, 0])
+        self.assertTrue(lines[1].startswith(' '))
@@ -0,0 +1,114 @@
+import io
+import json
+import unittest
+from datetime import date
+from app import create_app, db
+from app.exceptions import ValidationError
+from app.importer import (import_events, iter_events, iter_json,
+                          normalise_distance)
+from app.models import Event, Plan, User
+
+
+class StreamingTestCase(unittest.TestCase):
+    def test_normalise_distance(self):
+        for spelling, distance in (('5', '5k'), ('5K', '5k'), ('10 km', '10k'),
+                                   ('Half Marathon', 'half'),
+                                   ('Marathon', 'full'), ('full', 'full')):
+            self.assertEqual(normalise_distance(spelling), distance)
+        with self.assertRaises(ValidationError):
+            normalise_distance('ultra')
+
+    def test_iter_json_small_chunks(self):
+        events = {f'Race {i}': {'distance': '5k', 'date': '2030-01-01',
+                                'tags': ['a, b', {'c': '}'}]}
+                  for i in range(50)}
+        document = json.dumps(events, indent=2)
+        self.assertEqual(list(iter_json(io.StringIO(document), chunk_size=7)),
+                         list(events.items()))
+        document = json.dumps(list(events.values()))
+        self.assertEqual(list(iter_json(io.StringIO(document), chunk_size=5)),
+                         list(events.values()))
+        self.assertEqual(list(iter_json(io.StringIO(' [ ] '))), [])
+
+    def test_iter_json_malformed(self):
+        for document in ('', '"x"', '[{"a": 1}', '{"a" 1}', '[1 2]'):
+            with self.assertRaises(ValidationError):
+                list(iter_json(io.StringIO(document), chunk_size=3))
+
+    def test_formats_agree(self):
+        feeds = {
+            'json': '{"Park": {"distance": "5", "date": "2030-01-01"}}',
+            'jsonl': '{"name": "Park", "distance": "5", '
+                     '"date": "2030-01-01"}\n\n',
+            'csv': 'name,distance,date\nPark,5,2030-01-01\n',
+        }
+        for format, feed in feeds.items():
+            self.assertEqual(list(iter_events(io.StringIO(feed), format)),
+                             [{'name': 'Park', 'distance': '5',
+                               'date': '2030-01-01'}])
+
+
+class ImportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_upsert(self):
+        user = User(email='ann@example.com', first_name='Ann', last_name='Lee')
+        event = Event(name='Park', distance='10k', date=date(2030, 1, 1))
+        db.session.add_all([user, event])
+        db.session.commit()
+        plan = Plan(level='Beginner', start_date=date(2029, 10, 1),
+                    event=event, user=user)
+        db.session.add(plan)
+        db.session.commit()
+
+        feed = ('name,distance,date\n'
+                'Park,5k,2030-01-01\n'
+                'Park,5k,2031-01-01\n'
+                'City,Half Marathon,2030-03-01\n'
+                'City,half,2030-03-01\n'
+                'Bad,ultra,2030-03-01\n'
+                'Worse,5k,March\n')
+        stats = import_events(io.StringIO(feed), 'csv', batch_size=2)
+        self.assertEqual(stats['imported'], 4)
+        self.assertEqual(stats['rejected'], 2)
+        self.assertEqual(len(stats['errors']), 2)
+
+        events = Event.query.order_by(Event.date).all()
+        self.assertEqual([(e.name, e.distance, e.date) for e in events], [
+            ('Park', '5k', date(2030, 1, 1)),
+            ('City', 'half', date(2030, 3, 1)),
+            ('Park', '5k', date(2031, 1, 1)),
+        ])
+        # the existing event was updated in place
+        self.assertEqual(events[0].id, event.id)
+        self.assertEqual(Plan.query.get(plan.id).event_id, event.id)
+
+    def test_malformed_jsonl_lines_are_rejected(self):
+        feed = ('{"name": "Park", "distance": "5k", "date": "2030-01-01"}\n'
+                '{"name": "City", "distance"\n'
+                '{"name": "Hill", "distance": "10k", "date": "2030-02-01"}\n')
+        stats = import_events(io.StringIO(feed), 'jsonl')
+        self.assertEqual((stats['imported'], stats['rejected']), (2, 1))
+        self.assertEqual(stats['errors'], ['malformed JSON on line 2'])
+        self.assertEqual(Event.query.count(), 2)
+
+    def test_events_json(self):
+        with open('events.json') as f:
+            expected = json.load(f)
+        with open('events.json') as f:
+            stats = import_events(f, 'json', batch_size=100)
+        self.assertEqual(stats['rejected'], 0)
+        self.assertEqual(Event.query.count(), len(expected))
+        # importing again changes nothing
+        with open('events.json') as f:
+            import_events(f, 'json')
+        self.assertEqual(Event.query.count(), len(expected))
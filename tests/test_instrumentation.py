@@ -0,0 +1,79 @@
+import json
+import unittest
+from datetime import date
+from app import create_app, db, instrumentation
+from app.models import Event, Plan, User
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['RUN_INSTRUMENTATION'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        instrumentation.init_app(self.app)
+        instrumentation.reset()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.plan = Plan(start_date=date(2018, 1, 1), level='Intermediate',
+                         event=Event(name='EMF 10k', distance='10k',
+                                     date=date(2018, 4, 1)))
+        db.session.add(self.plan)
+        self.plan.create([1, 3, 5])
+        self.plan.snapshot = None
+        db.session.commit()
+        self.plan_id = self.plan.id
+        # start the requests from an empty session
+        db.session.remove()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_server_timing_header(self):
+        response = self.client.get(
+            f'/api/plans/{self.plan_id}/workouts?expand=exercises')
+        timing = response.headers['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        # plan, workouts, sets, exercises
+        self.assertIn('desc="4 queries"', timing)
+        self.assertRegex(timing, r'total;dur=[\d.]+$')
+
+    def test_requests_are_logged(self):
+        with self.assertLogs(self.app.logger, 'INFO') as logs:
+            self.client.get(f'/api/plans/{self.plan_id}')
+        record = json.loads(logs.records[-1].getMessage().split(' ', 1)[1])
+        self.assertEqual(record['endpoint'], 'api.get_plan')
+        self.assertEqual(record['status'], 200)
+        self.assertIn('FROM plans', record['slowest_statement'])
+
+    def test_template_time_and_slowest_endpoints(self):
+        user = User(email='john@example.com', first_name='John',
+                    last_name='Smith')
+        user.set_password('secret')
+        user.plans.append(Plan.query.get(self.plan_id))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.session.remove()
+        self.client.post('/auth/login', data={'email': 'john@example.com',
+                                              'password': 'secret'})
+        response = self.client.get(f'/user/{user_id}')
+        self.assertNotRegex(response.headers['Server-Timing'],
+                            r'template;dur=0\.0,')
+        self.client.get(f'/api/plans/{self.plan_id}')
+        endpoints = [stat.endpoint
+                     for stat in instrumentation.slowest_endpoints()]
+        self.assertEqual(set(endpoints), {'auth.login', 'main.user',
+                                          'api.get_plan'})
+        page = self.client.get('/admin/performance/').get_data(as_text=True)
+        self.assertIn('main.user', page)
+
+    def test_disabled_by_default(self):
+        app = create_app('testing')
+        self.assertFalse(app.config['RUN_INSTRUMENTATION'])
+        response = app.test_client().get('/auth/login')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response.headers)
@@ -0,0 +1,169 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from threading import Event as ThreadEvent, Thread
+from time import monotonic, sleep
+from app import create_app, db
+from app.jobs import claim_jobs, enqueue_plan, pending_job, \
+    requeue_stale_jobs, work
+from app.models import Event, Plan, PlanJob, User
+
+
+class PlanJobTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['RUN_PLAN_JOBS'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.users = [User(email=f'user{i}@example.com', first_name=f'F{i}',
+                           last_name=f'L{i}') for i in range(3)]
+        self.event = Event(name='EMF 5k', distance='5k',
+                           date=date.today() + timedelta(weeks=10))
+        db.session.add_all(self.users + [self.event])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_worker_builds_queued_plans(self):
+        jobs = [enqueue_plan(user, self.event, 'Beginner', [1, 3, 5])
+                for user in self.users]
+        self.assertEqual(Plan.query.count(), 0)
+        self.assertEqual(work(batch_size=2, once=True), 3)
+        for job, user in zip(jobs, self.users):
+            job = PlanJob.query.get(job.id)
+            self.assertEqual(job.status, PlanJob.DONE)
+            plan = Plan.query.get(job.plan_id)
+            self.assertEqual(plan.user_id, user.id)
+            self.assertEqual(plan.workouts.count(), 3 * plan.length)
+            self.assertIsNone(pending_job(user))
+
+    def test_later_request_supersedes_queued_one(self):
+        user = self.users[0]
+        first = enqueue_plan(user, self.event, 'Beginner', [1, 3, 5])
+        second = enqueue_plan(user, self.event, 'Advanced', [0, 2, 4])
+        self.assertEqual(PlanJob.query.get(first.id).status,
+                         PlanJob.SUPERSEDED)
+        self.assertEqual(pending_job(user).id, second.id)
+        work(once=True)
+        self.assertEqual([plan.level for plan in Plan.query], ['Advanced'])
+
+    def test_failed_job_does_not_fail_batch(self):
+        bad = Event(name='Ultra', distance='ultra',
+                    date=date.today() + timedelta(weeks=10))
+        db.session.add(bad)
+        good = enqueue_plan(self.users[0], self.event, 'Beginner', [1, 3, 5])
+        failed = enqueue_plan(self.users[1], bad, 'Beginner', [1, 3, 5])
+        work(once=True)
+        self.assertEqual(PlanJob.query.get(good.id).status, PlanJob.DONE)
+        failed = PlanJob.query.get(failed.id)
+        self.assertEqual(failed.status, PlanJob.FAILED)
+        self.assertIn('ultra', failed.error)
+        self.assertEqual(pending_job(self.users[1]).id, failed.id)
+
+    def test_claims_are_exclusive(self):
+        for user in self.users:
+            enqueue_plan(user, self.event, 'Beginner', [1, 3, 5])
+        first = claim_jobs('one', 2)
+        second = claim_jobs('two', 2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({job.id for job in first} & {job.id for job in second})
+        self.assertEqual(claim_jobs('three', 2), [])
+
+    def test_stale_jobs_are_requeued(self):
+        job = enqueue_plan(self.users[0], self.event, 'Beginner', [1, 3, 5])
+        claim_jobs('dead', 1)
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=10)), 0)
+        PlanJob.query.get(job.id).started = \
+            datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=10)), 1)
+        self.assertEqual(PlanJob.query.get(job.id).status, PlanJob.QUEUED)
+
+    def test_create_enqueues_and_user_page_polls(self):
+        user = self.users[0]
+        user.set_password('secret')
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/auth/login', data={'email': user.email,
+                                         'password': 'secret'})
+        response = client.post('/create', data={
+            'event_id': self.event.id, 'level': 'Beginner',
+            'days': ['1', '3', '5']})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Plan.query.count(), 0)
+        job = PlanJob.query.one()
+        page = client.get(f'/user/{user.id}').get_data(as_text=True)
+        self.assertIn(f'/plan-job/{job.id}', page)
+        self.assertEqual(client.get(f'/plan-job/{job.id}').get_json()[
+            'status'], 'queued')
+        work(once=True)
+        self.assertEqual(client.get(f'/plan-job/{job.id}').get_json()[
+            'status'], 'done')
+        page = client.get(f'/user/{user.id}').get_data(as_text=True)
+        self.assertIn('<table', page)
+        self.assertNotIn('/plan-job/', page)
+
+
+class RunningWorkerTestCase(unittest.TestCase):
+    def setUp(self):
+        # a file, so the worker's thread sees the same database
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = create_app('testing')
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + \
+            os.path.join(self.directory.name, 'jobs.sqlite')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.user = User(email='john@example.com', first_name='John',
+                         last_name='Smith')
+        self.event = Event(name='EMF 5k', distance='5k',
+                           date=date.today() + timedelta(weeks=10))
+        db.session.add_all([self.user, self.event])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.get_engine(self.app).dispose()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def test_running_worker_requeues_stale_jobs(self):
+        user_id = self.user.id
+        stop = ThreadEvent()
+
+        def run():
+            with self.app.app_context():
+                work(poll=0.01, stale=timedelta(minutes=10),
+                     requeue_every=timedelta(0), stop=stop)
+                db.session.remove()
+        worker = Thread(target=run)
+        worker.start()
+        try:
+            # claimed an hour ago by a worker that has since died
+            job = PlanJob(user_id=user_id, event_id=self.event.id,
+                          level='Beginner', status=PlanJob.RUNNING,
+                          worker='dead', started=datetime.utcnow() -
+                          timedelta(hours=1))
+            job.weekdays = [1, 3, 5]
+            db.session.add(job)
+            db.session.commit()
+            job_id = job.id
+            deadline = monotonic() + 10
+            while monotonic() < deadline:
+                db.session.remove()
+                if PlanJob.query.get(job_id).status == PlanJob.DONE:
+                    break
+                sleep(0.01)
+        finally:
+            stop.set()
+            worker.join()
+        self.assertEqual(PlanJob.query.get(job_id).status, PlanJob.DONE)
+        self.assertEqual(Plan.query.one().user_id, user_id)
@@ -0,0 +1,54 @@
+import unittest
+from datetime import date, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from app.models import Event, Plan
+from app.main.calendar import WorkoutCalendar
+
+
+class PlanGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.count)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count(self, conn, cursor, statement, parameters, context,
+              executemany):
+        self.statements.append(statement)
+
+    def queries_to_render(self, weeks):
+        event = Event(name='EMF', distance='5k',
+                      date=date(2018, 1, 1) + timedelta(weeks=weeks))
+        plan = Plan(start_date=date(2018, 1, 1), event=event,
+                    level='Beginner')
+        db.session.add(plan)
+        plan.create([1, 3, 5])
+        db.session.commit()
+        plan_id = plan.id
+        db.session.expunge_all()
+
+        plan = Plan.query.get(plan_id)
+        del self.statements[:]
+        graph = plan.load_graph()
+        for workout in graph:
+            str(workout)
+            for workoutset in workout.workoutsets:
+                workoutset.duration
+        WorkoutCalendar(graph).formatmonths()
+        self.assertEqual(len(graph), 3 * weeks)
+        return len(self.statements)
+
+    def test_query_count_is_independent_of_plan_length(self):
+        short = self.queries_to_render(weeks=4)
+        long = self.queries_to_render(weeks=30)
+        self.assertEqual(short, 3)
+        self.assertEqual(long, short)
@@ -0,0 +1,109 @@
+import unittest
+from datetime import date, timedelta
+from sqlalchemy import event as sqlalchemy_event
+from app import create_app, db
+from app.models import Event, Plan, User, Workout, WorkoutSet, Exercise
+
+
+class PlanModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.event = Event(name='EMF 5k', distance='5k',
+                           date=date(2018, 1, 1) + timedelta(weeks=12))
+        db.session.add(self.event)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def create_plan(self, days=(1, 3, 5)):
+        plan = Plan(start_date=date(2018, 1, 1), event=self.event,
+                    level='Beginner')
+        db.session.add(plan)
+        plan.create(list(days))
+        db.session.commit()
+        return plan
+
+    def test_create_writes_one_workout_per_day_per_week(self):
+        plan = self.create_plan()
+        self.assertEqual(plan.workouts.count(), 3 * plan.length)
+        self.assertEqual(WorkoutSet.query.count(), (1 + 3 + 1) * plan.length)
+
+    def test_create_links_children_to_parents(self):
+        plan = self.create_plan()
+        first = plan.workouts.order_by(Workout.id).first()
+        self.assertEqual(first.date, date(2018, 1, 9))
+        self.assertEqual(first.category, 'easy')
+        self.assertEqual(first.duration, 25)
+        intervals = plan.workouts.filter_by(category='intervals').first()
+        self.assertEqual([ws.reps for ws in intervals.workoutsets], [1, 5, 1])
+        self.assertEqual(intervals.duration, 10 + 5 * 1.25 + 10)
+
+    def test_create_without_days_writes_nothing(self):
+        self.create_plan(days=())
+        self.assertEqual(Workout.query.count(), 0)
+        self.assertEqual(Exercise.query.count(), 0)
+
+    def test_create_stores_durations(self):
+        plan = self.create_plan()
+        total = sum(workout.duration for workout in plan.workouts)
+        self.assertEqual(plan.duration, total)
+        self.assertGreater(total, 0)
+
+    def test_editing_exercises_updates_durations(self):
+        plan = self.create_plan()
+        workout = plan.workouts.filter_by(category='easy').first()
+        before = plan.duration
+        exercise = workout.workoutsets[0].exercises[0]
+        exercise.duration += 10
+        db.session.commit()
+        self.assertEqual(workout.duration, exercise.duration)
+        self.assertEqual(plan.duration, before + 10)
+
+        Exercise(workoutset=workout.workoutsets[0],
+                 description='easy', duration=5)
+        db.session.commit()
+        self.assertEqual(workout.duration, exercise.duration + 5)
+
+        db.session.delete(workout.workoutsets[0])
+        db.session.commit()
+        self.assertEqual(workout.duration, 0)
+
+    def test_unrelated_flushes_leave_expired_workouts_alone(self):
+        plan = self.create_plan()
+        # held so that they stay in the identity map, expired by the commit
+        workouts = plan.workouts.all()
+        db.session.commit()
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        sqlalchemy_event.listen(db.engine, 'before_cursor_execute',
+                                before_cursor_execute)
+        try:
+            db.session.add(User(email='john@example.com'))
+            db.session.flush()
+        finally:
+            sqlalchemy_event.remove(db.engine, 'before_cursor_execute',
+                                    before_cursor_execute)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('INSERT INTO users'))
+        self.assertEqual(len(workouts), 36)
+
+    def test_length_follows_dates(self):
+        plan = self.create_plan()
+        self.assertEqual(plan.length, 12)
+        plan.start_date = date(2018, 1, 15)
+        self.assertEqual(plan.length, 10)
+        self.event.date = self.event.date + timedelta(weeks=2)
+        self.assertEqual(plan.length, 12)
+        later = Event(name='EMF 10k', distance='10k',
+                      date=date(2018, 1, 1) + timedelta(weeks=20))
+        plan.event = later
+        self.assertEqual(plan.length, 18)
+        db.session.commit()
+        self.assertEqual(plan.length, 18)
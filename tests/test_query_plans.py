@@ -0,0 +1,74 @@
+import unittest
+from datetime import date, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Event, Plan, Workout
+
+
+class QueryPlanTestCase(unittest.TestCase):
+    '''
+    The queries behind the main views must be index searches, not full
+    table scans, however many rows the tables hold.
+    '''
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(email='ann@example.com', first_name='Ann',
+                    last_name='Smith')
+        race = Event(name='EMF', distance='5k',
+                     date=date.today() + timedelta(weeks=8))
+        plan = Plan(start_date=date.today(), event=race, level='Beginner',
+                    user=user)
+        db.session.add(plan)
+        plan.create([1, 3, 5])
+        db.session.commit()
+        db.session.expunge_all()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.capture)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.capture)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def capture(self, conn, cursor, statement, parameters, context,
+                executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.statements.append((statement, parameters))
+
+    def assertNoFullScans(self):
+        self.assertTrue(self.statements)
+        connection = db.engine.raw_connection()
+        try:
+            for statement, parameters in self.statements:
+                details = [row[-1] for row in connection.execute(
+                    'EXPLAIN QUERY PLAN ' + statement, parameters)]
+                for detail in details:
+                    # scanning a subquery's result or via an index is fine
+                    full_scan = detail.startswith('SCAN ') and \
+                        'USING' not in detail and \
+                        'SUBQUERY' not in detail.upper()
+                    self.assertFalse(full_scan,
+                                     f'{detail} in plan for {statement}')
+        finally:
+            connection.close()
+
+    def test_user_page_queries(self):
+        user = User.query.filter_by(email='ann@example.com').first()
+        plan = Plan.query.filter_by(user=user).first()
+        for workout in plan.load_graph():
+            workout.workoutsets
+        self.assertNoFullScans()
+
+    def test_workouts_on_a_date(self):
+        Workout.query.filter_by(date=date.today()).all()
+        self.assertNoFullScans()
+
+    def test_upcoming_events(self):
+        Event.query.filter(Event.date >= date.today()).order_by(
+            Event.date).all()
+        self.assertNoFullScans()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+from app import create_app, db
+from app.models import Event, Plan, Workout, WorkoutSet
+from app.regenerate import regenerate_plans, write_checkpoint
+
+
+class RegeneratePlansTestCase(unittest.TestCase):
+    database_uri = None
+
+    def setUp(self):
+        self.app = create_app('testing')
+        if self.database_uri:
+            self.app.config['SQLALCHEMY_DATABASE_URI'] = self.database_uri
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.event = Event(name='EMF 10k', distance='10k',
+                           date=date(2018, 1, 1) + timedelta(weeks=12))
+        db.session.add(self.event)
+        self.plans = []
+        for level, days in (('Beginner', [1, 3, 5]), ('Advanced', [0, 2, 6]),
+                            ('Intermediate', [2, 4])):
+            plan = Plan(start_date=date(2018, 1, 1), event=self.event,
+                        level=level)
+            db.session.add(plan)
+            plan.create(days)
+            self.plans.append(plan)
+        db.session.commit()
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.directory.name, 'checkpoint')
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def tamper(self, plan):
+        workout = plan.workouts.order_by(Workout.id).first()
+        workout.workoutsets[-1].reps += 1
+        db.session.commit()
+        return workout.date
+
+    def snapshot(self, plan):
+        return [(w.date, w.category, w.duration,
+                 [(s.reps, [(e.description, e.duration) for e in s.exercises])
+                  for s in w.workoutsets])
+                for w in plan.workouts.order_by(Workout.id)]
+
+    def test_unchanged_plans_are_left_alone(self):
+        revisions = [plan.revision for plan in self.plans]
+        totals = regenerate_plans(processes=1, checkpoint=self.checkpoint)
+        self.assertEqual((totals['plans'], totals['changed']), (3, 0))
+        self.assertEqual([Plan.query.get(plan.id).revision
+                          for plan in self.plans], revisions)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_changed_plans_are_rewritten(self):
+        plan = self.plans[1]
+        expected = self.snapshot(plan)
+        duration = plan.duration
+        self.tamper(plan)
+        revision = Plan.query.get(plan.id).revision
+        totals = regenerate_plans(chunk_size=2, processes=2)
+        self.assertEqual((totals['plans'], totals['changed']), (3, 1))
+        db.session.expire_all()
+        plan = Plan.query.get(plan.id)
+        self.assertEqual(self.snapshot(plan), expected)
+        self.assertEqual(plan.duration, duration)
+        self.assertEqual(plan.revision, revision + 1)
+        self.assertEqual(WorkoutSet.query.filter(WorkoutSet.workout_id.is_(
+            None)).count(), 0)
+
+    def test_dry_run_reports_without_writing(self):
+        day = self.tamper(self.plans[0])
+        before = self.snapshot(self.plans[0])
+        reports = []
+        totals = regenerate_plans(processes=2, dry_run=True,
+                                  progress=lambda *args: reports.append(args))
+        self.assertEqual(totals['changed'], 1)
+        self.assertEqual(reports[0][0].diffs,
+                         {self.plans[0].id: [f'~ {day} easy 50mins -> '
+                                             f'easy 25mins']})
+        db.session.expire_all()
+        self.assertEqual(self.snapshot(self.plans[0]), before)
+
+    def test_resumes_after_checkpoint(self):
+        for plan in self.plans:
+            self.tamper(plan)
+        write_checkpoint(self.checkpoint, self.plans[0].id)
+        totals = regenerate_plans(processes=1, checkpoint=self.checkpoint)
+        self.assertEqual(totals['resumed_after'], self.plans[0].id)
+        self.assertEqual((totals['plans'], totals['changed']), (2, 2))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_plans_without_days_are_skipped(self):
+        self.plans[2].days = None
+        db.session.commit()
+        totals = regenerate_plans(processes=1)
+        self.assertEqual(totals['skipped'], 1)
+
+
+class PooledRegeneratePlansTestCase(RegeneratePlansTestCase):
+    '''
+    The same against a database file the worker processes can read.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.database_directory = tempfile.TemporaryDirectory()
+        cls.database_uri = 'sqlite:///' + os.path.join(
+            cls.database_directory.name, 'regenerate.sqlite')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.database_directory.cleanup()
@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from app.exceptions import ValidationError
+from app.registry import PlanRegistry, DEFAULT_PLANS_FILE, parse_plans
+
+
+class PlanRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'plans.json')
+        shutil.copy(DEFAULT_PLANS_FILE, self.path)
+        self.registry = PlanRegistry(path=self.path)
+        self.registry.reload_interval = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def rewrite(self, update):
+        with open(self.path) as f:
+            data = json.load(f)
+        update(data)
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+        mtime = os.stat(self.path).st_mtime + 1
+        os.utime(self.path, (mtime, mtime))
+
+    def test_every_distance_and_level_is_defined(self):
+        for distance in ('5k', '10k', 'half', 'full'):
+            for level in ('Beginner', 'Intermediate', 'Advanced'):
+                self.assertEqual(len(self.registry.get(distance, level)), 3)
+
+    def test_unknown_plan(self):
+        with self.assertRaises(ValidationError):
+            self.registry.get('ultra', 'Beginner')
+
+    def test_reload_on_change(self):
+        self.registry.get('5k', 'Beginner')
+
+        def add_ultra(data):
+            data['version'] = 2
+            data['plans']['ultra'] = {'Beginner': [['easy-30']]}
+        self.rewrite(add_ultra)
+        self.assertEqual(len(self.registry.get('ultra', 'Beginner')), 1)
+        self.assertEqual(self.registry.version, 2)
+
+    def test_invalid_file_keeps_previous_plans(self):
+        before = self.registry.get('5k', 'Beginner')
+
+        def break_workout(data):
+            data['workouts']['easy-25']['warmup'] = 'ten'
+        self.rewrite(break_workout)
+        self.assertIs(self.registry.get('5k', 'Beginner'), before)
+
+    def test_unknown_workout_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            parse_plans({'workouts': {}, 'plans': {'5k': {'Beginner': [['x']]}}})
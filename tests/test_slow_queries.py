@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+from app import create_app, db, slow_queries
+from app.models import Event, Plan, User
+from app.slow_queries import aggregate, explain, read_entries, \
+    statement_shape
+
+
+class SlowQueriesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.directory.name, 'slow.log')
+        self.app = create_app('testing')
+        self.app.config['RUN_SLOW_QUERY_LOG'] = self.log
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.user = User(email='john@example.com', first_name='John',
+                         last_name='Smith')
+        self.plan = Plan(start_date=date(2018, 1, 1), level='Beginner',
+                         user=self.user,
+                         event=Event(name='EMF 5k', distance='5k',
+                                     date=date(2018, 4, 1)))
+        db.session.add(self.plan)
+        db.session.commit()
+        self.plan_id = self.plan.id
+        # record everything from here on
+        self.app.config['RUN_SLOW_QUERY_MS'] = 0
+        slow_queries.init_app(self.app)
+        slow_queries.entries.clear()
+
+    def tearDown(self):
+        slow_queries.threshold = None
+        for handler in list(slow_queries.logger.handlers):
+            if getattr(handler, 'baseFilename', None) == \
+                    os.path.abspath(self.log):
+                slow_queries.logger.removeHandler(handler)
+                handler.close()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def test_statements_are_recorded_with_their_plans(self):
+        Plan.query.filter_by(user=self.user).all()
+        entry = slow_queries.entries[-1]
+        self.assertIn('FROM plans', entry['statement'])
+        self.assertEqual(entry['parameters'], f'({self.user.id},)')
+        self.assertIsNone(entry['view'])
+        self.assertTrue(any('ix_plans_user_id' in line
+                            for line in entry['plan']))
+        self.assertIn(entry['statement'], [
+            group['statement'] for group in aggregate(read_entries(self.log))])
+
+    def test_views_and_callers(self):
+        db.session.remove()
+        self.app.test_client().get(f'/api/plans/{self.plan_id}')
+        entry = slow_queries.entries[-1]
+        self.assertEqual(entry['view'], 'api.get_plan')
+        self.assertRegex(entry['caller'], r'^api/plans\.py:\d+ get_plan$')
+
+    def test_writes_are_recorded_without_plans(self):
+        self.plan.level = 'Advanced'
+        db.session.commit()
+        entry = next(entry for entry in slow_queries.entries
+                     if entry['statement'].startswith('UPDATE plans'))
+        self.assertIsNone(entry['plan'])
+
+    def test_failed_explain_is_rolled_back_on_postgresql(self):
+        class Cursor(object):
+            def __init__(self):
+                self.statements = []
+
+            def execute(self, statement, parameters=None):
+                self.statements.append(statement)
+                if statement.startswith('EXPLAIN'):
+                    raise ValueError('no such table')
+
+            def close(self):
+                pass
+
+        class Connection(object):
+            dialect = type('Dialect', (), {'name': 'postgresql'})
+            connection = type('DBAPIConnection', (), {
+                'cursor': lambda self: cursor})()
+
+        cursor = Cursor()
+        self.assertEqual(explain(Connection(), 'SELECT 1', ()),
+                         ['EXPLAIN failed: no such table'])
+        self.assertEqual(cursor.statements, [
+            'SAVEPOINT run_explain', 'EXPLAIN SELECT 1',
+            'ROLLBACK TO SAVEPOINT run_explain',
+            'RELEASE SAVEPOINT run_explain'])
+
+    def test_statement_shape(self):
+        self.assertEqual(
+            statement_shape("SELECT * FROM plans\n WHERE id IN (?, ?, ?) "
+                            "AND level = 'Beginner' LIMIT 10"),
+            'SELECT * FROM plans WHERE id IN (?) AND level = ? LIMIT ?')
+        self.assertEqual(statement_shape('SELECT a1 FROM t WHERE b = %(b)s'),
+                         'SELECT a1 FROM t WHERE b = ?')
+
+    def test_aggregate_across_rotated_logs(self):
+        with open(self.log + '.1', 'w') as f:
+            f.write(json.dumps({'statement': 'SELECT 1 FROM t WHERE x IN '
+                                '(1, 2)', 'ms': 30.0, 'caller': 'a:1 f',
+                                'view': None, 'plan': ['SCAN t']}) + '\n')
+            f.write('not json\n')
+        with open(self.log, 'w') as f:
+            f.write(json.dumps({'statement': 'SELECT 2 FROM t WHERE x IN '
+                                '(3)', 'ms': 10.0, 'caller': 'a:1 f',
+                                'view': 'main.user', 'plan': None}) + '\n')
+        groups = aggregate(read_entries(self.log))
+        self.assertEqual(len(groups), 1)
+        self.assertEqual((groups[0]['count'], groups[0]['total_ms'],
+                          groups[0]['mean_ms'], groups[0]['max_ms']),
+                         (2, 40.0, 20.0, 30.0))
+        self.assertEqual(groups[0]['callers'], {'a:1 f': 2})
+        self.assertEqual(groups[0]['views'], {'main.user': 1})
+        self.assertEqual(groups[0]['plan'], ['SCAN t'])
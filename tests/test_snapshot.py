@@ -0,0 +1,159 @@
+import json
+import unittest
+from datetime import date, timedelta
+from sqlalchemy import event as sqlalchemy_event
+from app import create_app, db
+from app.ical import iter_calendar
+from app.main.calendar import WorkoutCalendar
+from app.models import Event, Plan, User, Workout
+from app.regenerate import regenerate_plans
+from app.snapshot import PlanSnapshot, check_snapshots, load_schedule
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.event = Event(name='EMF 10k', distance='10k',
+                           date=date(2018, 1, 1) + timedelta(weeks=12))
+        self.user = User(email='john@example.com', first_name='John',
+                         last_name='Smith')
+        self.user.set_password('secret')
+        db.session.add_all([self.event, self.user])
+        self.plan = Plan(start_date=date(2018, 1, 1), event=self.event,
+                         level='Intermediate', user=self.user)
+        db.session.add(self.plan)
+        self.plan.create([1, 3, 5])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def edit(self):
+        workout = self.plan.workouts.filter_by(category='easy').first()
+        workout.workoutsets[0].exercises[0].duration += 5
+        db.session.commit()
+
+    def count_queries(self, f):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        sqlalchemy_event.listen(db.engine, 'before_cursor_execute',
+                                before_cursor_execute)
+        try:
+            return f(), statements
+        finally:
+            sqlalchemy_event.remove(db.engine, 'before_cursor_execute',
+                                    before_cursor_execute)
+
+    def test_create_writes_a_versioned_snapshot(self):
+        data = json.loads(self.plan.snapshot)
+        self.assertEqual(data['v'], 1)
+        self.assertEqual(len(data['w']), self.plan.workouts.count())
+
+    def test_snapshot_reads_like_the_workouts(self):
+        graph = self.plan.load_graph()
+        snapshot = PlanSnapshot.decode(self.plan)
+        self.assertEqual(len(snapshot), len(graph))
+        for expected, workout in zip(graph, snapshot):
+            self.assertEqual(
+                (workout.id, workout.plan_id, workout.date, workout.category,
+                 workout.rest, workout.duration, str(workout)),
+                (expected.id, expected.plan_id, expected.date,
+                 expected.category, expected.rest, expected.duration,
+                 str(expected)))
+            self.assertEqual(
+                [(str(s), s.duration, [str(e) for e in s.exercises])
+                 for s in workout.workoutsets],
+                [(str(s), s.duration, [str(e) for e in s.exercises])
+                 for s in expected.workoutsets])
+
+    def test_renderings_match_the_workouts(self):
+        graph, snapshot = self.plan.load_graph(), PlanSnapshot.decode(
+            self.plan)
+        self.assertEqual(list(iter_calendar(self.plan, snapshot)),
+                         list(iter_calendar(self.plan, graph)))
+        self.assertEqual(WorkoutCalendar(snapshot).formatmonths(),
+                         WorkoutCalendar(graph).formatmonths())
+
+    def test_editing_workouts_drops_the_snapshot(self):
+        self.edit()
+        self.assertIsNone(Plan.query.get(self.plan.id).snapshot)
+        self.assertIsNone(PlanSnapshot.decode(self.plan))
+
+    def test_load_schedule_without_a_snapshot(self):
+        self.edit()
+        self.user.first_name = 'Jack'
+        workouts, statements = self.count_queries(
+            lambda: [str(workout) for workout in load_schedule(self.plan)])
+        self.assertEqual(workouts, [str(workout) for workout in
+                                    self.plan.workouts.order_by(
+                                        Workout.date, Workout.id)])
+        # a read neither writes a snapshot nor commits the session
+        self.assertFalse([statement for statement in statements
+                          if statement.startswith('UPDATE plans')])
+        db.session.rollback()
+        self.assertEqual(self.user.first_name, 'John')
+        self.assertIsNone(Plan.query.get(self.plan.id).snapshot)
+
+    def test_workout_page_is_one_query(self):
+        workout = self.plan.workouts.filter_by(category='intervals').first()
+        client = self.app.test_client()
+        client.post('/auth/login', data={'email': 'john@example.com',
+                                         'password': 'secret'})
+        client.get('/')
+        response, statements = self.count_queries(
+            lambda: client.get(f'/workout/{workout.id}'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('<p>Fast (0.2mins)</p>', response.get_data(as_text=True))
+        plan_queries = [s for s in statements if 'plans' in s]
+        self.assertEqual(len(plan_queries), 1)
+        self.assertNotIn('workoutsets', ' '.join(statements))
+        self.assertNotIn('JOIN', plan_queries[0])
+
+    def test_workout_page_without_a_snapshot(self):
+        workout = self.plan.workouts.filter_by(category='intervals').first()
+        self.edit()
+        client = self.app.test_client()
+        client.post('/auth/login', data={'email': 'john@example.com',
+                                         'password': 'secret'})
+        response = client.get(f'/workout/{workout.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get('/workout/0').status_code, 404)
+
+    def test_check_snapshots(self):
+        other = Plan(start_date=date(2018, 1, 1), event=self.event,
+                     level='Beginner')
+        db.session.add(other)
+        other.create([0, 2])
+        db.session.commit()
+        self.assertEqual(check_snapshots()['current'], 2)
+
+        data = json.loads(other.snapshot)
+        data['w'][0][2] = 'rest'
+        other.snapshot = json.dumps(data)
+        db.session.commit()
+        self.edit()
+        problems = {}
+        totals = check_snapshots(
+            chunk_size=1, progress=lambda chunk, _: problems.update(chunk))
+        self.assertEqual(problems, {self.plan.id: 'missing',
+                                    other.id: 'mismatched'})
+        self.assertEqual(totals['plans'], 2)
+
+        self.assertEqual(check_snapshots(fix=True)['fixed'], 2)
+        self.assertEqual(check_snapshots()['current'], 2)
+
+    def test_regenerate_rewrites_snapshots(self):
+        workout = self.plan.workouts.order_by(Workout.id).first()
+        workout.workoutsets[-1].reps += 1
+        db.session.commit()
+        regenerate_plans(processes=1)
+        db.session.expire_all()
+        self.assertEqual(check_snapshots()['current'], 1)
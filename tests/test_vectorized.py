@@ -0,0 +1,92 @@
+import unittest
+import numpy as np
+from hypothesis import given, strategies as st
+from datetime import date
+from app.builder import reps_or_duration, rest_week, \
+    progression_start_date, weeks_between_dates
+from app.registry import Progression
+from app.vectorized import progress, progression_table, rest_weeks, \
+    from_ordinals, progression_starts, to_ordinals, weeks_between, \
+    workout_ordinals
+
+dates = st.dates(date(1900, 1, 1), date(2200, 1, 1))
+numbers = st.one_of(st.integers(0, 100),
+                    st.floats(0, 100, allow_nan=False, allow_infinity=False))
+# intervals are counted in weeks, so tiny fractions are out of scope
+intervals = st.one_of(st.integers(0, 6), st.just(0.0), st.floats(0.01, 6))
+progressions = st.builds(Progression, numbers, numbers, intervals, numbers)
+
+
+def bits(values):
+    '''
+    The float64 bit patterns of some values, so -0.0 differs from 0.0.
+    '''
+    return np.asarray(values, dtype=np.float64).view(np.int64).tolist()
+
+
+class VectorizedTestCase(unittest.TestCase):
+    @given(st.integers(0, 200), st.integers(-10, 200))
+    def test_rest_weeks(self, plan_length, week):
+        self.assertEqual(bool(rest_weeks(week, plan_length)),
+                         rest_week(week, plan_length))
+
+    @given(st.lists(st.tuples(st.integers(1, 60), st.integers(1, 3)),
+                    min_size=1, max_size=10), progressions)
+    def test_progress_matches_reps_or_duration(self, plans, progression):
+        for plan_length, cycle in plans:
+            weeks = np.arange(plan_length)
+            expected = [reps_or_duration(plan_length, week, week // cycle,
+                                         progression.start, progression.step,
+                                         progression.maximum,
+                                         progression.interval)
+                        for week in range(plan_length)]
+            actual = progress(plan_length, weeks, weeks // cycle,
+                              progression.start, progression.step,
+                              progression.maximum, progression.interval)
+            self.assertEqual(bits(actual), bits(expected))
+
+    @given(st.lists(st.integers(0, 60), min_size=1, max_size=20),
+           progressions, st.integers(1, 3))
+    def test_progression_table_for_plans_of_different_lengths(
+            self, plan_lengths, progression, cycle):
+        table = progression_table(progression, plan_lengths, cycle)
+        self.assertEqual(table.shape, (len(plan_lengths), max(plan_lengths)))
+        for row, plan_length in zip(table, plan_lengths):
+            expected = [reps_or_duration(plan_length, week, week // cycle,
+                                         progression.start, progression.step,
+                                         progression.maximum,
+                                         progression.interval)
+                        for week in range(plan_length)]
+            self.assertEqual(bits(row[:plan_length]), bits(expected))
+            self.assertFalse(row[plan_length:].any())
+
+    def test_negative_zero_is_preserved(self):
+        progression = Progression(-0.0, 0.0, 0, 5)
+        self.assertEqual(bits(progression_table(progression, [1])[0]),
+                         bits([-0.0]))
+
+
+class VectorizedDatesTestCase(unittest.TestCase):
+    @given(st.lists(st.tuples(dates, dates), min_size=1, max_size=20))
+    def test_weeks_between(self, pairs):
+        starts, ends = zip(*pairs)
+        self.assertEqual(
+            weeks_between(to_ordinals(starts), to_ordinals(ends)).tolist(),
+            [weeks_between_dates(start, end) for start, end in pairs])
+
+    @given(st.lists(dates, min_size=1, max_size=20), st.integers(0, 6))
+    def test_progression_starts(self, starts, day):
+        self.assertEqual(
+            from_ordinals(progression_starts(to_ordinals(starts), day)),
+            [progression_start_date(start, day) for start in starts])
+
+    def test_workout_ordinals(self):
+        starts = [date(2018, 1, 3), date(2018, 1, 8)]
+        grid, mask = workout_ordinals(to_ordinals(starts), 1, [2, 3])
+        self.assertEqual(mask.tolist(), [[True, True, False],
+                                         [True, True, True]])
+        self.assertEqual(from_ordinals(grid[0, :2]),
+                         [date(2018, 1, 9), date(2018, 1, 16)])
+        self.assertEqual(from_ordinals(grid[1]),
+                         [date(2018, 1, 16), date(2018, 1, 23),
+                          date(2018, 1, 30)])